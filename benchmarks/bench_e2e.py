@@ -0,0 +1,354 @@
+# benchmarks/bench_e2e.py
+"""
+End-to-end latency of the tutor's HTTP pipeline, with offline stand-ins for every model.
+
+    python benchmarks/bench_e2e.py
+    python benchmarks/bench_e2e.py --concurrency 1 4 16 --requests 48 --output e2e.json
+    python benchmarks/bench_e2e.py --retrieval real --baseline e2e.json
+    python benchmarks/bench_e2e.py --stt real --llm ollama --tts real --retrieval real
+
+Runs the FastAPI app under uvicorn inside this process, with each backend
+either fake (see fake_backends.py: STT/TTS/retrieval with configurable
+latency, the LLM on the stub Ollama server) or real. It then drives /ask/
+(default), /chat/ or /chat/stream at each concurrency level. For each
+level it reports end-to-end and per-stage p50/p95/p99 and requests/sec.
+The stages are ffmpeg decode, STT, retrieval, LLM first token and full
+answer, per-sentence TTS, and full-answer audio. --output saves the
+results as JSON, and --baseline prints the change against an earlier run.
+A request only counts as a success if a real answer came back; an empty
+transcript or the "couldn't understand" reply counts as an error. Sessions,
+the translation memory, the TTS cache and profiles go to a temporary
+directory, not into the repo.
+"""
+
+import argparse
+import asyncio
+import functools
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import wave
+from collections import defaultdict
+
+import numpy as np
+
+from common import Timer, summarize_ms
+from bench_stt_batching import synthetic_clip
+from fake_backends import (
+    FakeRetriever, FakeWhisper, QUESTIONS, fake_tts_service,
+    install_fake_retrieval, install_fake_stt, install_fake_tts, use_llm,
+)
+from stub_ollama import serve as serve_stub
+
+ENDPOINTS = {"ask": "/ask/", "chat": "/chat/", "chat_stream": "/chat/stream"}
+
+# what /ask/ says when STT gave nothing usable (online/server.py)
+NON_ANSWERS = {"Sorry, I couldn't understand the question.", "عذراً، لم أتمكن من الفهم."}
+
+
+class StageRecorder:
+    """
+    Wall time of every call to the wrapped pipeline functions, per stage.
+    """
+
+    def __init__(self):
+        self._lock   = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def wrap(self, stage: str, fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+    def wrap_stream(self, fn):
+        # LLM token streams: time to first token and to the last one
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start, first = time.perf_counter(), True
+            for token in fn(*args, **kwargs):
+                if first:
+                    self.record("llm_first_token", time.perf_counter() - start)
+                    first = False
+                yield token
+            self.record("llm", time.perf_counter() - start)
+        return timed
+
+    def reset(self) -> None:
+        with self._lock:
+            self.samples.clear()
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {stage: summarize_ms(values) for stage, values in sorted(self.samples.items())}
+
+
+def wav_bytes(clip: np.ndarray) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(16000)
+        out.writeframes((np.clip(clip, -1, 1) * 32767).astype(np.int16).tobytes())
+    return buf.getvalue()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def use_scratch_dir(workdir: str) -> None:
+    """
+    Point every file the app writes (sessions, translation memory, TTS
+    cache, slow-request profiles) into workdir. Must run before
+    online.server is imported; settings.yaml is read once and cached.
+    """
+    from online.config import load_settings
+    settings = load_settings()
+    # SQLite files only where they are on (sessions: when shared; translation memory: unless null)
+    for section, key, name, default in (
+        ("sessions",    "path",        "sessions.sqlite",           None),
+        ("translation", "memory_path", "translation_memory.sqlite", True),
+    ):
+        cfg = settings.get(section) or {}
+        if cfg.get(key, default):
+            settings[section] = {**cfg, key: os.path.join(workdir, name)}
+    settings["tts"]     = {**(settings.get("tts") or {}), "cache_dir": os.path.join(workdir, "tts_cache")}
+    settings["tracing"] = {**(settings.get("tracing") or {}), "profile_dir": os.path.join(workdir, "profiles")}
+
+
+def start_app(args, recorder: StageRecorder):
+    """
+    Import the app with the chosen backends, instrument it, and serve it
+    with uvicorn in a background thread. Returns (uvicorn server, base URL).
+    """
+    use_scratch_dir(args.workdir)
+    if args.stt == "fake":
+        install_fake_stt(FakeWhisper(args.stt_ms, args.stt_ms_per_audio_s, args.stt_batch_item_ms))
+
+    import uvicorn
+    from online import server
+    from online.llm import inference
+    from online.tts import speech_pipeline
+    from online.tts.tts_service import tts_cache_dir
+
+    if args.llm == "stub":
+        stub_server, _ = serve_stub(
+            port=0,
+            parallel=args.llm_parallel or inference.gateway.max_in_flight,
+            tokens_per_sec=args.tokens_per_sec,
+            prefill_ms_per_1k=args.prefill_ms_per_1k,
+            answer_tokens=args.answer_tokens,
+        )
+        use_llm(f"http://127.0.0.1:{stub_server.server_address[1]}")
+    if args.retrieval == "fake":
+        install_fake_retrieval(server, FakeRetriever(args.retrieval_ms))
+    if args.tts == "fake":
+        install_fake_tts(fake_tts_service(args.tts_ms, args.tts_ms_per_char, cache_dir=tts_cache_dir()))
+
+    if not args.answer_cache:
+        # the benchmark repeats its questions; cached answers would skip the LLM and TTS
+        from online.llm.answer_cache import get_answer_cache
+        get_answer_cache().max_entries = 0
+
+    # ─ Per-stage timers around the functions the endpoints call ─
+    server.decode_upload              = recorder.wrap("ffmpeg", server.decode_upload)
+    server.transcribe_batched         = recorder.wrap("stt", server.transcribe_batched)
+    server.get_relevant_chunks        = recorder.wrap("retrieval", server.get_relevant_chunks)
+    server.full_answer_audio          = recorder.wrap("tts_full", server.full_answer_audio)
+    speech_pipeline.synthesize_cached = recorder.wrap("tts_sentence", speech_pipeline.synthesize_cached)
+    inference.gateway.stream          = recorder.wrap_stream(inference.gateway.stream)
+
+    port = free_port()
+    app_server = uvicorn.Server(uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=app_server.run, daemon=True).start()
+    while not app_server.started:
+        time.sleep(0.05)
+
+    # models load in the background after startup; measure only once they are warm
+    import httpx
+    base_url = f"http://127.0.0.1:{port}"
+    while True:
+        resp = httpx.get(f"{base_url}/readyz")
+        if resp.status_code == 200:
+            break
+        failed = {name: m["error"] for name, m in resp.json()["models"].items() if m["state"] == "failed"}
+        if failed:
+            raise RuntimeError(f"Models failed to load: {failed}")
+        time.sleep(0.2)
+    return app_server, base_url
+
+
+def answered(reply: dict) -> bool:
+    # a transcript, and an answer to it (not the "couldn't understand" fallback)
+    answer = (reply.get("answer") or "").strip()
+    return bool((reply.get("transcript") or "").strip() and answer and answer not in NON_ANSWERS)
+
+
+def done_event(body: str) -> dict:
+    # data of the final `done` event of an SSE body ({} if the stream ended without one)
+    reply = {}
+    for event in body.split("\n\n"):
+        lines = event.strip().splitlines()
+        if len(lines) == 2 and lines[0] == "event: done" and lines[1].startswith("data: "):
+            reply = json.loads(lines[1][len("data: "):])
+    return reply
+
+
+async def one_request(client, endpoint: str, audio: bytes, question: str) -> dict:
+    start = time.perf_counter()
+    row   = {"status": None, "first_event": None, "answered": False}
+    if endpoint == "ask":
+        resp = await client.post(ENDPOINTS[endpoint], files={"audio": ("question.wav", audio, "audio/wav")})
+        row["status"]   = resp.status_code
+        row["answered"] = resp.status_code == 200 and answered(resp.json())
+    elif endpoint == "chat":
+        resp = await client.post(ENDPOINTS[endpoint], data={"question": question})
+        row["status"]   = resp.status_code
+        row["answered"] = resp.status_code == 200 and answered(resp.json())
+    else:
+        async with client.stream("POST", ENDPOINTS[endpoint], data={"question": question}) as resp:
+            row["status"] = resp.status_code
+            body = []
+            async for chunk in resp.aiter_raw():
+                if row["first_event"] is None:
+                    row["first_event"] = time.perf_counter() - start
+                body.append(chunk)
+        row["answered"] = resp.status_code == 200 and answered(done_event(b"".join(body).decode("utf-8")))
+    row["total"] = time.perf_counter() - start
+    return row
+
+
+async def run_level(base_url: str, endpoint: str, concurrency: int, requests: int, audio: bytes) -> list:
+    import httpx
+
+    rows    = []
+    counter = iter(range(requests))
+
+    async def client_loop(client):
+        for i in counter:
+            rows.append(await one_request(client, endpoint, audio, QUESTIONS[i % len(QUESTIONS)]))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+    return rows
+
+
+def compare(results: dict, baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {row["concurrency"]: row for row in json.load(f)["levels"]}
+    print(f"\nvs {baseline_path}:")
+    print(f"{'clients':>8} {'metric':>10} {'before':>9} {'after':>9} {'change':>8}")
+    for row in results["levels"]:
+        old = baseline.get(row["concurrency"])
+        if not old:
+            continue
+        for metric, before, after in (
+            ("p50 ms", old["total_ms"]["p50"], row["total_ms"]["p50"]),
+            ("p95 ms", old["total_ms"]["p95"], row["total_ms"]["p95"]),
+            ("req/s",  old["rps"],             row["rps"]),
+        ):
+            change = (after - before) / before * 100 if before else float("nan")
+            print(f"{row['concurrency']:>8} {metric:>10} {before:>9.1f} {after:>9.1f} {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="ask")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="requests per concurrency level")
+    parser.add_argument("--clip-seconds", type=float, default=4.0, help="length of the uploaded question")
+    # backends
+    parser.add_argument("--stt", choices=["fake", "real"], default="fake")
+    parser.add_argument("--llm", choices=["stub", "ollama"], default="stub", help="ollama: llm.base_url from settings")
+    parser.add_argument("--retrieval", choices=["fake", "real"], default="fake", help="real: the index in settings.yaml")
+    parser.add_argument("--tts", choices=["fake", "real"], default="fake")
+    # fake latencies
+    parser.add_argument("--stt-ms", type=float, default=300, help="fake STT base latency")
+    parser.add_argument("--stt-ms-per-audio-s", type=float, default=40)
+    parser.add_argument("--stt-batch-item-ms", type=float, default=60, help="extra cost per clip in a batch")
+    parser.add_argument("--retrieval-ms", type=float, default=20)
+    parser.add_argument("--tts-ms", type=float, default=50, help="fake TTS base latency per sentence")
+    parser.add_argument("--tts-ms-per-char", type=float, default=4)
+    parser.add_argument("--tokens-per-sec", type=float, default=40, help="stub LLM decode speed")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=250)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--llm-parallel", type=int, help="stub parallelism (default: llm.gateway.max_in_flight)")
+    parser.add_argument("--answer-cache", action="store_true", help="keep the semantic answer cache on (repeats hit it)")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="earlier --output file to compare against")
+    args = parser.parse_args()
+
+    scratch      = tempfile.TemporaryDirectory(prefix="bench_e2e_")
+    args.workdir = scratch.name
+    recorder     = StageRecorder()
+    app_server, base_url = start_app(args, recorder)
+    audio = wav_bytes(synthetic_clip(args.clip_seconds))
+
+    # warm-up (model loads, first-call costs), not recorded
+    asyncio.run(run_level(base_url, args.endpoint, 1, 2, audio))
+    recorder.reset()
+
+    results = {"config": vars(args), "levels": []}
+    for concurrency in args.concurrency:
+        with Timer() as wall:
+            rows = asyncio.run(run_level(base_url, args.endpoint, concurrency, args.requests, audio))
+        ok     = [r for r in rows if r["answered"]]
+        codes  = defaultdict(int)
+        for r in rows:
+            codes[str(r["status"])] += 1
+        level = {
+            "concurrency":  concurrency,
+            "requests":     len(rows),
+            "errors":       len(rows) - len(ok),
+            "unanswered":   sum(1 for r in rows if r["status"] == 200 and not r["answered"]),
+            "status_codes": dict(codes),
+            "seconds":      wall.elapsed,
+            "rps":          len(ok) / wall.elapsed,
+            "total_ms":     summarize_ms([r["total"] for r in ok]),
+            "stages":       recorder.summary(),
+        }
+        if args.endpoint == "chat_stream":
+            level["first_event_ms"] = summarize_ms([r["first_event"] for r in ok if r["first_event"] is not None])
+        results["levels"].append(level)
+        recorder.reset()
+
+    app_server.should_exit = True
+    scratch.cleanup()
+
+    backends = f"stt={args.stt} llm={args.llm} retrieval={args.retrieval} tts={args.tts}"
+    print(f"{ENDPOINTS[args.endpoint]} ({backends}), {args.requests} requests per level\n")
+    for level in results["levels"]:
+        print(f"{level['concurrency']} clients: {level['rps']:.2f} req/s, {level['errors']} errors"
+              f" ({level['unanswered']} without an answer)")
+        print(f"  {'stage':>16} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        rows = [*level["stages"].items(), ("total", level["total_ms"])]
+        if "first_event_ms" in level:
+            rows.insert(-1, ("first_event", level["first_event_ms"]))
+        for stage, lat in rows:
+            print(f"  {stage:>16} {lat['n']:>5} {lat['p50']:>9.1f} {lat['p95']:>9.1f} {lat['p99']:>9.1f}")
+        print()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
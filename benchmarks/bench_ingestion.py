@@ -0,0 +1,122 @@
+# benchmarks/bench_ingestion.py
+"""
+Offline ingestion throughput (pages/sec) and peak memory on a synthetic corpus.
+
+    python benchmarks/bench_ingestion.py
+    python benchmarks/bench_ingestion.py --pdfs 40 --pages 50 --decks 20 --slides 30 --workers 1 4
+
+Generates PDFs (with PyMuPDF) and PPTX decks (with python-pptx) in a temp
+directory, then runs offline/splitter.py:split_documents (load → group →
+split → write chunks) once per configuration, each in a fresh process so
+peak RSS numbers do not mix.
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+from common import Timer, peak_rss_mb, project_root
+
+sys.path.insert(0, os.path.join(project_root, "offline"))
+
+PARAGRAPH = (
+    "Object detectors slide a window over the image and classify every crop. "
+    "Anchor boxes let one grid cell predict several objects of different shapes, "
+    "and non-max suppression keeps the most confident of overlapping boxes. "
+)
+
+
+def build_corpus(raw_dir: Path, pdfs: int, pages: int, decks: int, slides: int) -> int:
+    import pymupdf as fitz
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    raw_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(pdfs):
+        doc = fitz.open()
+        for p in range(pages):
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 550, 800), f"Lecture {i} page {p}\n" + PARAGRAPH * 8)
+        doc.save(str(raw_dir / f"lecture_{i:03d}.pdf"))
+        doc.close()
+    for i in range(decks):
+        prs = Presentation()
+        for s in range(slides):
+            slide = prs.slides.add_slide(prs.slide_layouts[5])
+            slide.shapes.title.text = f"Deck {i} slide {s}"
+            box = slide.shapes.add_textbox(Inches(1), Inches(2), Inches(8), Inches(4))
+            box.text_frame.text = PARAGRAPH * 2
+        prs.save(str(raw_dir / f"deck_{i:03d}.pptx"))
+    return pdfs * pages + decks * slides
+
+
+def _run(data_dir, workers, pdf_backend, out_queue):
+    import contextlib
+    import io
+    from splitter import split_documents
+
+    with Timer() as t, contextlib.redirect_stdout(io.StringIO()):
+        n_chunks = split_documents(data_dir, workers=workers, pdf_backend=pdf_backend)
+    out_queue.put({
+        "seconds":  t.elapsed,
+        "chunks":   n_chunks,
+        # loader workers are children of this process
+        "peak_rss_mb":          peak_rss_mb(),
+        "peak_rss_children_mb": peak_rss_mb(include_children=True),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=30, help="pages per PDF")
+    parser.add_argument("--decks", type=int, default=10)
+    parser.add_argument("--slides", type=int, default=20, help="slides per deck")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--backends", nargs="+", default=["pypdf", "pymupdf"])
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    data_dir = Path(tempfile.mkdtemp(prefix="ingest_bench_"))
+    try:
+        total_pages = build_corpus(data_dir / "raw", args.pdfs, args.pages, args.decks, args.slides)
+        print(f"corpus: {args.pdfs} PDFs x {args.pages} pages + {args.decks} decks x {args.slides} slides "
+              f"= {total_pages} pages\n")
+
+        ctx     = mp.get_context("spawn")
+        results = []
+        for backend in args.backends:
+            for workers in args.workers:
+                shutil.rmtree(data_dir / "chunks", ignore_errors=True)
+                queue = ctx.Queue()
+                proc  = ctx.Process(target=_run, args=(str(data_dir), workers, backend, queue))
+                proc.start()
+                row = queue.get()
+                proc.join()
+                row.update({
+                    "backend":       backend,
+                    "workers":       workers,
+                    "pages":         total_pages,
+                    "pages_per_sec": total_pages / row["seconds"],
+                })
+                results.append(row)
+
+        print(f"{'backend':>8} {'workers':>8} {'pages/s':>9} {'seconds':>8} {'chunks':>7} {'peak MB':>8} {'+workers':>9}")
+        for r in results:
+            print(f"{r['backend']:>8} {r['workers']:>8} {r['pages_per_sec']:>9.1f} {r['seconds']:>8.2f} "
+                  f"{r['chunks']:>7} {r['peak_rss_mb'] or 0:>8.0f} {r['peak_rss_children_mb'] or 0:>9.0f}")
+
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
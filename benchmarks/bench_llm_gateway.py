@@ -0,0 +1,141 @@
+# benchmarks/bench_llm_gateway.py
+"""
+LLM gateway under a mixed load, against the stub Ollama server (no GPU needed).
+
+    python benchmarks/bench_llm_gateway.py
+    python benchmarks/bench_llm_gateway.py --translate 40 --voice 10 --chat 10 --parallel 2 --output llm.json
+    python benchmarks/bench_llm_gateway.py --url http://localhost:11434     # a real Ollama
+
+A burst of translation requests arrives first, then voice and chat
+questions keep arriving at a steady rate, each in its own thread (as on
+the llm stage). The same workload runs twice: "fifo" (every request in one
+class, as before the gateway) and "priority" (voice > chat > translate).
+Reports per class: time to first token, total latency, timeouts and 503s.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+
+from common import Timer, summarize_ms
+from stub_ollama import serve
+
+PROMPTS = {
+    "voice":     "Reference context:\n" + "- Anchor boxes and grid cells. " * 60 + "\nStudent's new question: what are anchor boxes?",
+    "chat":      "Reference context:\n" + "- Non-max suppression. " * 60 + "\nStudent's new question: explain NMS",
+    "translate": "Translate the following English text into Arabic. Only return the translated text:\n\n" + "Anchor boxes. " * 40,
+}
+
+
+def workload(args) -> list:
+    """
+    [(start offset in seconds, class)], same for both modes.
+    """
+    rng  = random.Random(0)
+    jobs = [(0.0, "translate") for _ in range(args.translate)]
+    live = ["voice"] * args.voice + ["chat"] * args.chat
+    rng.shuffle(live)
+    jobs += [(0.2 + i * args.interval, cls) for i, cls in enumerate(live)]
+    return sorted(jobs, key=lambda j: j[0])
+
+
+def run_mode(gateway, jobs, use_priority: bool, timeouts: dict) -> dict:
+    from online.executors import StageSaturated
+    from online.llm.gateway import LLMTimeout
+
+    rows = []
+    lock = threading.Lock()
+    t0   = time.perf_counter()
+
+    def request(offset, cls):
+        time.sleep(max(0.0, t0 + offset - time.perf_counter()))
+        row   = {"class": cls, "outcome": "ok", "ttft": None, "total": None}
+        start = time.perf_counter()
+        try:
+            for i, _ in enumerate(gateway.stream(
+                PROMPTS[cls],
+                priority=cls if use_priority else "chat",
+                timeout=timeouts[cls],
+            )):
+                if i == 0:
+                    row["ttft"] = time.perf_counter() - start
+            row["total"] = time.perf_counter() - start
+        except LLMTimeout:
+            row["outcome"] = "timeout"
+        except StageSaturated:
+            row["outcome"] = "rejected"
+        with lock:
+            rows.append(row)
+
+    threads = [threading.Thread(target=request, args=job) for job in jobs]
+    with Timer() as wall:
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+
+    result = {"seconds": wall.elapsed, "classes": {}}
+    for cls in PROMPTS:
+        mine = [r for r in rows if r["class"] == cls]
+        ok   = [r for r in mine if r["outcome"] == "ok"]
+        result["classes"][cls] = {
+            "requests": len(mine),
+            "ok":       len(ok),
+            "timeouts": sum(r["outcome"] == "timeout" for r in mine),
+            "rejected": sum(r["outcome"] == "rejected" for r in mine),
+            "ttft_ms":  summarize_ms([r["ttft"] for r in ok if r["ttft"] is not None]),
+            "total_ms": summarize_ms([r["total"] for r in ok]),
+        }
+    result["gateway"] = gateway.stats()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Ollama to test against (default: start the stub)")
+    parser.add_argument("--translate", type=int, default=24, help="translation requests in the initial burst")
+    parser.add_argument("--voice", type=int, default=8)
+    parser.add_argument("--chat", type=int, default=8)
+    parser.add_argument("--interval", type=float, default=0.25, help="seconds between live questions")
+    parser.add_argument("--parallel", type=int, default=2, help="gateway max_in_flight (and stub parallelism)")
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--tokens-per-sec", type=float, default=60.0, help="stub decode speed")
+    parser.add_argument("--answer-tokens", type=int, default=40, help="stub answer length")
+    parser.add_argument("--timeout", type=float, nargs=3, default=[30, 30, 30], metavar=("VOICE", "CHAT", "TRANSLATE"))
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    from langchain_ollama import OllamaLLM
+    from online.llm.gateway import LLMGateway
+
+    url = args.url
+    if not url:
+        server, _ = serve(port=0, parallel=args.parallel, tokens_per_sec=args.tokens_per_sec,
+                          answer_tokens=args.answer_tokens)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+    llm      = OllamaLLM(model="llama3.1:8b", temperature=0, base_url=url)
+    timeouts = dict(zip(("voice", "chat", "translate"), args.timeout))
+    jobs     = workload(args)
+    print(f"{url}: {args.translate} translations at t=0, then {args.voice} voice + {args.chat} chat "
+          f"every {args.interval}s; {args.parallel} in flight\n")
+
+    results = {"workload": vars(args), "modes": {}}
+    for mode in ("fifo", "priority"):
+        gateway = LLMGateway(llm, max_in_flight=args.parallel, max_queue=args.max_queue)
+        results["modes"][mode] = run_mode(gateway, jobs, mode == "priority", timeouts)
+
+    print(f"{'mode':>9} {'class':>10} {'ok':>4} {'t/o':>4} {'503':>4} {'ttft p50':>9} {'ttft p95':>9} {'total p95':>10}")
+    for mode, res in results["modes"].items():
+        for cls, row in res["classes"].items():
+            print(f"{mode:>9} {cls:>10} {row['ok']:>4} {row['timeouts']:>4} {row['rejected']:>4} "
+                  f"{row['ttft_ms']['p50']:>9.0f} {row['ttft_ms']['p95']:>9.0f} {row['total_ms']['p95']:>10.0f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
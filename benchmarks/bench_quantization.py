@@ -0,0 +1,155 @@
+# benchmarks/bench_quantization.py
+"""
+Recall@k, query latency and size of quantized flat indexes (float16, int8)
+against the float32 index, on the data/chunks corpus.
+
+    python benchmarks/bench_quantization.py
+    python benchmarks/bench_quantization.py --scale 200000 --rescore-factor 1 2 4 8
+
+Chunks and queries are embedded with the retriever's model (through the
+offline embedding cache, so a second run encodes nothing). --scale grows
+the corpus to that many rows with jittered copies of the real vectors, to
+see where a degree programme's worth of chunks would land. Recall@k is the
+share of the float32 index's top k that each quantized index returns.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from common import Timer, project_root, summarize_ms
+
+sys.path.insert(0, os.path.join(project_root, "offline"))
+
+from bench_retrieval import QUERIES
+
+
+def load_vectors(data_dir: str, model_name: str, chunk_queries: int, seed: int):
+    """
+    (chunk vectors, query vectors): the QUERIES plus the first sentence of
+    `chunk_queries` random chunks.
+    """
+    from embedder import DEFAULT_CACHE_PATH, EmbeddingStage, load_chunk_documents
+    from online.config import get_setting
+
+    docs = load_chunk_documents(data_dir)
+    if not docs:
+        sys.exit(f"No chunks under {data_dir}/chunks; run offline/splitter.py first")
+    rng     = np.random.default_rng(seed)
+    picked  = rng.choice(len(docs), size=min(chunk_queries, len(docs)), replace=False)
+    queries = QUERIES + [docs[i].page_content.split(".")[0][:200] for i in picked]
+
+    stage = EmbeddingStage(
+        model_name,
+        batch_size=get_setting("embedding", "batch_size", 64),
+        cache_path=get_setting("embedding", "cache_path", DEFAULT_CACHE_PATH),
+    )
+    try:
+        chunks = stage.embed([doc.page_content for doc in docs])
+        # queries go through the same preprocessing, like HuggingFaceEmbeddings online
+        vectors = stage.embed(queries)
+    finally:
+        stage.close()
+    return chunks, vectors
+
+
+def grow(vectors, rows: int, seed: int, noise: float = 0.15):
+    """
+    `rows` vectors: the originals, then jittered copies of random ones.
+    """
+    if rows <= len(vectors):
+        return vectors
+    rng    = np.random.default_rng(seed)
+    scale  = noise * float(np.abs(vectors).mean())
+    extra  = vectors[rng.integers(0, len(vectors), rows - len(vectors))]
+    extra  = extra + rng.normal(0, scale, extra.shape).astype(np.float32)
+    return np.concatenate([vectors, extra.astype(np.float32)])
+
+
+def build(root: str, quantization: str, vectors) -> str:
+    from langchain.schema import Document
+    from online.retrieval.flat_index import write_flat_index
+
+    persist_dir = os.path.join(root, quantization)
+    ids         = [str(i) for i in range(len(vectors))]
+    write_flat_index(persist_dir, ids, vectors, [Document(page_content="", metadata={}) for _ in ids],
+                     quantization=quantization)
+    return persist_dir
+
+
+def measure(persist_dir: str, queries, top_k: int, repeats: int, rescore_factor: int) -> dict:
+    from online.retrieval.flat_index import FlatIndex
+
+    index = FlatIndex(persist_dir, rescore_factor=rescore_factor)
+    times = []
+    for _ in range(repeats):
+        for query in queries:
+            with Timer() as t:
+                index.search_by_vector(query, k=top_k)
+            times.append(t.elapsed)
+    hits    = [[doc.id for doc, _ in hits] for hits in index.search_by_vector(queries, k=top_k)]
+    scanned = index.quantized if index.quantized is not None else index.embeddings
+    files   = [f for f in os.listdir(persist_dir) if f.endswith(".npy")]
+    return {
+        "quantization":   index.quantization,
+        "rescore_factor": rescore_factor if index.quantized is not None else None,
+        "search_ms":      summarize_ms(times),
+        "scanned_mb":     (scanned.nbytes + (index.scales.nbytes if index.scales is not None else 0)) / 2**20,
+        "float32_mb":     os.path.getsize(index.files["embeddings"]) / 2**20,
+        "disk_mb":        sum(os.path.getsize(os.path.join(persist_dir, f)) for f in files) / 2**20,
+        "hits":           hits,
+    }
+
+
+def recall(exact, approx, k: int) -> float:
+    return float(np.mean([len(set(a[:k]) & set(e[:k])) / k for e, a in zip(exact, approx)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir",       default="data")
+    parser.add_argument("--model",          default="multi-qa-mpnet-base-dot-v1")
+    parser.add_argument("--scale",          type=int, default=0, help="grow the corpus to this many vectors")
+    parser.add_argument("--chunk-queries",  type=int, default=56, help="extra queries taken from chunk text")
+    parser.add_argument("--top-k",          type=int, default=3)
+    parser.add_argument("--rescore-factor", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeats",        type=int, default=5)
+    parser.add_argument("--seed",           type=int, default=0)
+    parser.add_argument("--output",         help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    chunks, queries = load_vectors(args.data_dir, args.model, args.chunk_queries, args.seed)
+    corpus = grow(chunks, args.scale, args.seed)
+    print(f"{len(corpus)} vectors of dim {corpus.shape[1]}, {len(queries)} queries, top_k={args.top_k}")
+
+    root = tempfile.mkdtemp(prefix="bench_quantization_")
+    try:
+        exact   = measure(build(root, "none", corpus), queries, args.top_k, args.repeats, 1)
+        results = [exact]
+        for quantization in ("float16", "int8"):
+            persist_dir = build(root, quantization, corpus)
+            for factor in args.rescore_factor:
+                results.append(measure(persist_dir, queries, args.top_k, args.repeats, factor))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    exact_hits = exact["hits"]
+    print(f"\n{'index':>8} {'rescore':>7} {'recall@k':>8} {'p50 ms':>8} {'p95 ms':>8} {'scanned MB':>10} {'disk MB':>8}")
+    for r in results:
+        r["recall_at_k"] = recall(exact_hits, r.pop("hits"), args.top_k)
+        print(f"{r['quantization']:>8} {r['rescore_factor'] or '-':>7} {r['recall_at_k']:>8.3f} "
+              f"{r['search_ms']['p50']:>8.3f} {r['search_ms']['p95']:>8.3f} {r['scanned_mb']:>10.1f} {r['disk_mb']:>8.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"vectors": len(corpus), "queries": len(queries), "top_k": args.top_k, "results": results},
+                      f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
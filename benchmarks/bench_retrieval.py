@@ -0,0 +1,130 @@
+# benchmarks/bench_retrieval.py
+"""
+Compare query latency and memory of the Chroma and NumPy flat backends.
+
+Build both indexes first, e.g.:
+    python offline/indexer.py --backend chroma --persist-dir db/chroma_index
+    python offline/indexer.py --backend numpy  --persist-dir db/flat_index
+Then:
+    python benchmarks/bench_retrieval.py --chroma-dir db/chroma_index --flat-dir db/flat_index
+
+Each backend runs in its own process so RSS numbers do not mix.
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+
+from common import Timer, peak_rss_mb, rss_mb, summarize_ms
+
+QUERIES = [
+    "What is class recognition?",
+    "What is YOLO?",
+    "Explain non-max suppression",
+    "How does a sliding window detector work?",
+    "What is intersection over union?",
+    "What are anchor boxes?",
+    "How do convolutional layers extract features?",
+    "What is transfer learning in computer vision?",
+]
+
+
+def _run_backend(backend, persist_dir, model_name, top_k, repeats, out_queue):
+    from online.retrieval.retriever import Retriever
+
+    base_rss = rss_mb()
+    with Timer() as load:
+        # caches off: measure the index, not the query cache
+        retriever = Retriever(persist_dir=persist_dir, model_name=model_name, backend=backend, cache_size=0)
+    loaded_rss = rss_mb()
+
+    vectors = retriever.embeddings.embed_documents(QUERIES)
+    index   = retriever.vectordb
+
+    def search_vector(vector):
+        if backend == "numpy":
+            return index.search_by_vector(vector, k=top_k)[0]
+        return index.similarity_search_by_vector_with_relevance_scores(vector, k=top_k)
+
+    # index-only latency (query already embedded)
+    search_times = []
+    top_hits     = []
+    for _ in range(repeats):
+        for vector in vectors:
+            with Timer() as t:
+                search_vector(vector)
+            search_times.append(t.elapsed)
+    for vector in vectors:
+        top_hits.append([doc.page_content for doc, _ in search_vector(vector)])
+
+    # end-to-end latency (embed + search), as the server sees it
+    e2e_times = []
+    for _ in range(repeats):
+        for query in QUERIES:
+            with Timer() as t:
+                retriever.search(query, top_k=top_k, min_score=float("-inf"))
+            e2e_times.append(t.elapsed)
+
+    out_queue.put({
+        "backend":      backend,
+        "persist_dir":  persist_dir,
+        "load_s":       load.elapsed,
+        "search_ms":    summarize_ms(search_times),
+        "end_to_end_ms": summarize_ms(e2e_times),
+        "rss_base_mb":  base_rss,
+        "rss_loaded_mb": loaded_rss,
+        "rss_final_mb": rss_mb(),
+        "peak_rss_mb":  peak_rss_mb(),
+        "top_hits":     top_hits,
+    })
+
+
+def run(backend, persist_dir, model_name, top_k, repeats):
+    ctx   = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc  = ctx.Process(
+        target=_run_backend,
+        args=(backend, persist_dir, model_name, top_k, repeats, queue),
+    )
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chroma-dir", default="db/chroma_index")
+    parser.add_argument("--flat-dir",   default="db/flat_index")
+    parser.add_argument("--model",      default="multi-qa-mpnet-base-dot-v1")
+    parser.add_argument("--top-k",      type=int, default=3)
+    parser.add_argument("--repeats",    type=int, default=20)
+    parser.add_argument("--output",     help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = [
+        run("chroma", args.chroma_dir, args.model, args.top_k, args.repeats),
+        run("numpy",  args.flat_dir,   args.model, args.top_k, args.repeats),
+    ]
+
+    # how often both backends agree on the best chunk
+    chroma_top, flat_top = results[0].pop("top_hits"), results[1].pop("top_hits")
+    agree = sum(1 for a, b in zip(chroma_top, flat_top) if a[:1] == b[:1])
+
+    for r in results:
+        print(f"\n[{r['backend']}] {r['persist_dir']}")
+        print(f"  load:          {r['load_s']:.2f} s")
+        print(f"  search p50/p95: {r['search_ms']['p50']:.3f} / {r['search_ms']['p95']:.3f} ms")
+        print(f"  e2e    p50/p95: {r['end_to_end_ms']['p50']:.2f} / {r['end_to_end_ms']['p95']:.2f} ms")
+        if r["rss_loaded_mb"] is not None:
+            print(f"  RSS:           {r['rss_base_mb']:.0f} → {r['rss_loaded_mb']:.0f} → {r['rss_final_mb']:.0f} MB"
+                  f" (peak {r['peak_rss_mb'] or float('nan'):.0f} MB)")
+    print(f"\nTop-1 agreement: {agree}/{len(QUERIES)} queries")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"results": results, "top1_agreement": agree}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/bench_stt_batching.py
+"""
+Throughput of concurrent transcriptions with and without the STT micro-batcher.
+
+    python benchmarks/bench_stt_batching.py --audio question.wav
+    python benchmarks/bench_stt_batching.py --concurrency 1 4 16 --output stt.json
+
+For every concurrency level N, N client threads each transcribe `--clips`
+clips back to back, once calling whisper_stt.transcribe directly (one decode
+per request, as before) and once through STTBatcher. Without --audio a
+synthetic 4 s clip is used, which is enough for timing but not for text.
+"""
+
+import argparse
+import json
+import threading
+
+import numpy as np
+
+from common import Timer, summarize_ms
+
+SAMPLE_RATE = 16000
+
+
+def synthetic_clip(seconds: float = 4.0) -> np.ndarray:
+    # voiced-looking signal: a few harmonics with a syllable-rate envelope
+    t        = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 3 * t))
+    voice    = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((140, 280, 420, 560)))
+    noise    = np.random.default_rng(0).normal(0, 0.01, t.size)
+    return (0.2 * envelope * voice + noise).astype(np.float32)
+
+
+def run_level(transcribe_one, clip, concurrency: int, clips: int) -> dict:
+    latencies = []
+    lock      = threading.Lock()
+
+    def client():
+        for _ in range(clips):
+            with Timer() as t:
+                transcribe_one(clip)
+            with lock:
+                latencies.append(t.elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    with Timer() as wall:
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+    return {
+        "concurrency":   concurrency,
+        "clips":         len(latencies),
+        "clips_per_sec": len(latencies) / wall.elapsed,
+        "latency_ms":    summarize_ms(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", help="clip to transcribe (any format faster-whisper can decode)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--clips", type=int, default=4, help="clips per client thread")
+    parser.add_argument("--window-ms", type=float, default=50)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    from online.stt.scheduler import STTBatcher
+    from online.stt.whisper_stt import transcribe, transcribe_batch
+
+    if args.audio:
+        from faster_whisper import decode_audio
+        clip = decode_audio(args.audio, sampling_rate=SAMPLE_RATE)
+    else:
+        clip = synthetic_clip()
+
+    transcribe(clip)   # warm up
+    batcher = STTBatcher(transcribe_batch, window_ms=args.window_ms, max_batch=args.max_batch)
+
+    results = {"clip_seconds": clip.size / SAMPLE_RATE, "single": [], "batched": []}
+    for n in args.concurrency:
+        results["single"].append(run_level(transcribe, clip, n, args.clips))
+        results["batched"].append(run_level(batcher.transcribe, clip, n, args.clips))
+    results["batcher"] = batcher.stats()
+    batcher.shutdown()
+
+    print(f"clip: {results['clip_seconds']:.1f} s")
+    print(f"{'clients':>8} {'mode':>8} {'clips/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for single, batched in zip(results["single"], results["batched"]):
+        for mode, row in (("single", single), ("batched", batched)):
+            lat = row["latency_ms"]
+            print(f"{row['concurrency']:>8} {mode:>8} {row['clips_per_sec']:>9.2f} "
+                  f"{lat['p50']:>9.1f} {lat['p95']:>9.1f} {lat['p99']:>9.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
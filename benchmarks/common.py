@@ -0,0 +1,75 @@
+# benchmarks/common.py
+
+import math
+import os
+import sys
+import time
+
+# make sure project root is importable
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+
+def rss_mb():
+    """
+    Current resident set size of this process in MB (None if unknown).
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb(include_children: bool = False):
+    """
+    Peak resident set size in MB (Unix only; None elsewhere).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    who   = resource.RUSAGE_CHILDREN if include_children else resource.RUSAGE_SELF
+    peak  = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values, pct: float) -> float:
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize_ms(samples_s):
+    """
+    Latency summary (in ms) for a list of durations in seconds.
+    """
+    ms = [s * 1000 for s in samples_s]
+    return {
+        "n":    len(ms),
+        "mean": sum(ms) / len(ms) if ms else float("nan"),
+        "p50":  percentile(ms, 50),
+        "p95":  percentile(ms, 95),
+        "p99":  percentile(ms, 99),
+    }
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
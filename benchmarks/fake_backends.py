@@ -0,0 +1,212 @@
+# benchmarks/fake_backends.py
+"""
+Offline stand-ins for the models behind the tutor, each with configurable
+latency, so the whole request pipeline can be benchmarked without Whisper,
+Ollama or a TTS engine (see bench_e2e.py).
+
+- FakeWhisper: replaces online/stt/whisper_stt.py. Install it with
+  install_fake_stt() BEFORE online.server is imported, because the server
+  binds the module's functions at import time.
+- the LLM is the stub Ollama HTTP server (stub_ollama.py); use_llm() points
+  the gateway at it, so the real client, gateway and streaming code run.
+
+Each install_* also registers the stand-in in the model registry
+(online/models.py), so the startup warmup and /readyz see it instead of
+loading the real model.
+- FakeRetriever: canned chunks after a fixed delay (or use the real index).
+- FakeTTSService: writes silent WAVs after a delay proportional to the
+  text, through the real content-addressed audio cache.
+"""
+
+import itertools
+import sys
+import tempfile
+import threading
+import time
+import types
+import wave
+
+SAMPLE_RATE = 16000
+
+QUESTIONS = [
+    "What are anchor boxes used for in object detection?",
+    "How does non-max suppression choose between overlapping boxes?",
+    "What is the difference between classification and localization?",
+    "Why does YOLO divide the image into a grid?",
+    "What does intersection over union measure?",
+    "How is a sliding window detector made faster with convolutions?",
+]
+
+CHUNK_TEXT = (
+    "Anchor boxes are predefined shapes assigned to each grid cell. The network predicts offsets "
+    "from them, so one cell can detect several objects of different aspect ratios. Non-max "
+    "suppression discards boxes that overlap a more confident box by more than an IoU threshold."
+)
+
+
+def _sleep_ms(ms: float) -> None:
+    if ms > 0:
+        time.sleep(ms / 1000)
+
+
+# ─── STT ───
+class FakeWhisper:
+    """
+    Returns questions round-robin after base_ms + per_audio_second_ms per
+    second of audio. A batch of n clips costs one base_ms plus
+    batch_item_ms for every extra clip, like the real batched decode.
+    """
+
+    def __init__(self, base_ms: float = 300, per_audio_second_ms: float = 40, batch_item_ms: float = 60,
+                 questions=QUESTIONS):
+        self.base_ms             = base_ms
+        self.per_audio_second_ms = per_audio_second_ms
+        self.batch_item_ms       = batch_item_ms
+        self._questions          = itertools.cycle(questions)
+        self._lock               = threading.Lock()
+
+    def _next_question(self) -> str:
+        with self._lock:
+            return next(self._questions)
+
+    def transcribe(self, audio) -> str:
+        seconds = getattr(audio, "size", 0) / SAMPLE_RATE
+        _sleep_ms(self.base_ms + self.per_audio_second_ms * seconds)
+        return self._next_question()
+
+    def transcribe_partial(self, audio) -> str:
+        seconds = getattr(audio, "size", 0) / SAMPLE_RATE
+        _sleep_ms((self.base_ms + self.per_audio_second_ms * seconds) / 2)
+        return self._next_question()
+
+    def transcribe_batch(self, audios) -> list:
+        longest = max((getattr(a, "size", 0) for a in audios), default=0) / SAMPLE_RATE
+        _sleep_ms(self.base_ms + self.batch_item_ms * (len(audios) - 1) + self.per_audio_second_ms * longest)
+        return [self._next_question() for _ in audios]
+
+
+def install_fake_stt(stt: FakeWhisper) -> None:
+    """
+    Register `stt` as online.stt.whisper_stt (must run before online.server is imported).
+    """
+    if "online.server" in sys.modules:
+        raise RuntimeError("install_fake_stt() must run before online.server is imported")
+    from online.models import get_model_registry
+    registry = get_model_registry()
+    registry.register("whisper", lambda: stt)
+
+    # like the real module, every call goes through the registry (so /readyz sees the load)
+    module = types.ModuleType("online.stt.whisper_stt")
+    module.SAMPLE_RATE        = SAMPLE_RATE
+    module.get_model          = lambda: registry.get("whisper")
+    module.transcribe         = lambda audio: module.get_model().transcribe(audio)
+    module.transcribe_partial = lambda audio: module.get_model().transcribe_partial(audio)
+    module.transcribe_batch   = lambda audios: module.get_model().transcribe_batch(audios)
+    sys.modules["online.stt.whisper_stt"] = module
+
+
+# ─── LLM ───
+def use_llm(base_url: str) -> None:
+    """
+    Send every LLM call of the running app to the Ollama at base_url.
+    """
+    from langchain_ollama import OllamaLLM
+    from online.llm import inference
+    from online.models import get_model_registry
+
+    get_model_registry().register(
+        "llm",
+        lambda: OllamaLLM(model=inference.LLM_MODEL, temperature=0, base_url=base_url),
+        warmup=inference._warmup_llm,
+    )
+
+
+# ─── Retrieval ───
+class FakeRetriever:
+    """
+    Same surface as online.retrieval.retriever.Retriever, returning
+    `chunks` canned chunks after latency_ms.
+    """
+
+    def __init__(self, latency_ms: float = 20, chunks: int = 3):
+        from langchain.schema import Document
+
+        self.latency_ms = latency_ms
+        self.chunks     = [
+            Document(id=f"lecture_01-{i + 1}", page_content=CHUNK_TEXT, metadata={"source": "lecture_01.pdf", "page": i + 1})
+            for i in range(chunks)
+        ]
+
+    generation = 0
+
+    def search(self, query: str, top_k: int = 3, min_score: float = 0.0):
+        _sleep_ms(self.latency_ms)
+        return self.chunks[:top_k]
+
+    def embed_queries(self, queries):
+        # deterministic per text, so a repeated question hits the answer cache
+        import hashlib
+        import numpy as np
+        return np.stack([
+            np.random.default_rng(int(hashlib.sha1(q.encode("utf-8")).hexdigest()[:8], 16)).standard_normal(64)
+            for q in queries
+        ]).astype(np.float32)
+
+    def cache_stats(self) -> dict:
+        return {}
+
+    def reload(self) -> None:
+        pass
+
+
+def install_fake_retrieval(server, retriever: FakeRetriever) -> None:
+    from online.models import get_model_registry
+    get_model_registry().register("retriever", lambda: retriever)
+    server.get_retriever       = lambda *args, **kwargs: retriever
+    server.get_relevant_chunks = lambda query, top_k=3, **kwargs: retriever.search(query, top_k=top_k)
+
+
+# ─── TTS ───
+def _write_silence(path: str, seconds: float) -> None:
+    with wave.open(path, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SAMPLE_RATE)
+        out.writeframes(b"\0\0" * int(seconds * SAMPLE_RATE))
+
+
+def fake_tts_service(base_ms: float = 50, ms_per_char: float = 4, cache_dir: str = None):
+    """
+    A TTSService whose synthesis sleeps base_ms + ms_per_char * len(text)
+    and writes silence (about 60 ms per character) instead of running pyttsx3.
+    """
+    from online.tts.tts_service import AudioCache, TTSService
+
+    class FakeTTSService(TTSService):
+        def __init__(self):
+            self.rate  = 0
+            self.voice = "fake"
+            self.cache = AudioCache(cache_dir or tempfile.mkdtemp(prefix="tts_bench_"))
+
+        def synthesize_cached(self, text: str) -> str:
+            key    = AudioCache.key(text, self.voice, self.rate)
+            cached = self.cache.get(key)
+            if cached:
+                return cached
+            _sleep_ms(base_ms + ms_per_char * len(text))
+            tmp_path = self.cache.tmp_path(key)
+            _write_silence(tmp_path, 0.06 * len(text))
+            return self.cache.put(key, tmp_path)
+
+        def warmup(self) -> None:
+            pass
+
+        def shutdown(self) -> None:
+            pass
+
+    return FakeTTSService()
+
+
+def install_fake_tts(service) -> None:
+    from online.models import get_model_registry
+    get_model_registry().register("tts", lambda: service)
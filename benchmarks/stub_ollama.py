@@ -0,0 +1,194 @@
+# benchmarks/stub_ollama.py
+"""
+A stand-in for the Ollama HTTP API, for load-testing the tutor offline.
+
+    python benchmarks/stub_ollama.py --port 11435 --parallel 2 --tokens-per-sec 30
+
+then point the server at it (llm.base_url in settings.yaml, or
+OLLAMA_HOST=http://127.0.0.1:11435). /api/generate streams a canned answer
+as NDJSON like Ollama does, after a prefill delay proportional to the
+prompt length (each request gets its words in a different order, so
+answers do not hit the TTS cache). At most --parallel requests generate at once
+and the rest queue (like OLLAMA_NUM_PARALLEL); a client that disconnects
+stops its generation. GET /stub/stats returns request counters.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = (
+    "Anchor boxes let a single grid cell predict several objects of different shapes. "
+    "Each box has a prior width and height, and the network predicts offsets from it. "
+    "Non-max suppression then keeps the most confident of the overlapping boxes. "
+)
+
+
+class StubOllama:
+    """
+    Timing model and counters shared by all request handlers.
+    """
+
+    def __init__(self, parallel: int = 1, tokens_per_sec: float = 30.0, prefill_ms_per_1k: float = 250.0,
+                 answer_tokens: int = 60):
+        self.tokens_per_sec    = tokens_per_sec
+        self.prefill_ms_per_1k = prefill_ms_per_1k
+        self.answer_tokens     = answer_tokens
+        self.slots             = threading.Semaphore(parallel)
+        self.parallel          = parallel
+        self._lock             = threading.Lock()
+        self.counters          = {"requests": 0, "completed": 0, "cancelled": 0, "running": 0, "max_running": 0}
+
+    def count(self, key: str, delta: int = 1) -> int:
+        with self._lock:
+            self.counters[key] += delta
+            if key == "running":
+                self.counters["max_running"] = max(self.counters["max_running"], self.counters["running"])
+            return self.counters[key]
+
+    def tokens(self, n: int, seed: int = 0):
+        words = ANSWER.split()
+        random.Random(seed).shuffle(words)
+        return [words[i % len(words)] + " " for i in range(n)]
+
+    def prefill_seconds(self, prompt: str) -> float:
+        return len(prompt) / 4 / 1000 * self.prefill_ms_per_1k / 1000
+
+
+def make_handler(stub: StubOllama):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _chunk(self, payload: dict) -> None:
+            line = (json.dumps(payload) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path == "/stub/stats":
+                with stub._lock:
+                    self._json(200, dict(stub.counters, parallel=stub.parallel))
+            elif self.path == "/api/tags":
+                self._json(200, {"models": [{"name": "llama3.1:8b", "model": "llama3.1:8b"}]})
+            elif self.path == "/api/version":
+                self._json(200, {"version": "0.0.0-stub"})
+            else:
+                self._json(200, {"status": "Ollama is running"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body   = json.loads(self.rfile.read(length) or b"{}")
+            if self.path != "/api/generate":
+                self._json(404, {"error": f"{self.path} is not stubbed"})
+                return
+
+            number   = stub.count("requests")
+            prompt   = body.get("prompt", "")
+            n_tokens = min(stub.answer_tokens, (body.get("options") or {}).get("num_predict") or stub.answer_tokens)
+            stream   = body.get("stream", True)
+            started  = time.perf_counter()
+            with stub.slots:
+                stub.count("running")
+                try:
+                    self._generate(body, prompt, n_tokens, number, stream, started)
+                except (BrokenPipeError, ConnectionResetError):
+                    stub.count("cancelled")
+                    self.close_connection = True
+                finally:
+                    stub.count("running", -1)
+
+        def _generate(self, body, prompt, n_tokens, number, stream, started):
+            model = body.get("model", "llama3.1:8b")
+            time.sleep(stub.prefill_seconds(prompt))
+            if stream:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+            parts = []
+            for token in stub.tokens(n_tokens, seed=number):
+                time.sleep(1 / stub.tokens_per_sec)
+                parts.append(token)
+                if stream:
+                    self._chunk({"model": model, "created_at": _now(), "response": token, "done": False})
+
+            final = {
+                "model":             model,
+                "created_at":        _now(),
+                "response":          "" if stream else "".join(parts),
+                "done":              True,
+                "done_reason":       "stop",
+                "total_duration":    int((time.perf_counter() - started) * 1e9),
+                "prompt_eval_count": len(prompt) // 4,
+                "eval_count":        n_tokens,
+            }
+            if stream:
+                self._chunk(final)
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+            else:
+                self._json(200, final)
+            stub.count("completed")
+
+    return Handler
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def serve(host: str = "127.0.0.1", port: int = 11435, **kwargs):
+    """
+    Start the stub in a background thread; returns (server, stub).
+    Port 0 picks a free port (server.server_address[1]).
+    """
+    stub   = StubOllama(**kwargs)
+    server = ThreadingHTTPServer((host, port), make_handler(stub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stub
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--parallel", type=int, default=1, help="concurrent generations (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--tokens-per-sec", type=float, default=30.0)
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=250.0, help="prefill time per 1000 prompt tokens")
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    args = parser.parse_args()
+
+    server, _ = serve(
+        args.host, args.port,
+        parallel=args.parallel,
+        tokens_per_sec=args.tokens_per_sec,
+        prefill_ms_per_1k=args.prefill_ms_per_1k,
+        answer_tokens=args.answer_tokens,
+    )
+    print(f"Stub Ollama listening on http://{args.host}:{server.server_address[1]} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# offline/build_corpora.py
+"""
+Split and index every course under `corpora.courses` in settings.yaml, one
+shard per course, several courses at once:
+
+    python offline/build_corpora.py                 # all configured courses
+    python offline/build_corpora.py cv101 nlp201    # just these (or "default")
+    python offline/build_corpora.py --workers 4 --full
+
+Each course runs splitter.split_documents and indexer.create_vectorstore on
+its own data_dir / persist_dir in a separate process, so it stays
+incremental per course. All courses share the on-disk embedding cache, so
+a slide deck used in two courses is encoded once. A running server picks a
+rebuilt course up on its own (or POST /reload_index/?course=<name>).
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# make sure project root is importable (shared settings + course layout)
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from online.config import get_setting
+from online.retrieval.corpora import course_config, course_names
+
+
+def build_course(name: str, full: bool = False, loader_workers: int = None) -> dict:
+    """
+    Split data_dir/raw into chunks and update the course's index.
+    """
+    from indexer import create_vectorstore
+    from splitter import split_documents
+
+    cfg   = course_config(name)
+    start = time.perf_counter()
+    print(f"📚 [{name}] {cfg['data_dir']} → {cfg['persist_dir']} ({cfg['backend']})")
+    n_chunks = split_documents(
+        cfg["data_dir"],
+        workers=loader_workers,
+        pdf_backend=get_setting("ingestion", "pdf_backend", "pymupdf"),
+        full=full,
+    )
+    create_vectorstore(
+        cfg["data_dir"],
+        persist_dir=cfg["persist_dir"],
+        backend=cfg["backend"],
+        full=full,
+        lazy_text=get_setting("vector_db", "lazy_text", False),
+        quantization=get_setting("vector_db", "quantization", "none"),
+    )
+    return {"course": name, "chunks": n_chunks, "seconds": time.perf_counter() - start}
+
+
+def build_corpora(names, workers: int = 2, full: bool = False) -> list:
+    """
+    Build the courses `names`, `workers` at a time. Each course's loader
+    pool gets an equal share of the CPUs (ingestion.workers if set).
+    Returns the failed course names.
+    """
+    workers        = max(1, min(workers, len(names)))
+    loader_workers = get_setting("ingestion", "workers", None) or max(1, (os.cpu_count() or 1) // workers)
+    failed         = []
+    start          = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(build_course, name, full, loader_workers): name for name in names}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ [{name}] failed: {e}")
+                failed.append(name)
+                continue
+            print(f"✅ [{name}] {result['chunks']} chunks in {result['seconds']:.1f}s")
+
+    print(f"Built {len(names) - len(failed)}/{len(names)} courses in {time.perf_counter() - start:.1f}s "
+          f"({workers} at a time)")
+    return failed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Split + index every course (corpora.courses) in parallel")
+    parser.add_argument("courses", nargs="*", help="course names (default: all configured; 'default' = data/)")
+    parser.add_argument("--workers", type=int, default=get_setting("corpora", "build_workers", 2),
+                        help="courses built at the same time")
+    parser.add_argument("--full", action="store_true", help="re-split and re-embed from scratch")
+    args = parser.parse_args()
+
+    names = args.courses or course_names()
+    if not names:
+        sys.exit("No courses configured under corpora.courses in config/settings.yaml")
+    for name in names:
+        course_config(name)   # unknown names fail here, before anything is built
+    sys.exit(1 if build_corpora(names, workers=args.workers, full=args.full) else 0)
@@ -1,22 +1,184 @@
 # offline/embedder.py
 
-import json
+import hashlib
+import os
+import sqlite3
+import sys
+import time
 from pathlib import Path
-from langchain.schema import Document
+
+import numpy as np
+
+# make sure project root is importable (shared chunk store format)
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from online.retrieval.chunk_store import ChunkStore, has_chunk_store, iter_legacy_chunks
 
 def load_chunk_documents(data_dir: str):
     """
-    Reads every chunk_NNNN.json from data/chunks, and
-    returns a list of Document(page_content, metadata) objects.
+    Reads every chunk from data/chunks and returns a list of
+    Document(page_content, metadata) objects. Each Document's id is its
+    chunk id (a content hash, so it is stable across runs; see
+    splitter.chunk_id).
+
+    Uses the packed store (chunks.idx.json) when present, otherwise the old
+    one-file-per-chunk layout (chunk_*.json).
     """
     chunks_dir = Path(data_dir) / "chunks"
-    docs = []
-    for chunk_file in sorted(chunks_dir.glob("chunk_*.json")):
-        payload = json.loads(chunk_file.read_text(encoding="utf-8"))
-        docs.append(
-            Document(
-                page_content=payload["page_content"],
-                metadata=payload["metadata"]
-            )
+    if has_chunk_store(chunks_dir):
+        store = ChunkStore(chunks_dir)
+        try:
+            return list(store)
+        finally:
+            store.close()
+    return list(iter_legacy_chunks(chunks_dir))
+
+
+# ─── Embedding stage: batched, multi-process, cached on disk ───
+DEFAULT_CACHE_PATH = "db/embedding_cache.sqlite"
+SQLITE_BATCH       = 500    # keep IN (...) lists under SQLite's variable limit
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent vectors keyed by (model_name, sha256(text)) in one SQLite
+    file, so rebuilding an index or switching vector backends never
+    re-encodes text that was embedded before.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # shards built in parallel (build_corpora.py) share this file: wait for
+        # each other's writes instead of failing with "database is locked"
+        self._db = sqlite3.connect(path, timeout=60)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            " model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
         )
-    return docs
+
+    def get_many(self, model_name: str, hashes) -> dict:
+        """
+        {text_hash: float32 vector} for the hashes that are cached.
+        """
+        hashes, found = list(hashes), {}
+        for i in range(0, len(hashes), SQLITE_BATCH):
+            batch = hashes[i:i + SQLITE_BATCH]
+            rows  = self._db.execute(
+                f"SELECT text_hash, vector FROM vectors WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                [model_name, *batch],
+            )
+            for h, blob in rows:
+                found[h] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model_name: str, hashes, vectors) -> None:
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO vectors (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model_name, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in zip(hashes, vectors)],
+            )
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class EmbeddingStage:
+    """
+    Encodes chunk text with sentence-transformers in `batch_size` batches,
+    across `workers` CPU processes when workers > 1, skipping every text
+    already in the EmbeddingCache. Vectors match what HuggingFaceEmbeddings
+    (used for queries online) produces for the same model.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int = 64,
+        workers: int = 1,
+        cache_path: str = DEFAULT_CACHE_PATH,
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.workers    = workers
+        self.cache      = EmbeddingCache(cache_path) if cache_path else None
+        self._model     = None
+        self.stats      = {}
+
+    def _encode(self, texts) -> np.ndarray:
+        from sentence_transformers import SentenceTransformer
+        if self._model is None:
+            self._model = SentenceTransformer(self.model_name)
+        # same preprocessing as langchain's HuggingFaceEmbeddings.embed_documents
+        texts = [text.replace("\n", " ") for text in texts]
+        if self.workers > 1 and len(texts) > self.batch_size:
+            pool = self._model.start_multi_process_pool(target_devices=["cpu"] * self.workers)
+            try:
+                return self._model.encode_multi_process(texts, pool, batch_size=self.batch_size)
+            finally:
+                self._model.stop_multi_process_pool(pool)
+        return self._model.encode(texts, batch_size=self.batch_size, show_progress_bar=False)
+
+    def embed(self, texts) -> np.ndarray:
+        """
+        float32 matrix (len(texts), dim), row-aligned with texts.
+        """
+        texts  = list(texts)
+        start  = time.perf_counter()
+        hashes = [text_hash(text) for text in texts]
+        cached = self.cache.get_many(self.model_name, set(hashes)) if self.cache else {}
+
+        todo = {}   # hash -> text, each distinct text encoded once
+        for h, text in zip(hashes, texts):
+            if h not in cached:
+                todo.setdefault(h, text)
+        if todo:
+            fresh = np.asarray(self._encode(list(todo.values())), dtype=np.float32)
+            if self.cache:
+                self.cache.put_many(self.model_name, todo.keys(), fresh)
+            cached.update(zip(todo.keys(), fresh))
+
+        elapsed = time.perf_counter() - start
+        self.stats = {
+            "chunks":          len(texts),
+            "encoded":         len(todo),
+            "cached":          len(texts) - sum(1 for h in hashes if h in todo),
+            "seconds":         elapsed,
+            "chunks_per_sec":  len(texts) / elapsed if elapsed else 0.0,
+            "encoded_per_sec": len(todo) / elapsed if elapsed and todo else 0.0,
+        }
+        print(f"🧮 Embedded {len(texts)} chunks in {elapsed:.1f}s ({self.stats['chunks_per_sec']:.1f} chunks/sec); "
+              f"{len(todo)} encoded, {self.stats['cached']} from cache")
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([cached[h] for h in hashes])
+
+    def close(self) -> None:
+        if self.cache:
+            self.cache.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    from online.config import get_setting
+
+    # warm the embedding cache for data/chunks and report throughput
+    parser = argparse.ArgumentParser(description="Embed data/chunks into the on-disk embedding cache")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--model", default="multi-qa-mpnet-base-dot-v1")
+    parser.add_argument("--batch-size", type=int, default=get_setting("embedding", "batch_size", 64))
+    parser.add_argument("--workers", type=int, default=get_setting("embedding", "workers", 1))
+    parser.add_argument("--cache", default=get_setting("embedding", "cache_path", DEFAULT_CACHE_PATH))
+    args = parser.parse_args()
+
+    docs  = load_chunk_documents(args.data_dir)
+    stage = EmbeddingStage(args.model, batch_size=args.batch_size, workers=args.workers, cache_path=args.cache)
+    stage.embed([doc.page_content for doc in docs])
+    stage.close()
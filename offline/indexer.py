@@ -1,17 +1,31 @@
 # offline/indexer.py
 
+import json
+import os
+import sys
 import warnings
 import shutil
 from pathlib import Path
 
+import numpy as np
+
 # silence LangChain deprecation notices
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
+# make sure project root is importable (shared online/ index formats + settings)
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
 # use the community packages to avoid deprecation warnings
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
+from langchain.schema import Document
 
-from embedder import load_chunk_documents  # your loader for data/chunks
+from embedder import DEFAULT_CACHE_PATH, EmbeddingStage, load_chunk_documents  # your loader for data/chunks
+from online.config import get_setting
+from online.retrieval.flat_index import QUANTIZATIONS, flat_index_files, write_flat_index
+
+INDEX_MANIFEST = "index_manifest.json"   # backend + embedding model the index was built with
+CHROMA_BATCH   = 1000                    # stay under Chroma's max add/delete batch
 
 def sanitize_metadata(documents):
     """
@@ -25,14 +39,115 @@ def sanitize_metadata(documents):
     return documents
 
 
+def _read_index_manifest(persist_dir: str) -> dict:
+    try:
+        return json.loads((Path(persist_dir) / INDEX_MANIFEST).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _without_text(docs):
+    # lazy_text: the index keeps ids + metadata; the server reads the text
+    # from the chunk store by id
+    return [Document(id=doc.id, page_content="", metadata=doc.metadata) for doc in docs]
+
+
+def _update_flat(persist_dir, docs, stage, lazy_text=False, quantization="none"):
+    """
+    Reuse stored vectors for chunk ids already in the flat index and embed
+    only the new ones; rows of chunks that no longer exist are dropped.
+    The quantized copy (if any) is recomputed from the float32 vectors.
+    """
+    ids     = [doc.id for doc in docs]
+    old_row = {}
+    files   = flat_index_files(persist_dir)
+    if files is not None:
+        old_vectors = np.load(files["embeddings"])   # in memory: the old generation is deleted below
+        old_row     = {str(chunk_id): row for row, chunk_id in enumerate(np.load(files["ids"]))}
+
+    new_docs = [doc for doc in docs if doc.id not in old_row]
+    stale    = len(set(old_row) - set(ids))
+    print(f"🔗 Embedding {len(new_docs)} new chunks; keeping {len(docs) - len(new_docs)}, dropping {stale} stale")
+    new_vectors = dict(zip(
+        (doc.id for doc in new_docs),
+        stage.embed([doc.page_content for doc in new_docs]) if new_docs else [],
+    ))
+    vectors = [old_vectors[old_row[i]] if i in old_row else new_vectors[i] for i in ids]
+    if not vectors:
+        # no chunks left: an empty (0, dim) index, so the server finds no hits instead of failing
+        vectors = np.zeros((0, old_vectors.shape[1] if files is not None else 0), dtype=np.float32)
+    write_flat_index(persist_dir, ids, vectors, _without_text(docs) if lazy_text else docs, quantization=quantization)
+    suffix = f" (+ {quantization} copy)" if quantization != "none" else ""
+    print(f"✅ Indexed {len(docs)} documents into flat index at '{persist_dir}'{suffix}")
+
+
+def _update_chroma(persist_dir, docs, stage, lazy_text=False):
+    """
+    Delete vectors of chunks that no longer exist and add only new chunks,
+    with vectors precomputed by the embedding stage.
+    """
+    # no embedding function: vectors are passed in, Chroma never encodes
+    vectordb = Chroma(persist_directory=persist_dir, embedding_function=None)
+    existing = set(vectordb.get(include=[])["ids"])
+    current  = {doc.id for doc in docs}
+
+    stale    = sorted(existing - current)
+    new_docs = [doc for doc in docs if doc.id not in existing]
+    print(f"🔗 Embedding {len(new_docs)} new chunks; keeping {len(current) - len(new_docs)}, dropping {len(stale)} stale")
+    for i in range(0, len(stale), CHROMA_BATCH):
+        vectordb.delete(ids=stale[i:i + CHROMA_BATCH])
+    vectors = stage.embed([doc.page_content for doc in new_docs]) if new_docs else []
+    for i in range(0, len(new_docs), CHROMA_BATCH):
+        batch = new_docs[i:i + CHROMA_BATCH]
+        vectordb._collection.upsert(
+            ids=[doc.id for doc in batch],
+            embeddings=[vector.tolist() for vector in vectors[i:i + CHROMA_BATCH]],
+            metadatas=[doc.metadata for doc in batch],
+            # lazy_text: store only ids + metadata; text comes from the chunk store
+            documents=["" if lazy_text else doc.page_content for doc in batch],
+        )
+    print(f"✅ Indexed {len(current)} documents into Chroma at '{persist_dir}'")
+
+
 def create_vectorstore(
     data_dir: str,
     persist_dir: str = "db/chroma_index",
     model_name: str = "multi-qa-mpnet-base-dot-v1",
+    backend: str = "chroma",
+    full: bool = False,
+    lazy_text: bool = False,
+    quantization: str = "none",
 ):
-    # 0) remove old index if present
+    """
+    backend "chroma": persisted Chroma collection (SQLite + HNSW).
+    backend "numpy":  flat float32 matrix + chunk ids + metadata sidecar,
+                      searched exactly by online/retrieval/flat_index.py.
+
+    Updates the existing index in place: chunk ids are content hashes, so
+    only chunks that are new since the last run are embedded and only
+    vectors of chunks that disappeared are deleted. The index is rebuilt
+    from scratch with `full=True`, or when it was built with another
+    backend or embedding model.
+
+    With `lazy_text=True` chunk text is left out of the index; the
+    retriever fetches it from the chunk store in data/chunks by id.
+
+    `quantization` ("float16" or "int8", numpy backend only) also stores
+    a quantized copy of the vectors, which the retriever scans before
+    rescoring the best candidates with the float32 vectors.
+    """
+    if backend not in ("chroma", "numpy"):
+        raise ValueError(f"Unknown vector_db type: {backend!r}")
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {quantization!r}")
+    if quantization != "none" and backend != "numpy":
+        print(f"⚠️  quantization '{quantization}' needs the numpy backend; Chroma keeps float32 vectors")
+        quantization = "none"
+
+    # 0) rebuild from scratch if asked to, or if the index is incompatible
     idx_path = Path(persist_dir)
-    if idx_path.exists():
+    info     = {"backend": backend, "model": model_name, "lazy_text": lazy_text}
+    if idx_path.exists() and (full or _read_index_manifest(persist_dir) != info):
         print(f"🗑️  Removing existing index at '{persist_dir}'")
         shutil.rmtree(persist_dir)
 
@@ -43,17 +158,44 @@ def create_vectorstore(
     # 2) Sanitize metadata
     docs = sanitize_metadata(docs)
 
-    # 3) Embed & index
-    print(f"🔗 Embedding & indexing {len(docs)} docs with '{model_name}'…")
-    embeddings = HuggingFaceEmbeddings(model_name=model_name)
-    vectordb = Chroma.from_documents(
-        documents=docs,
-        embedding=embeddings,
-        persist_directory=persist_dir,
+    # 3) Embed what is new (batched, cached on disk) & update the index
+    stage = EmbeddingStage(
+        model_name,
+        batch_size=get_setting("embedding", "batch_size", 64),
+        workers=get_setting("embedding", "workers", 1),
+        cache_path=get_setting("embedding", "cache_path", DEFAULT_CACHE_PATH),
     )
+    try:
+        if backend == "numpy":
+            _update_flat(persist_dir, docs, stage, lazy_text=lazy_text, quantization=quantization)
+        else:
+            _update_chroma(persist_dir, docs, stage, lazy_text=lazy_text)
+    finally:
+        stage.close()
 
-    print(f"✅ Indexed {len(docs)} documents into Chroma at '{persist_dir}'")
+    idx_path.mkdir(parents=True, exist_ok=True)
+    (idx_path / INDEX_MANIFEST).write_text(json.dumps(info), encoding="utf-8")
 
 
 if __name__ == "__main__":
-    create_vectorstore("data")
+    import argparse
+
+    # defaults come from vector_db in config/settings.yaml
+    parser = argparse.ArgumentParser(description="Embed data/chunks into a vector index")
+    parser.add_argument("--backend", default=get_setting("vector_db", "type", "chroma"),
+                        choices=["chroma", "numpy"])
+    parser.add_argument("--persist-dir", default=get_setting("vector_db", "persist_dir", "db/chroma_index"))
+    parser.add_argument("--full", action="store_true", help="delete the index and re-embed every chunk")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS,
+                        default=get_setting("vector_db", "quantization", "none"),
+                        help="numpy backend: also store float16 / int8 vectors for the first-pass scan")
+    args = parser.parse_args()
+
+    create_vectorstore(
+        "data",
+        persist_dir=args.persist_dir,
+        backend=args.backend,
+        full=args.full,
+        lazy_text=get_setting("vector_db", "lazy_text", False),
+        quantization=args.quantization,
+    )
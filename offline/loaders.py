@@ -1,50 +1,134 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from langchain_community.document_loaders import PyPDFLoader
+from typing import Iterator
+
 from pptx import Presentation
 from langchain.schema import Document
 
-def load_documents(data_dir: str) -> list[Document]:
+PDF_BACKENDS = ("pymupdf", "pypdf")
+
+
+def list_sources(data_dir: str) -> list[Path]:
     """
-    Scans data_dir/raw for .pdf and .pptx files,
-    loads them into Document objects, and returns a combined list.
+    All .pdf then .pptx files under data_dir/raw, in a stable order.
     """
-    docs: list[Document] = []
     raw_folder = Path(data_dir) / "raw"
+    return sorted(raw_folder.glob("*.pdf")) + sorted(raw_folder.glob("*.pptx"))
+
+
+# ——— PDFs ———
+def load_pdf_pages(pdf_path: Path, backend: str = "pymupdf") -> list[Document]:
+    """
+    One Document per page. "pymupdf" extracts text with PyMuPDF (much faster);
+    "pypdf" is the original PyPDFLoader path, also used if PyMuPDF is missing.
+    """
+    if backend == "pymupdf":
+        try:
+            import pymupdf as fitz
+        except ImportError:
+            try:
+                import fitz  # PyMuPDF < 1.24
+            except ImportError:
+                backend = "pypdf"
+
+    if backend == "pymupdf":
+        docs = []
+        with fitz.open(str(pdf_path)) as pdf:
+            for page_num, page in enumerate(pdf, start=1):
+                docs.append(Document(
+                    page_content=page.get_text(),
+                    metadata={"source": pdf_path.name, "page": page_num},
+                ))
+        return docs
+
+    from langchain_community.document_loaders import PyPDFLoader
+    pdf_docs = PyPDFLoader(str(pdf_path)).load()
+    for page_num, doc in enumerate(pdf_docs, start=1):
+        # annotate metadata
+        doc.metadata.update({
+            "source": pdf_path.name,
+            "page": page_num,
+        })
+    return pdf_docs
+
+
+# ——— PPTX via python-pptx ———
+def load_pptx_slides(ppt_path: Path) -> list[Document]:
+    prs = Presentation(str(ppt_path))
+    ppt_docs: list[Document] = []
+    for slide_idx, slide in enumerate(prs.slides, start=1):
+        texts = []
+        for shape in slide.shapes:
+            if hasattr(shape, "text") and shape.text.strip():
+                texts.append(shape.text.strip())
+        content = "\n".join(texts)
+        metadata = {
+            "source": ppt_path.name,
+            "slide_number": slide_idx,
+        }
+        ppt_docs.append(Document(page_content=content, metadata=metadata))
+    return ppt_docs
+
 
-    # ——— Load PDFs via PyPDFLoader ———
-    for pdf_path in raw_folder.glob("*.pdf"):
-        loader = PyPDFLoader(str(pdf_path))
-        pdf_docs = loader.load()
-        for page_num, doc in enumerate(pdf_docs, start=1):
-            # annotate metadata
-            doc.metadata.update({
-                "source": pdf_path.name,
-                "page": page_num,
-            })
-        docs.extend(pdf_docs)
-        print(f"Loaded {len(pdf_docs)} pages from {pdf_path.name}")
-
-    # ——— Load PPTX via python-pptx ———
-    for ppt_path in raw_folder.glob("*.pptx"):
-        prs = Presentation(str(ppt_path))
-        ppt_docs: list[Document] = []
-        for slide_idx, slide in enumerate(prs.slides, start=1):
-            texts = []
-            for shape in slide.shapes:
-                if hasattr(shape, "text") and shape.text.strip():
-                    texts.append(shape.text.strip())
-            content = "\n".join(texts)
-            metadata = {
-                "source": ppt_path.name,
-                "slide_number": slide_idx,
-            }
-            ppt_docs.append(Document(page_content=content, metadata=metadata))
-        docs.extend(ppt_docs)
-        print(f"Loaded {len(ppt_docs)} slides from {ppt_path.name}")
-
-    return docs
+def load_file(path: Path, pdf_backend: str = "pymupdf") -> list[Document]:
+    """
+    Pages (or slides) of one file. Runs inside a worker process.
+    """
+    if path.suffix.lower() == ".pdf":
+        return load_pdf_pages(path, backend=pdf_backend)
+    return load_pptx_slides(path)
+
+
+def iter_documents(
+    data_dir: str,
+    workers: int = None,
+    pdf_backend: str = "pymupdf",
+    files: list = None,
+) -> Iterator[Document]:
+    """
+    Yield page/slide Documents file by file, in list_sources() order (or
+    only for `files`, e.g. the ones that changed since the last run).
+    Files are parsed in a pool of `workers` processes (default: CPU count;
+    1 = in this process), with only a few files in flight at once so memory
+    stays bounded no matter how large data/raw grows.
+    """
+    files   = list_sources(data_dir) if files is None else list(files)
+    workers = workers or os.cpu_count() or 1
+
+    if workers <= 1 or len(files) <= 1:
+        for path in files:
+            docs = load_file(path, pdf_backend)
+            print(f"Loaded {len(docs)} pages from {path.name}")
+            yield from docs
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        queued  = iter(files)
+        for path in queued:
+            pending.append((path, pool.submit(load_file, path, pdf_backend)))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            path, future = pending.popleft()
+            docs = future.result()
+            next_path = next(queued, None)
+            if next_path is not None:
+                pending.append((next_path, pool.submit(load_file, next_path, pdf_backend)))
+            print(f"Loaded {len(docs)} pages from {path.name}")
+            yield from docs
+
+
+def load_documents(data_dir: str, workers: int = None, pdf_backend: str = "pymupdf") -> list[Document]:
+    """
+    Scans data_dir/raw for .pdf and .pptx files,
+    loads them into Document objects, and returns a combined list.
+    Prefer iter_documents() for large corpora.
+    """
+    return list(iter_documents(data_dir, workers=workers, pdf_backend=pdf_backend))
 
 if __name__ == "__main__":
     docs = load_documents("data")
     print(f"Total documents loaded: {len(docs)}")
-    
\ No newline at end of file
@@ -1,62 +1,192 @@
 # offline/splitter.py
 
+import argparse
+import hashlib
 import json
+import os
+import sys
 from pathlib import Path
 
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from loaders import load_documents  # your existing loader
+from loaders import PDF_BACKENDS, iter_documents, list_sources  # your existing loader
+
+# make sure project root is importable (shared settings)
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+
+from online.config import get_setting
+from online.retrieval.chunk_store import LEGACY_GLOB, ChunkStore, ChunkStoreWriter, has_chunk_store
+
+MANIFEST_FILE = "manifest.json"   # in data/chunks: source hashes -> chunk ids
+
+def _group(batch):
+    content = "\n\n".join(d.page_content for d in batch)
+    # keep the same metadata grouping
+    sources = [f"{d.metadata['source']} (page {d.metadata.get('page', d.metadata.get('slide_number', '?'))})"
+               for d in batch]
+    return Document(page_content=content, metadata={"sources": sources})
+
+def _iter_file_groups(docs, pages_per_chunk=1):
+    # (source file, grouped Document); groups never span two files, so one
+    # file can be re-split without touching its neighbours
+    batch = []
+    for doc in docs:
+        if batch and doc.metadata["source"] != batch[0].metadata["source"]:
+            yield batch[0].metadata["source"], _group(batch)
+            batch = []
+        batch.append(doc)
+        if len(batch) == pages_per_chunk:
+            yield doc.metadata["source"], _group(batch)
+            batch = []
+    if batch:
+        yield batch[0].metadata["source"], _group(batch)
+
+def iter_grouped(docs, pages_per_chunk=1):
+    """
+    Streaming group_documents(): yields each multi-page Document as soon as
+    its pages have arrived.
+    """
+    for _, grouped in _iter_file_groups(docs, pages_per_chunk):
+        yield grouped
 
 def group_documents(docs, pages_per_chunk=1):
     """
-    Batch together consecutive page-documents into multi-page Documents.
-    With slides, we want 1 slide per chunk.
+    Batch together consecutive page-documents (of the same file) into
+    multi-page Documents. With slides, we want 1 slide per chunk.
     """
-    grouped = []
-    for i in range(0, len(docs), pages_per_chunk):
-        batch = docs[i : i + pages_per_chunk]
-        content = "\n\n".join(d.page_content for d in batch)
-        # keep the same metadata grouping
-        sources = [f"{d.metadata['source']} (page {d.metadata.get('page', d.metadata.get('slide_number', '?'))})"
-                   for d in batch]
-        grouped.append(Document(page_content=content, metadata={"sources": sources}))
-    return grouped
+    return list(iter_grouped(docs, pages_per_chunk=pages_per_chunk))
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def chunk_id(doc: Document) -> str:
+    """
+    Stable, content-addressed chunk id: the same text from the same pages
+    gets the same id on every run.
+    """
+    key = json.dumps([doc.page_content, doc.metadata], ensure_ascii=False, sort_keys=True)
+    return "chunk_" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:20]
+
+def load_manifest(chunks_dir: Path) -> dict:
+    try:
+        return json.loads((chunks_dir / MANIFEST_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
 
 def split_documents(
     data_dir: str,
     pages_per_chunk: int = 1,     # one slide per super-doc
     chunk_size: int = 600,        # ~600 chars ≈ 1–2 paragraphs
-    chunk_overlap: int = 120      # overlap by ~120 chars (~1–2 sentences)
-):
-    # 1. Load every single-page Document
-    docs = load_documents(data_dir)
-
-    # 2. Group N pages into one bigger Document
-    grouped = group_documents(docs, pages_per_chunk=pages_per_chunk)
+    chunk_overlap: int = 120,     # overlap by ~120 chars (~1–2 sentences)
+    workers: int = None,          # loader processes (None = CPU count)
+    pdf_backend: str = "pymupdf",
+    full: bool = False,           # ignore the manifest and re-split everything
+) -> int:
+    """
+    Load → group → split → write, as one stream: pages flow from the loader
+    pool into the splitter and each chunk is written as soon as it exists,
+    so memory does not grow with the corpus.
 
-    # 3. Split each grouped Document into character-based chunks
+    Chunks go into one packed store (data/chunks/chunks.<n>.jsonl + offset
+    index, see online/retrieval/chunk_store.py) keyed by content hash
+    (chunk_id). Incremental: data/chunks/manifest.json records each source
+    file's hash and its chunk ids, so only new or changed files are loaded
+    and split; chunks of unchanged files are copied over as raw records and
+    chunks no file produces any more are dropped. Returns the number of chunks.
+    """
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap
     )
-    chunked_docs = splitter.split_documents(grouped)
-
-    # 4. Persist
     chunks_dir = Path(data_dir) / "chunks"
     chunks_dir.mkdir(exist_ok=True, parents=True)
-    for idx, doc in enumerate(chunked_docs):
-        payload = {
-            "page_content": doc.page_content,
-            "metadata": doc.metadata
-        }
-        (chunks_dir / f"chunk_{idx:04d}.json").write_text(
-            json.dumps(payload, ensure_ascii=False, indent=2),
-            encoding="utf-8"
-        )
-
-    print(f"Grouped into {len(grouped)} slide-docs; split into {len(chunked_docs)} chunks.")
-    return chunked_docs
+
+    params   = {"pages_per_chunk": pages_per_chunk, "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap, "pdf_backend": pdf_backend}
+    manifest = {} if full else load_manifest(chunks_dir)
+    if manifest.get("params") != params:
+        manifest = {}   # no manifest yet, or the splitting changed: start over
+    old_files = manifest.get("files", {})
+
+    sources = {path.name: path for path in list_sources(data_dir)}
+    hashes  = {name: file_hash(path) for name, path in sources.items()}
+    changed = [sources[name] for name in sources
+               if old_files.get(name, {}).get("sha256") != hashes[name]]
+    removed = [name for name in old_files if name not in sources]
+
+    files = {name: entry for name, entry in old_files.items()
+             if name in sources and sources[name] not in changed}
+    for path in changed:
+        files[path.name] = {"sha256": hashes[path.name], "chunks": []}
+
+    # chunks of unchanged files are copied over from the current store
+    # (or from an older per-file chunk directory)
+    old_store = ChunkStore(chunks_dir) if has_chunk_store(chunks_dir) else None
+    old_count = len(old_store) if old_store else len(list(chunks_dir.glob(LEGACY_GLOB)))
+
+    with ChunkStoreWriter(chunks_dir) as writer:
+        for name, entry in list(files.items()):
+            if sources[name] in changed:
+                continue
+            for cid in entry["chunks"]:
+                if old_store is not None and cid in old_store:
+                    writer.add_record(cid, old_store.record(cid))
+                elif (chunks_dir / f"{cid}.json").exists():
+                    payload = json.loads((chunks_dir / f"{cid}.json").read_text(encoding="utf-8"))
+                    writer.add(cid, payload["page_content"], payload["metadata"])
+                else:
+                    # chunk lost: split this file again
+                    changed.append(sources[name])
+                    files[name] = {"sha256": hashes[name], "chunks": []}
+                    break
+        n_kept = len(writer)
+
+        # 1. Load the single-page Documents of changed files (streamed from the loader pool)
+        docs = iter_documents(data_dir, workers=workers, pdf_backend=pdf_backend, files=changed)
+
+        n_grouped = 0
+        # 2. Group N pages into one bigger Document
+        for source, grouped in _iter_file_groups(docs, pages_per_chunk=pages_per_chunk):
+            n_grouped += 1
+            # 3. Split each grouped Document into character-based chunks
+            for doc in splitter.split_documents([grouped]):
+                cid = chunk_id(doc)
+                files[source]["chunks"].append(cid)
+                # 4. Persist (appended to the packed store as it streams)
+                writer.add(cid, doc.page_content, doc.metadata)
+        n_total = len(writer)
+
+    if old_store is not None:
+        old_store.close()
+
+    # 5. The packed store replaces the old one-file-per-chunk layout
+    for chunk_file in chunks_dir.glob(LEGACY_GLOB):
+        chunk_file.unlink()
+
+    tmp = chunks_dir / (MANIFEST_FILE + ".tmp")
+    tmp.write_text(json.dumps({"params": params, "files": files}, indent=2), encoding="utf-8")
+    os.replace(tmp, chunks_dir / MANIFEST_FILE)
+
+    print(f"{len(changed)} new/changed and {len(removed)} removed source files "
+          f"({len(sources) - len(changed)} unchanged).")
+    print(f"Grouped into {n_grouped} slide-docs; kept {n_kept} chunks, added {n_total - n_kept}, "
+          f"dropped {max(0, old_count - n_kept)}; {n_total} chunks in total.")
+    return n_total
 
 if __name__ == "__main__":
-    chunks = split_documents("data")
-    print(f"Total chunks created: {len(chunks)}")
+    parser = argparse.ArgumentParser(description="Load data/raw and write text chunks to data/chunks.")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--workers", type=int, default=get_setting("ingestion", "workers", None),
+                        help="loader processes (default: CPU count)")
+    parser.add_argument("--pdf-backend", choices=PDF_BACKENDS,
+                        default=get_setting("ingestion", "pdf_backend", "pymupdf"))
+    parser.add_argument("--full", action="store_true", help="re-split every file, ignoring the manifest")
+    args = parser.parse_args()
+
+    n_chunks = split_documents(args.data_dir, workers=args.workers, pdf_backend=args.pdf_backend, full=args.full)
+    print(f"Total chunks created: {n_chunks}")
@@ -0,0 +1,68 @@
+# online/cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory cache bounded by entry count, with optional TTL.
+    Least-recently-used entries are evicted first; expired entries are
+    dropped on access. Hit/miss/eviction counters are kept for sizing.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data  = OrderedDict()   # key -> (expires_at, value)
+        self._lock  = threading.Lock()
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and item[0] is not None and item[0] <= now:
+                del self._data[key]
+                item = _MISSING
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value) -> None:
+        if self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries":     len(self._data),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits":        self.hits,
+            "misses":      self.misses,
+            "evictions":   self.evictions,
+            "hit_rate":    self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,28 @@
+# online/config.py
+
+import os
+from functools import lru_cache
+
+import yaml
+
+project_root  = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SETTINGS_PATH = os.path.join(project_root, "config", "settings.yaml")
+
+
+@lru_cache(maxsize=None)
+def load_settings(path: str = SETTINGS_PATH) -> dict:
+    """
+    Read config/settings.yaml once and return it as a dict
+    (empty if the file is missing).
+    """
+    if not os.path.isfile(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def get_setting(section: str, key: str, default=None):
+    """
+    Convenience lookup for `section.key` in settings.yaml.
+    """
+    return (load_settings().get(section) or {}).get(key, default)
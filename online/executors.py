@@ -0,0 +1,255 @@
+# online/executors.py
+
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from online.config import load_settings
+from online.tracing import record
+
+# ─ Default sizing per pipeline stage (overridable under `stages:` in settings.yaml) ─
+#   ffmpeg / stt / tts / retrieval release the GIL in native code or a child
+#   process, so threads are enough; use kind: process for pure-Python work.
+DEFAULT_STAGES = {
+    "ffmpeg":    {"kind": "thread", "workers": 4, "max_queue": 16},
+    "stt":       {"kind": "thread", "workers": 8, "max_queue": 16},
+    "retrieval": {"kind": "thread", "workers": 4, "max_queue": 32},
+    "llm":       {"kind": "thread", "workers": 8, "max_queue": 16},
+    "tts":       {"kind": "thread", "workers": 2, "max_queue": 32},
+}
+
+_DONE = object()
+
+# the cancel event of the StageStream whose iterator runs on this thread (None elsewhere)
+_stream_cancelled = contextvars.ContextVar("stream_cancelled", default=None)
+
+
+class StageSaturated(Exception):
+    """
+    Raised when a stage already has workers + max_queue jobs in flight.
+    The server turns it into 503 with a Retry-After header.
+    """
+
+    def __init__(self, stage: str, retry_after: int):
+        super().__init__(f"stage '{stage}' is saturated")
+        self.stage       = stage
+        self.retry_after = retry_after
+
+
+class Stage:
+    """
+    A dedicated, separately sized executor for one pipeline stage, with a
+    bounded queue. At most `workers` jobs run and `max_queue` wait; anything
+    beyond that is rejected immediately (admission control) instead of
+    silently piling up.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        workers: int = 1,
+        max_queue: int = 8,
+        kind: str = "thread",
+        retry_after: int = 5,
+    ):
+        self.name        = name
+        self.workers     = workers
+        self.max_queue   = max_queue
+        self.kind        = kind
+        self.retry_after = retry_after
+        if kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-")
+
+        self._lock     = threading.Lock()
+        self.in_flight = 0     # admitted, not finished (running + queued)
+        self.active    = 0     # currently running (thread stages only)
+        self.completed = 0
+        self.rejected  = 0
+
+    # ─ Admission ─
+    def _admit(self) -> None:
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise StageSaturated(self.name, self.retry_after)
+            self.in_flight += 1
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def _tracked(self, fn):
+        # thread stages: count running jobs, keep the caller's contextvars
+        # (request trace included) and record how long the job waited
+        ctx       = contextvars.copy_context()
+        submitted = time.perf_counter()
+
+        def call(*args, **kwargs):
+            ctx.run(record, f"queue.{self.name}", time.perf_counter() - submitted)
+            with self._lock:
+                self.active += 1
+            try:
+                return ctx.run(fn, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+        return call
+
+    # ─ Submission ─
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """
+        Run fn(*args, **kwargs) on this stage; returns a concurrent Future.
+        Raises StageSaturated when the queue is full.
+        """
+        self._admit()
+        try:
+            if self.kind != "process":
+                fn = self._tracked(fn)
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Await fn(*args, **kwargs) on this stage without blocking the event loop.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stream(self, fn, *args, **kwargs) -> "StageStream":
+        """
+        Iterate the sync iterator returned by fn(*args, **kwargs) on a worker
+        of this stage, handing items to the event loop as they are produced.
+        The slot is taken now (so saturation is reported before a response
+        starts) and held until the iterator is exhausted or cancelled.
+        """
+        return StageStream(self, fn, args, kwargs)
+
+    # ─ Introspection ─
+    def stats(self) -> dict:
+        with self._lock:
+            running = self.active if self.kind != "process" else min(self.in_flight, self.workers)
+            return {
+                "kind":        self.kind,
+                "workers":     self.workers,
+                "max_queue":   self.max_queue,
+                "running":     running,
+                "queue_depth": max(0, self.in_flight - running),
+                "completed":   self.completed,
+                "rejected":    self.rejected,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class StageStream:
+    """
+    Async iterator over a sync iterator that runs on a Stage worker.
+    `cancel()` (or aclose()) stops the producer between items.
+    """
+
+    def __init__(self, stage: Stage, fn, args, kwargs):
+        self._loop      = asyncio.get_running_loop()
+        self._queue     = asyncio.Queue()
+        self._cancelled = threading.Event()
+        self._future    = stage.submit(self._produce, fn, args, kwargs)
+
+    def _put(self, item) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        except RuntimeError:
+            # event loop already closed (server shutting down)
+            self.cancel()
+
+    def _produce(self, fn, args, kwargs) -> None:
+        iterator = None
+        _stream_cancelled.set(self._cancelled)
+        try:
+            iterator = iter(fn(*args, **kwargs))
+            for item in iterator:
+                if self._cancelled.is_set():
+                    break
+                self._put(item)
+        except BaseException as e:
+            self._put(e)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+            self._put(_DONE)
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self._queue.get()
+        if item is _DONE:
+            raise StopAsyncIteration
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    async def aclose(self) -> None:
+        self.cancel()
+
+
+def current_stream_cancelled():
+    """
+    threading.Event set when the consumer of the StageStream running the
+    calling code cancels it (client gone), or None outside a StageStream.
+    Lets code that blocks between items (e.g. the LLM queue) give up early.
+    """
+    return _stream_cancelled.get()
+
+
+# ─ Process-wide stages ─
+_stages      = {}
+_stages_lock = threading.Lock()
+
+def get_stage(name: str) -> Stage:
+    """
+    Return the executor for a pipeline stage, creating it from settings.yaml
+    (`stages.<name>`, falling back to DEFAULT_STAGES) on first use.
+    """
+    with _stages_lock:
+        if name not in _stages:
+            cfg = dict(DEFAULT_STAGES.get(name, {}))
+            cfg.update((load_settings().get("stages") or {}).get(name) or {})
+            _stages[name] = Stage(
+                name,
+                workers=cfg.get("workers", 1),
+                max_queue=cfg.get("max_queue", 8),
+                kind=cfg.get("kind", "thread"),
+                retry_after=cfg.get("retry_after", 5),
+            )
+        return _stages[name]
+
+
+async def run_stage(name: str, fn, *args, **kwargs):
+    """
+    Shorthand for `await get_stage(name).run(fn, *args, **kwargs)`.
+    """
+    return await get_stage(name).run(fn, *args, **kwargs)
+
+
+def all_stage_stats() -> dict:
+    names = sorted(set(DEFAULT_STAGES) | set(_stages))
+    return {name: get_stage(name).stats() for name in names}
+
+
+def shutdown_stages() -> None:
+    with _stages_lock:
+        for stage in _stages.values():
+            stage.shutdown()
+        _stages.clear()
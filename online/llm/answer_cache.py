@@ -0,0 +1,169 @@
+# online/llm/answer_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from online.config import load_settings
+
+
+def chunk_ids(chunks):
+    """
+    Index ids of the retrieved chunks, or None if any chunk has none: the
+    chunks are then not identifiable and the answer must not be cached.
+    """
+    ids = tuple(str(doc.id) for doc in chunks if getattr(doc, "id", None))
+    return ids if len(ids) == len(chunks) else None
+
+
+class AnswerCache:
+    """
+    Semantic cache of finished answers (text, citation, audio) for
+    first-turn questions. An entry is reused when a new question retrieved
+    the same chunks, in the same language, from the same course index and
+    generation,
+    and its query embedding has cosine similarity >= `threshold` with the
+    cached question's, so "what's non-max suppression" can be answered
+    from "explain NMS" without running the LLM or TTS. The LLM runs at
+    temperature 0, so the answer would be near-identical anyway.
+
+    Bounded by max_entries (least recently used evicted) and ttl_seconds;
+    a course's entries are dropped when its retriever's index generation
+    changes (reload / rebuilt index).
+    """
+
+    def __init__(self, threshold: float = 0.92, max_entries: int = 2048, ttl_seconds: float = 86400):
+        self.threshold    = threshold
+        self.max_entries  = max_entries
+        self.ttl_seconds  = ttl_seconds
+        self._lock        = threading.Lock()
+        self._entries     = OrderedDict()   # entry id -> (group, unit vector, expires_at, value)
+        self._groups      = {}              # (corpus, language, chunk ids) -> {entry id}
+        self._ids         = 0
+        self._generations = {}              # corpus -> index generation of its entries
+        self.hits          = 0
+        self.misses        = 0
+        self.bypassed      = 0             # turns with history or chunks without ids, never cached
+        self.stores        = 0
+        self.evictions     = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm   = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def _sync(self, corpus, generation) -> None:
+        # caller holds the lock; a new index makes every answer from it stale
+        if self._generations.get(corpus, generation) != generation:
+            stale = [entry_id for entry_id, entry in self._entries.items() if entry[0][0] == corpus]
+            if stale:
+                self.invalidations += 1
+            for entry_id in stale:
+                self._drop(entry_id)
+        self._generations[corpus] = generation
+
+    def _drop(self, entry_id) -> None:
+        group = self._entries.pop(entry_id)[0]
+        ids   = self._groups.get(group)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._groups[group]
+
+    def lookup(self, vector, language: str, chunks, generation, corpus=None):
+        """
+        Cached value for a question, or None. `corpus` names the index the
+        chunks came from (None = the default one).
+        """
+        ids = chunk_ids(chunks)
+        if ids is None:
+            self.bypass()
+            return None
+        group = (corpus, language, ids)
+        query = self._unit(vector)
+        now   = time.monotonic()
+        with self._lock:
+            self._sync(corpus, generation)
+            best, best_score = None, self.threshold
+            for entry_id in list(self._groups.get(group, ())):
+                _, unit, expires_at, _ = self._entries[entry_id]
+                if expires_at <= now:
+                    self._drop(entry_id)
+                    continue
+                score = float(unit @ query)
+                if score >= best_score:
+                    best, best_score = entry_id, score
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            return self._entries[best][3]
+
+    def store(self, vector, language: str, chunks, generation, corpus, value) -> None:
+        ids = chunk_ids(chunks)
+        if not self.enabled or ids is None:
+            return
+        group = (corpus, language, ids)
+        with self._lock:
+            self._sync(corpus, generation)
+            self._ids += 1
+            self._entries[self._ids] = (group, self._unit(vector), time.monotonic() + self.ttl_seconds, value)
+            self._groups.setdefault(group, set()).add(self._ids)
+            self.stores += 1
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries":       len(self._entries),
+                "max_entries":   self.max_entries,
+                "ttl_seconds":   self.ttl_seconds,
+                "threshold":     self.threshold,
+                "hits":          self.hits,
+                "misses":        self.misses,
+                "bypassed":      self.bypassed,
+                "stores":        self.stores,
+                "evictions":     self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate":      self.hits / lookups if lookups else 0.0,
+            }
+
+
+_answer_cache      = None
+_answer_cache_lock = threading.Lock()
+
+def get_answer_cache() -> AnswerCache:
+    """
+    Process-wide answer cache, configured by `answer_cache:` in settings.yaml.
+    """
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            cfg = load_settings().get("answer_cache") or {}
+            _answer_cache = AnswerCache(
+                threshold=cfg.get("similarity_threshold", 0.92),
+                max_entries=cfg.get("max_entries", 2048) if cfg.get("enabled", True) else 0,
+                ttl_seconds=cfg.get("ttl_seconds", 86400),
+            )
+        return _answer_cache
@@ -0,0 +1,269 @@
+# online/llm/gateway.py
+
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Iterator
+
+from online.config import load_settings
+from online.executors import StageSaturated, current_stream_cancelled
+from online.tracing import record, span
+
+logger = logging.getLogger("uvicorn.error")
+
+# ─ Priority classes, most urgent first (lower value = served first) ─
+PRIORITIES = {
+    "voice":      0,    # spoken questions: the student is waiting for audio
+    "chat":       1,
+    "translate":  2,
+    "background": 3,    # history summaries
+}
+
+DEFAULT_TIMEOUTS = {"voice": 60, "chat": 90, "translate": 30, "background": 120}
+
+WAIT_SAMPLES = 1024     # recent queue waits kept per priority for percentiles
+POLL_SECONDS = 0.25     # how often a waiting request checks whether its client is gone
+
+_DONE = object()
+
+
+class LLMTimeout(Exception):
+    """
+    Raised when a request's deadline passes while it is queued or generating.
+    The server turns it into 504.
+    """
+
+    def __init__(self, priority: str, seconds: float, queued: bool):
+        where = "waiting for the LLM" if queued else "generating"
+        super().__init__(f"{priority} request timed out after {seconds:.1f}s {where}")
+        self.priority = priority
+        self.queued   = queued
+
+
+class _Waiter:
+    __slots__ = ("event", "granted", "abandoned")
+
+    def __init__(self):
+        self.event     = threading.Event()
+        self.granted   = False
+        self.abandoned = False
+
+
+class LLMGateway:
+    """
+    Single entry point for Ollama calls. At most `max_in_flight` requests
+    generate at once (match OLLAMA_NUM_PARALLEL); the rest wait in a
+    priority queue (voice > chat > translate > background, FIFO within a
+    class) of at most `max_queue` entries, beyond which StageSaturated is
+    raised. Every request has a deadline covering queue wait and generation.
+    Tokens are read on a pump thread, so the deadline holds even when
+    Ollama sends nothing (stalled server, long prefill); the pump closes the
+    connection at its next token, or when the client's read timeout fires
+    (see longest_timeout()), and only then frees the slot, since Ollama is
+    busy until it stops. A request whose StageStream is cancelled (client
+    gone) leaves the queue, or stops generating, within POLL_SECONDS.
+
+    Callers block in their own thread (the llm stage), so size that stage
+    at least max_in_flight + the waiters you want ordered by priority.
+    """
+
+    def __init__(self, llm, max_in_flight: int = 2, max_queue: int = 32, timeouts: dict = None, retry_after: int = 5):
+        self.llm           = llm            # .stream(prompt) -> tokens, or a function returning such a client
+        self.max_in_flight = max_in_flight
+        self.max_queue     = max_queue
+        self.timeouts      = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.retry_after   = retry_after
+        self._lock         = threading.Lock()
+        self._heap         = []             # (priority value, seq, waiter)
+        self._seq          = itertools.count()
+        self._in_flight    = 0
+        self._queued       = 0
+        self._metrics      = {name: self._new_metrics() for name in PRIORITIES}
+
+    @staticmethod
+    def _new_metrics() -> dict:
+        return {"submitted": 0, "completed": 0, "timed_out": 0, "cancelled": 0,
+                "failed": 0, "rejected": 0, "waits": deque(maxlen=WAIT_SAMPLES)}
+
+    def longest_timeout(self) -> float:
+        """
+        Longest deadline of any priority: use it as the HTTP client's
+        timeout, so no read on an abandoned stream blocks forever.
+        """
+        return float(max(self.timeouts.values()))
+
+    # ─ Slots ─
+    def _acquire(self, priority: str, deadline: float, cancelled: threading.Event = None) -> float:
+        """
+        Block until a generation slot is ours; returns the queue wait in
+        seconds, or None if `cancelled` was set while waiting.
+        """
+        start   = time.monotonic()
+        metrics = self._metrics[priority]
+        with self._lock:
+            metrics["submitted"] += 1
+            if self._in_flight < self.max_in_flight and not self._queued:
+                self._in_flight += 1
+                metrics["waits"].append(0.0)
+                return 0.0
+            if self._queued >= self.max_queue:
+                metrics["rejected"] += 1
+                raise StageSaturated("llm", self.retry_after)
+            waiter = _Waiter()
+            heapq.heappush(self._heap, (PRIORITIES[priority], next(self._seq), waiter))
+            self._queued += 1
+
+        while not waiter.event.wait(min(POLL_SECONDS, max(0.0, deadline - time.monotonic()))):
+            if time.monotonic() >= deadline or (cancelled is not None and cancelled.is_set()):
+                break
+        with self._lock:
+            if not waiter.granted:
+                # left in the heap, skipped when popped
+                waiter.abandoned = True
+                self._queued    -= 1
+                if cancelled is not None and cancelled.is_set():
+                    metrics["cancelled"] += 1
+                    return None
+                metrics["timed_out"] += 1
+                raise LLMTimeout(priority, deadline - start, queued=True)
+            waited = time.monotonic() - start
+            metrics["waits"].append(waited)
+            return waited
+
+    def _release(self) -> None:
+        with self._lock:
+            while self._heap:
+                _, _, waiter = heapq.heappop(self._heap)
+                if waiter.abandoned:
+                    continue
+                # hand the slot over directly, so a newcomer cannot jump the queue
+                waiter.granted = True
+                self._queued  -= 1
+                waiter.event.set()
+                return
+            self._in_flight -= 1
+
+    # ─ Calls ─
+    def _pump(self, llm, prompt: str, out: queue.Queue, stop: threading.Event) -> None:
+        # reads Ollama's stream on its own thread; the slot is ours until the connection is closed
+        tokens = None
+        try:
+            tokens = llm.stream(prompt)
+            for token in tokens:
+                if stop.is_set():
+                    break
+                out.put(token)
+            out.put(_DONE)
+        except Exception as e:
+            out.put(e)
+        finally:
+            close = getattr(tokens, "close", None)
+            if close:
+                close()
+            self._release()
+
+    def stream(self, prompt: str, priority: str = "chat", timeout: float = None) -> Iterator[str]:
+        """
+        Yield answer tokens for `prompt`. The slot is taken on the first
+        next() and released once the iterator finishes or is closed and
+        the connection to Ollama is closed.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown LLM priority '{priority}'")
+        timeout   = timeout or self.timeouts[priority]
+        deadline  = time.monotonic() + timeout
+        metrics   = self._metrics[priority]
+        cancelled = current_stream_cancelled()
+        llm       = self.llm if hasattr(self.llm, "stream") else self.llm()
+        with span("llm.queue"):
+            waited = self._acquire(priority, deadline, cancelled)
+        if waited is None:
+            return
+        if waited > 1:
+            logger.info(f"[LLM] {priority} request waited {waited:.1f}s for a slot")
+
+        out  = queue.Queue()
+        stop = threading.Event()
+        try:
+            threading.Thread(target=self._pump, args=(llm, prompt, out, stop), name="llm-pump", daemon=True).start()
+        except BaseException:
+            self._release()
+            raise
+
+        outcome = "cancelled"
+        start   = time.perf_counter()
+        first   = True
+        try:
+            with span("llm"):
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        outcome = "timed_out"
+                        raise LLMTimeout(priority, timeout, queued=False)
+                    if cancelled is not None and cancelled.is_set():
+                        break
+                    try:
+                        item = out.get(timeout=min(POLL_SECONDS, remaining))
+                    except queue.Empty:
+                        continue
+                    if item is _DONE:
+                        outcome = "completed"
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    if first:
+                        record("llm.first_token", time.perf_counter() - start)
+                        first = False
+                    yield item
+        except LLMTimeout:
+            raise
+        except Exception:
+            outcome = "failed"
+            raise
+        finally:
+            # the pump closes the connection at its next token (or read timeout) and frees the slot
+            stop.set()
+            with self._lock:
+                metrics[outcome] += 1
+
+    def generate(self, prompt: str, priority: str = "chat", timeout: float = None) -> str:
+        return "".join(self.stream(prompt, priority, timeout)).strip()
+
+    # ─ Introspection ─
+    def stats(self) -> dict:
+        with self._lock:
+            by_priority = {}
+            for name, m in self._metrics.items():
+                waits = sorted(m["waits"])
+                by_priority[name] = {
+                    **{k: v for k, v in m.items() if k != "waits"},
+                    "wait_ms_mean": 1000 * sum(waits) / len(waits) if waits else 0.0,
+                    "wait_ms_p95":  1000 * waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                    "wait_ms_max":  1000 * waits[-1] if waits else 0.0,
+                }
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_queue":     self.max_queue,
+                "in_flight":     self._in_flight,
+                "queued":        self._queued,
+                "priorities":    by_priority,
+            }
+
+
+def gateway_from_settings(llm) -> LLMGateway:
+    """
+    Gateway around `llm` (a client, or a function returning one on first
+    use), configured by `llm.gateway:` in settings.yaml.
+    """
+    cfg = (load_settings().get("llm") or {}).get("gateway") or {}
+    return LLMGateway(
+        llm,
+        max_in_flight=cfg.get("max_in_flight", 2),
+        max_queue=cfg.get("max_queue", 32),
+        timeouts=cfg.get("timeouts"),
+        retry_after=cfg.get("retry_after", 5),
+    )
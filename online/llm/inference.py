@@ -1,70 +1,101 @@
 import os
 import sys
-from typing import Tuple
+from typing import Iterator, Tuple
 
 # make sure project root is importable
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 sys.path.insert(0, project_root)
 
-from langchain_ollama import OllamaLLM  
+from online.config import get_setting
+from online.llm.gateway import gateway_from_settings
+from online.models import get_model_registry
+from online.llm.prompt_builder import PromptBuilder
 from online.retrieval.retriever import get_relevant_chunks
 
-# instantiate your local LLM
-llm = OllamaLLM(model="llama3.1:8b", temperature=0)
+LLM_MODEL = "llama3.1:8b"
+
+# instantiate your local LLM (on first use, or by the startup warmup)
+#   keep_alive keeps the model (and its prompt cache) loaded between turns, so
+#   a session's unchanged prompt prefix is not prefilled again; the HTTP timeout
+#   bounds how long a stalled connection outlives the gateway's deadline
+def _load_llm():
+    from langchain_ollama import OllamaLLM
+    return OllamaLLM(
+        model=LLM_MODEL,
+        temperature=0,
+        keep_alive=get_setting("llm", "keep_alive", "30m"),
+        num_ctx=get_setting("llm", "num_ctx", 4096),
+        base_url=get_setting("llm", "base_url", None),   # None = OLLAMA_HOST or localhost:11434
+        client_kwargs={"timeout": gateway.longest_timeout()},
+    )
 
-def generate_answer(
-    chunks,
-    question: str,
-    chat_history=None,
-    target_lang: str = "en"
-) -> Tuple[str, str]:
-    """
-    Returns (answer_text, citation_text).
-    target_lang: "en" or "ar"
-    chat_history: list of dicts [{"role":"user"|"bot","text":...}]
-    """
-    if not chunks:
-        return "Sorry, I don’t know.", ""
 
-    # Build context from chunks
-    context = "\n".join(f"- {chunk.page_content.strip()}" for chunk in chunks)
+def _warmup_llm(llm) -> None:
+    # an empty prompt makes Ollama load the weights without generating
+    from ollama import Client
+    Client(host=llm.base_url).generate(model=llm.model, prompt="", keep_alive=llm.keep_alive)
 
-    # Format chat history for prompt
-    history_str = ""
-    if chat_history:
-        lines = []
-        for turn in chat_history:
-            prefix = "Student:" if turn.get("role") == "user" else "Tutor:"
-            lines.append(f"{prefix} {turn.get('text')}")
-        history_str = "\n".join(lines)
 
-    # Instruction based on target language
-    if target_lang == "ar":
-        instr = "Answer (in Arabic only):"
-    else:
-        instr = "Answer (in English only):"
+get_model_registry().register("llm", _load_llm, warmup=_warmup_llm)
 
-    # Construct prompt
-    prompt_text = f"""
-You are a knowledgeable AI tutor. Use only the information in the bullets below to answer the student's question.
-Restate or summarize as needed, but do not introduce new concepts.
+def get_llm():
+    return get_model_registry().get("llm")
 
-Conversation so far:
-{history_str}
 
-Reference context:
-{context}
+# every call goes through the gateway: concurrency limit, priorities, deadlines
+gateway = gateway_from_settings(get_llm)
 
-Student's new question: {question}
+SUMMARY_PROMPT = """
+Summarize this tutoring conversation in at most {words} words, keeping the topics the student asked
+about and the key facts the tutor gave. Reply with the summary only.
 
-{instr}
+{previous}{turns}
 """.strip()
 
-    # Call LLM
-    response = llm.generate([prompt_text])
-    answer = response.generations[0][0].text.strip()
 
-    # Build citations from chunk metadata
+def summarize_turns(previous_summary: str, turns) -> str:
+    """
+    Fold `turns` into the running summary of a conversation (used by the
+    prompt builder for turns that fell out of the verbatim window).
+    """
+    lines = "\n".join(
+        f"{'Student' if t.get('role') == 'user' else 'Tutor'}: {t.get('text')}" for t in turns
+    )
+    previous = f"Summary so far: {previous_summary}\n\n" if previous_summary else ""
+    return gateway.generate(SUMMARY_PROMPT.format(words=120, previous=previous, turns=lines), priority="background")
+
+
+_cfg = get_setting("llm", "prompt", None) or {}
+prompt_builder = PromptBuilder(
+    summarize=summarize_turns,
+    max_tokens=_cfg.get("max_tokens", 3000),
+    recent_turns=_cfg.get("recent_turns", 4),
+    history_share=_cfg.get("history_share", 0.35),
+    summary_max_tokens=_cfg.get("summary_max_tokens", 200),
+    chars_per_token=_cfg.get("chars_per_token", 4.0),
+)
+
+
+def build_prompt(
+    chunks,
+    question: str,
+    chat_history=None,
+    target_lang: str = "en",
+    session=None,
+) -> str:
+    """
+    Assemble the tutor prompt from retrieved chunks, history and question,
+    within the token budget of `llm.prompt` in settings.yaml (see
+    online/llm/prompt_builder.py). With a server-side `session` its history
+    is used instead of chat_history.
+    """
+    return prompt_builder.build(chunks, question, chat_history, target_lang, session=session)
+
+
+def build_citation(chunks) -> str:
+    """
+    Build the "- source (page N)" citation list from chunk metadata.
+    """
     sources = []
     for chunk in chunks:
         md = chunk.metadata
@@ -77,9 +108,55 @@ Student's new question: {question}
             src = f"{md.get('source')} (page {md.get('page')})"
             if src not in sources:
                 sources.append(src)
-    citation_text = "\n".join(f"- {s}" for s in sources)
+    return "\n".join(f"- {s}" for s in sources)
+
+
+def generate_answer(
+    chunks,
+    question: str,
+    chat_history=None,
+    target_lang: str = "en",
+    session=None,
+    priority: str = "chat",
+) -> Tuple[str, str]:
+    """
+    Returns (answer_text, citation_text).
+    target_lang: "en" or "ar"
+    chat_history: list of dicts [{"role":"user"|"bot","text":...}]
+    session: online.sessions.Session (server-side history), overrides chat_history
+    priority: gateway class, "voice" | "chat" | "translate" | "background"
+    """
+    if not chunks:
+        return "Sorry, I don’t know.", ""
+
+    prompt_text = build_prompt(chunks, question, chat_history, target_lang, session=session)
+
+    # Call LLM
+    answer = gateway.generate(prompt_text, priority=priority)
+
+    return answer, build_citation(chunks)
+
+
+def generate_answer_stream(
+    chunks,
+    question: str,
+    chat_history=None,
+    target_lang: str = "en",
+    session=None,
+    priority: str = "chat",
+) -> Iterator[str]:
+    """
+    Same prompt as generate_answer, but yields answer tokens as Ollama
+    produces them. Use build_citation(chunks) for the citation.
+    """
+    if not chunks:
+        yield "Sorry, I don’t know."
+        return
 
-    return answer, citation_text
+    prompt_text = build_prompt(chunks, question, chat_history, target_lang, session=session)
+    for token in gateway.stream(prompt_text, priority=priority):
+        if token:
+            yield token
 
 
 if __name__ == "__main__":
@@ -0,0 +1,333 @@
+# online/llm/prompt_builder.py
+
+import hashlib
+import logging
+import math
+import threading
+
+from online.cache import LRUCache
+from online.executors import StageSaturated, get_stage
+
+logger = logging.getLogger("uvicorn.error")
+
+PROMPT_TEMPLATE = """
+You are a knowledgeable AI tutor. Use only the information in the bullets below to answer the student's question.
+Restate or summarize as needed, but do not introduce new concepts.
+
+Conversation so far:
+{history}
+
+Reference context:
+{context}
+
+Student's new question: {question}
+
+{instr}
+""".strip()
+
+INSTRUCTIONS = {
+    "ar": "Answer (in Arabic only):",
+    "en": "Answer (in English only):",
+}
+
+CLIPPED_TURN_TOKENS = 40     # older turns not yet in the summary are cut to this
+MIN_CHUNK_TOKENS    = 32     # a chunk is only trimmed (not dropped) if this much room is left
+
+
+def _turn_line(turn: dict) -> str:
+    prefix = "Student:" if turn.get("role") == "user" else "Tutor:"
+    return f"{prefix} {turn.get('text')}"
+
+
+def _prefix_keys(turns) -> list:
+    """
+    keys[k] identifies turns[:k + 1] (a rolling hash, so a conversation that
+    grew by a few turns still finds the summary of its beginning).
+    """
+    h, keys = hashlib.sha256(), []
+    for turn in turns:
+        h.update(_turn_line(turn).encode("utf-8") + b"\0")
+        keys.append(h.copy().hexdigest())
+    return keys
+
+
+class PromptBuilder:
+    """
+    Assembles the tutor prompt within a token budget (`max_tokens`, counted
+    with a chars-per-token estimate since Ollama's tokenizer is not local):
+
+    - question and instructions are always kept;
+    - the last `recent_turns` turns are kept verbatim (newest first, up to
+      `history_share` of the budget);
+    - older turns are replaced by a running summary, cached by a hash of
+      the turns it covers and refreshed in the background on the LLM stage;
+      older turns the summary does not cover yet are included clipped;
+    - retrieved chunks fill the rest, in rank order, the last one trimmed.
+
+    Per-request token counts are kept in `stats()`.
+    """
+
+    def __init__(
+        self,
+        summarize=None,
+        max_tokens: int = 3000,
+        recent_turns: int = 4,
+        history_share: float = 0.35,
+        summary_max_tokens: int = 200,
+        chars_per_token: float = 4.0,
+        summary_cache_size: int = 256,
+    ):
+        self.summarize          = summarize    # (previous_summary, turns) -> summary text
+        self.max_tokens         = max_tokens
+        self.recent_turns       = recent_turns
+        self.history_share      = history_share
+        self.summary_max_tokens = summary_max_tokens
+        self.chars_per_token    = chars_per_token
+        self.summaries          = LRUCache(max_entries=summary_cache_size)
+        self._refreshing        = set()
+        self._lock              = threading.Lock()
+        self._requests          = 0
+        self._prompt_tokens     = 0
+        self._unbounded_tokens  = 0
+        self._max_prompt        = 0
+        self.last               = {}
+
+    # ─ Token accounting ─
+    def tokens(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token) if text else 0
+
+    def clip(self, text: str, max_tokens: int) -> str:
+        max_chars = int(max_tokens * self.chars_per_token)
+        if len(text) <= max_chars:
+            return text
+        cut = text[:max_chars]
+        space = cut.rfind(" ")
+        return (cut[:space] if space > max_chars // 2 else cut).rstrip() + " …"
+
+    # ─ History ─
+    def _cached_summary(self, older, keys):
+        # longest prefix of the older turns that already has a summary
+        for k in range(len(older), 0, -1):
+            summary = self.summaries.get(keys[k - 1])
+            if summary is not None:
+                return summary, k
+        return "", 0
+
+    def _refresh_summary(self, older, keys, summary: str, covered: int) -> None:
+        if self.summarize is None:
+            return
+        key = keys[-1]
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                fresh = self.summarize(summary, older[covered:])
+                self.summaries.put(key, self.clip(fresh.strip(), self.summary_max_tokens))
+            except Exception as e:
+                logger.warning(f"[LLM] History summary failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        try:
+            get_stage("llm").submit(run)
+        except StageSaturated:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _history(self, turns, budget: int):
+        """
+        -> (history text, its tokens, info). Newest turns win when the
+        budget is tight.
+        """
+        turns  = [t for t in (turns or []) if t.get("text")]
+        split  = max(0, len(turns) - self.recent_turns)
+        older  = turns[:split]
+        recent = []
+        used   = 0
+        for turn in reversed(turns[split:]):
+            line = _turn_line(turn)
+            cost = self.tokens(line) + 1
+            if used + cost > budget:
+                if not recent:
+                    line = self.clip(line, max(1, budget - 1))
+                    recent.append(line)
+                    used += self.tokens(line) + 1
+                break
+            recent.append(line)
+            used += cost
+        # recent turns that did not fit count as older
+        older = turns[:len(turns) - len(recent)]
+
+        summary_line, clipped, covered = "", [], 0
+        if older:
+            keys = _prefix_keys(older)
+            summary, covered = self._cached_summary(older, keys)
+            if summary:
+                line = f"(Summary of earlier conversation: {summary})"
+                if used + self.tokens(line) + 1 <= budget:
+                    summary_line = line
+                    used += self.tokens(line) + 1
+            for turn in reversed(older[covered:]):
+                line = self.clip(_turn_line(turn), CLIPPED_TURN_TOKENS)
+                if used + self.tokens(line) + 1 > budget:
+                    break
+                clipped.append(line)
+                used += self.tokens(line) + 1
+            if covered < len(older):
+                self._refresh_summary(older, keys, summary, covered)
+
+        lines = ([summary_line] if summary_line else []) + clipped[::-1] + recent[::-1]
+        info  = {
+            "turns_verbatim":   len(recent),
+            "turns_summarized": covered if summary_line else 0,
+            "turns_clipped":    len(clipped),
+            "turns_dropped":    len(older) - len(clipped) - (covered if summary_line else 0),
+        }
+        return "\n".join(lines), used, info
+
+    def _compact(self, session, upto: int) -> None:
+        """
+        Fold session turns up to `upto` into the session summary, in the
+        background on the LLM stage. The prompt prefix changes once per
+        compaction instead of on every turn.
+        """
+        if self.summarize is None:
+            return
+        with session.lock:
+            if session.compacting or upto <= session.summary_upto:
+                return
+            session.compacting = True
+            base, start = session.summary, session.summary_upto
+            turns = list(session.turns[start:upto])
+
+        def run():
+            try:
+                fresh = self.clip(self.summarize(base, turns).strip(), self.summary_max_tokens)
+                session.set_summary(fresh, upto, start)
+            except Exception as e:
+                logger.warning(f"[LLM] Session summary failed: {e}")
+            finally:
+                session.compacting = False
+
+        try:
+            get_stage("llm").submit(run)
+        except StageSaturated:
+            session.compacting = False
+
+    def _session_history(self, session, budget: int):
+        """
+        History for a server-side session: summary + every turn since it,
+        verbatim and append-only, so consecutive prompts share a prefix
+        Ollama can reuse. Once that outgrows the budget the oldest turns are
+        compacted into the summary (until then, they are left out).
+        """
+        summary, turns = session.history()
+        summary_line = f"(Summary of earlier conversation: {summary})" if summary else ""
+        used  = self.tokens(summary_line) + 1 if summary_line else 0
+        costs = [self.tokens(_turn_line(t)) + 1 for t in turns]
+
+        if used + sum(costs) > budget:
+            # keep about half the budget verbatim after compaction
+            keep, kept = 0, 0
+            while keep < len(turns) and kept + costs[-1 - keep] <= budget // 2:
+                kept += costs[-1 - keep]
+                keep += 1
+            keep -= keep % 2     # fold whole question/answer exchanges
+            self._compact(session, len(session.turns) - keep)
+
+        lines = []
+        for turn, cost in zip(reversed(turns), reversed(costs)):
+            if used + cost > budget:
+                break
+            lines.append(_turn_line(turn))
+            used += cost
+        info = {
+            "turns_verbatim":   len(lines),
+            "turns_summarized": session.summary_upto if summary_line else 0,
+            "turns_clipped":    0,
+            "turns_dropped":    len(turns) - len(lines),
+        }
+        lines = ([summary_line] if summary_line else []) + lines[::-1]
+        return "\n".join(lines), used, info
+
+    # ─ Context ─
+    def _context(self, chunks, budget: int):
+        lines, used, trimmed = [], 0, 0
+        for i, chunk in enumerate(chunks):
+            line = f"- {chunk.page_content.strip()}"
+            cost = self.tokens(line) + 1
+            if used + cost <= budget:
+                lines.append(line)
+                used += cost
+                continue
+            room = budget - used - 1
+            if room >= MIN_CHUNK_TOKENS or not lines:
+                line = self.clip(line, max(1, room))
+                lines.append(line)
+                used += self.tokens(line) + 1
+            trimmed = len(chunks) - i
+            break
+        return "\n".join(lines), used, {"chunks_used": len(lines), "chunks_trimmed": trimmed}
+
+    # ─ Assembly ─
+    def build(self, chunks, question: str, chat_history=None, target_lang: str = "en", session=None) -> str:
+        """
+        Prompt for `question`. History comes from `session` (server-side,
+        prefix-stable) when given, otherwise from the client's chat_history.
+        """
+        instr  = INSTRUCTIONS.get(target_lang, INSTRUCTIONS["en"])
+        fixed  = self.tokens(PROMPT_TEMPLATE.format(history="", context="", question=question, instr=instr))
+        room   = max(0, self.max_tokens - fixed)
+
+        if session is not None:
+            chat_history = list(session.turns)    # only for the unbounded count below
+            history, history_tokens, history_info = self._session_history(session, int(room * self.history_share))
+        else:
+            history, history_tokens, history_info = self._history(chat_history, int(room * self.history_share))
+        context, context_tokens, context_info = self._context(chunks, room - history_tokens)
+        prompt = PROMPT_TEMPLATE.format(history=history, context=context, question=question, instr=instr)
+
+        # what the prompt would have cost without a budget
+        unbounded = (
+            fixed
+            + sum(self.tokens(_turn_line(t)) + 1 for t in (chat_history or []))
+            + sum(self.tokens(c.page_content.strip()) + 3 for c in chunks)
+        )
+        prompt_tokens = self.tokens(prompt)
+        info = {
+            "prompt_tokens":    prompt_tokens,
+            "unbounded_tokens": unbounded,
+            "history_tokens":   history_tokens,
+            "context_tokens":   context_tokens,
+            **history_info,
+            **context_info,
+        }
+        with self._lock:
+            self._requests         += 1
+            self._prompt_tokens    += prompt_tokens
+            self._unbounded_tokens += unbounded
+            self._max_prompt        = max(self._max_prompt, prompt_tokens)
+            self.last               = info
+        logger.info(
+            f"[LLM] Prompt ~{prompt_tokens} tokens (unbounded ~{unbounded}); "
+            f"{info['turns_verbatim']} recent turns, {info['turns_summarized']} summarized, "
+            f"{info['chunks_used']}/{len(chunks)} chunks"
+        )
+        return prompt
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = self._requests
+            return {
+                "requests":              n,
+                "max_tokens":            self.max_tokens,
+                "mean_prompt_tokens":    self._prompt_tokens / n if n else 0.0,
+                "mean_unbounded_tokens": self._unbounded_tokens / n if n else 0.0,
+                "max_prompt_tokens":     self._max_prompt,
+                "summaries_cached":      len(self.summaries),
+                "last":                  dict(self.last),
+            }
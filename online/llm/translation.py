@@ -0,0 +1,255 @@
+# online/llm/translation.py
+
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from online.config import load_settings
+
+logger = logging.getLogger("uvicorn.error")
+
+DEFAULT_MEMORY_PATH = "db/translation_memory.sqlite"
+
+SINGLE_PROMPTS = {
+    "ar": (
+        "Translate the following English text into Arabic. "
+        "Only return the translated text:\n\n{text}\n\nالترجمة:"
+    ),
+    "en": (
+        "Translate the following text into English. "
+        "Only return the translated text:\n\n{text}\n\nTranslation:"
+    ),
+}
+
+BATCH_PROMPT = """
+Translate each numbered message below into {language}. Keep every [[n]] marker on its own line,
+followed by the translation of that message only. Do not add anything else.
+
+{messages}
+""".strip()
+
+LANGUAGE_NAMES = {"ar": "Arabic", "en": "English"}
+MARKER         = re.compile(r"^\s*\[\[(\d+)\]\]\s*$", re.MULTILINE)
+
+
+def memory_key(text: str, target: str) -> str:
+    return hashlib.sha256(f"{target}\0{text.strip()}".encode("utf-8")).hexdigest()
+
+
+class TranslationMemory:
+    """
+    Persistent translations keyed by sha256(target language, text) in one
+    SQLite file, capped at max_bytes of stored text with least-recently-used
+    eviction, so re-translating a tutor answer costs a lookup, not a
+    generation.
+    """
+
+    def __init__(self, path: str = DEFAULT_MEMORY_PATH, max_bytes: int = 64 * 2**20):
+        self.path      = path
+        self.max_bytes = max_bytes
+        self._lock     = threading.Lock()
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " key TEXT PRIMARY KEY, target TEXT NOT NULL, translation TEXT NOT NULL,"
+                " size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS translations_lru ON translations (last_used)")
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+
+    def get_many(self, keys) -> dict:
+        """
+        {key: translation} for the keys that are stored (and marks them used).
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        with self._lock:
+            rows  = self._db.execute(
+                f"SELECT key, translation FROM translations WHERE key IN ({','.join('?' * len(keys))})", keys,
+            ).fetchall()
+            found = dict(rows)
+            with self._db:
+                self._db.executemany(
+                    "UPDATE translations SET last_used = ? WHERE key = ?",
+                    [(time.time(), k) for k in found],
+                )
+            self.hits   += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items) -> None:
+        """
+        items: [(key, target, translation)]
+        """
+        now = time.time()
+        with self._lock, self._db:
+            for key, target, translation in items:
+                size = len(translation.encode("utf-8"))
+                old  = self._db.execute("SELECT size FROM translations WHERE key = ?", (key,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO translations (key, target, translation, size, last_used)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, target, translation, size, now),
+                )
+                self._total += size - (old[0] if old else 0)
+            while self._total > self.max_bytes:
+                oldest = self._db.execute(
+                    "SELECT key, size FROM translations ORDER BY last_used LIMIT 64"
+                ).fetchall()
+                if len(oldest) <= 1:
+                    break
+                for key, size in oldest:
+                    if self._total <= self.max_bytes:
+                        break
+                    self._db.execute("DELETE FROM translations WHERE key = ?", (key,))
+                    self._total    -= size
+                    self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries":   entries,
+                "bytes":     self._total,
+                "max_bytes": self.max_bytes,
+                "hits":      self.hits,
+                "misses":    self.misses,
+                "hit_rate":  self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def parse_batch(response: str, count: int) -> dict:
+    """
+    {index: translation} from a numbered batch response; messages the
+    model skipped or merged are simply missing.
+    """
+    parts = MARKER.split(response)
+    found = {}
+    # parts = [preamble, n1, text1, n2, text2, ...]
+    for number, text in zip(parts[1::2], parts[2::2]):
+        i = int(number) - 1
+        if 0 <= i < count and text.strip() and i not in found:
+            found[i] = text.strip()
+    return found
+
+
+class Translator:
+    """
+    Translates texts through the translation memory; the misses of one
+    request are sent to the LLM together, one generation per target
+    language (split at max_batch_chars). Messages a batch response lost
+    are retried one by one.
+    """
+
+    def __init__(self, generate, memory: TranslationMemory = None, max_batch_chars: int = 6000):
+        self.generate        = generate      # prompt -> text (runs at "translate" priority)
+        self.memory          = memory
+        self.max_batch_chars = max_batch_chars
+        self._lock           = threading.Lock()
+        self.llm_calls       = 0
+        self.translated      = 0
+
+    def _call(self, prompt: str) -> str:
+        with self._lock:
+            self.llm_calls += 1
+        return self.generate(prompt)
+
+    def _translate_one(self, text: str, target: str) -> str:
+        return self._call(SINGLE_PROMPTS[target].format(text=text)).strip()
+
+    def _translate_batch(self, texts, target: str) -> list:
+        if len(texts) == 1:
+            return [self._translate_one(texts[0], target)]
+        messages = "\n".join(f"[[{i + 1}]]\n{text.strip()}" for i, text in enumerate(texts))
+        response = self._call(BATCH_PROMPT.format(language=LANGUAGE_NAMES[target], messages=messages))
+        found    = parse_batch(response, len(texts))
+        if len(found) < len(texts):
+            logger.info(f"[LLM] Batch translation returned {len(found)}/{len(texts)} messages, retrying the rest")
+        return [found[i] if i in found else self._translate_one(text, target) for i, text in enumerate(texts)]
+
+    def _batches(self, by_key: dict):
+        # keys of the texts to translate, in batches of at most max_batch_chars
+        batch, size = [], 0
+        for key, text in by_key.items():
+            if batch and size + len(text) > self.max_batch_chars:
+                yield batch
+                batch, size = [], 0
+            batch.append(key)
+            size += len(text)
+        if batch:
+            yield batch
+
+    def translate_many(self, items) -> list:
+        """
+        items: [(text, target language)] -> translations, in order.
+        """
+        keys    = [memory_key(text, target) for text, target in items]
+        results = self.memory.get_many(keys) if self.memory else {}
+
+        # distinct misses, grouped by target language
+        pending = {}
+        for key, (text, target) in zip(keys, items):
+            if key not in results and text.strip():
+                pending.setdefault(target, {}).setdefault(key, text)
+
+        fresh = []
+        for target, by_key in pending.items():
+            for batch_keys in self._batches(by_key):
+                translations = self._translate_batch([by_key[k] for k in batch_keys], target)
+                for key, translation in zip(batch_keys, translations):
+                    results[key] = translation
+                    fresh.append((key, target, translation))
+        if fresh and self.memory:
+            self.memory.put_many(fresh)
+        with self._lock:
+            self.translated += len(fresh)
+
+        return [results.get(key, text) for key, (text, _) in zip(keys, items)]
+
+    def translate(self, text: str, target: str) -> str:
+        return self.translate_many([(text, target)])[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {"llm_calls": self.llm_calls, "translated": self.translated}
+        if self.memory:
+            stats["memory"] = self.memory.stats()
+        return stats
+
+
+_translator      = None
+_translator_lock = threading.Lock()
+
+def get_translator() -> Translator:
+    """
+    Process-wide translator on the LLM gateway, configured by
+    `translation:` in settings.yaml.
+    """
+    global _translator
+    with _translator_lock:
+        if _translator is None:
+            from online.llm.inference import gateway
+            cfg    = load_settings().get("translation") or {}
+            path   = cfg.get("memory_path", DEFAULT_MEMORY_PATH)
+            memory = TranslationMemory(path, max_bytes=int(cfg.get("memory_max_mb", 64) * 2**20)) if path else None
+            _translator = Translator(
+                lambda prompt: gateway.generate(prompt, priority="translate"),
+                memory=memory,
+                max_batch_chars=cfg.get("max_batch_chars", 6000),
+            )
+        return _translator
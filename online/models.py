@@ -0,0 +1,195 @@
+# online/models.py
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from online.config import load_settings
+from online.tracing import model_load
+
+logger = logging.getLogger("uvicorn.error")
+
+# ─ Load states, in order; "loaded" and "ready" (loaded + warmed up) can serve ─
+PENDING, LOADING, LOADED, WARMING, READY, FAILED = "pending", "loading", "loaded", "warming", "ready", "failed"
+SERVING = (LOADED, READY)
+
+
+class ModelEntry:
+    """
+    One lazily loaded model: loader() -> model, and an optional
+    warmup(model) that runs a dummy request so the first real one does not
+    pay for lazy initialization (kernels, caches, worker processes).
+    """
+
+    def __init__(self, name: str, loader, warmup=None):
+        self.name           = name
+        self.loader         = loader
+        self.warmup         = warmup
+        self.model          = None
+        self.state          = PENDING
+        self.error          = None
+        self.load_seconds   = None
+        self.warmup_seconds = None
+        self.lock           = threading.Lock()   # held while loading / warming
+
+    def status(self) -> dict:
+        return {
+            "state":          self.state,
+            "load_seconds":   self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "error":          self.error,
+        }
+
+
+class ModelRegistry:
+    """
+    Every heavy model of the tutor (Whisper, the embedding model + index,
+    the Ollama client, the TTS worker pool) behind one lazy, thread-safe
+    get(name): the first caller loads it, concurrent callers wait for that
+    load instead of starting their own. Importing the server therefore costs
+    nothing; warmup() loads and exercises all models in parallel in the
+    background, and status() feeds /healthz and /readyz.
+
+    register() again under the same name replaces a model (the benchmarks
+    use this to swap in offline stand-ins).
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock    = threading.Lock()
+        self._warmup  = None
+
+    def register(self, name: str, loader, warmup=None) -> None:
+        with self._lock:
+            self._entries[name] = ModelEntry(name, loader, warmup)
+
+    def _entry(self, name: str) -> ModelEntry:
+        with self._lock:
+            if name not in self._entries:
+                raise KeyError(f"No model registered as '{name}'")
+            return self._entries[name]
+
+    def get(self, name: str):
+        """
+        The model registered as `name`, loading it on first use.
+        """
+        entry = self._entry(name)
+        if entry.state in SERVING or entry.state == WARMING:
+            return entry.model
+        with entry.lock:
+            if entry.model is None:
+                self._load(entry)
+            return entry.model
+
+    def peek(self, name: str):
+        """
+        The model if it is already loaded, else None (never loads).
+        """
+        return self._entry(name).model
+
+    def _load(self, entry: ModelEntry) -> None:
+        entry.state = LOADING
+        start       = time.perf_counter()
+        try:
+            with model_load(entry.name):
+                entry.model = entry.loader()
+        except Exception as e:
+            entry.state = FAILED
+            entry.error = f"{type(e).__name__}: {e}"
+            raise
+        entry.load_seconds = time.perf_counter() - start
+        entry.state        = LOADED
+        entry.error        = None
+
+    def warm(self, name: str) -> None:
+        """
+        Load `name` (if needed) and run its warmup once.
+        """
+        entry = self._entry(name)
+        with entry.lock:
+            if entry.state == READY:
+                return
+            if entry.model is None:
+                self._load(entry)
+            if entry.warmup is None:
+                entry.state = READY
+                return
+            entry.state = WARMING
+            start       = time.perf_counter()
+            try:
+                entry.warmup(entry.model)
+            except Exception as e:
+                # a dummy request failing means real ones would too (or the sidecar is down)
+                logger.warning(f"[models] Warmup of {name} failed: {e}")
+                entry.state = FAILED
+                entry.error = f"warmup: {type(e).__name__}: {e}"
+                return
+            entry.warmup_seconds = time.perf_counter() - start
+            entry.state          = READY
+        logger.info(f"[models] {name} ready (load {entry.load_seconds:.2f}s, warmup {entry.warmup_seconds:.2f}s)")
+
+    def warmup(self, names=None, background: bool = True):
+        """
+        Load and warm `names` (default: all registered models) concurrently,
+        one thread per model. With background=True this returns at once;
+        otherwise it blocks until every model is done.
+        """
+        with self._lock:
+            names = list(names or self._entries)
+
+        def warm_all():
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max(1, len(names)), thread_name_prefix="warmup") as pool:
+                for name, future in [(name, pool.submit(self.warm, name)) for name in names]:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.error(f"[models] Loading {name} failed: {e}")
+            logger.info(f"[models] Warmup finished in {time.perf_counter() - start:.2f}s")
+
+        if not background:
+            warm_all()
+            return None
+        self._warmup = threading.Thread(target=warm_all, name="model-warmup", daemon=True)
+        self._warmup.start()
+        return self._warmup
+
+    def retry_failed(self) -> None:
+        """
+        Warm failed models again in the background, unless a warmup is
+        still running (called by /readyz, so probes drive the retries).
+        """
+        if self._warmup is not None and self._warmup.is_alive():
+            return
+        failed = [name for name, s in self.status().items() if s["state"] == FAILED]
+        if failed:
+            self.warmup(failed)
+
+    def status(self) -> dict:
+        with self._lock:
+            entries = list(self._entries.values())
+        return {entry.name: entry.status() for entry in entries}
+
+    def ready(self) -> bool:
+        """
+        True once every registered model is loaded and not being warmed up.
+        """
+        return all(s["state"] in SERVING for s in self.status().values())
+
+
+_registry = ModelRegistry()
+
+def get_model_registry() -> ModelRegistry:
+    """
+    Process-wide registry; models register themselves when their module is
+    imported (nothing is loaded until get() or warmup()).
+    """
+    return _registry
+
+
+def warmup_on_startup() -> bool:
+    """
+    `models.warmup_on_startup` in settings.yaml (default true).
+    """
+    return (load_settings().get("models") or {}).get("warmup_on_startup", True)
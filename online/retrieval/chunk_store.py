@@ -0,0 +1,200 @@
+# online/retrieval/chunk_store.py
+
+import json
+import mmap
+import os
+import sys
+from pathlib import Path
+
+from langchain.schema import Document
+
+# Files written into the chunks directory (data/chunks)
+STORE_GLOB  = "chunks.*.jsonl"     # chunks.<generation>.jsonl: one compact {"id", "page_content", "metadata"} per line
+STORE_FILE  = "chunks.jsonl"       # same, written before stores had generations
+INDEX_FILE  = "chunks.idx.json"    # {"ids", "offsets", "generation", "store"}: line i is bytes offsets[i]:offsets[i+1] of `store`
+LEGACY_GLOB = "chunk_*.json"       # old layout: one pretty-printed file per chunk
+
+
+def has_chunk_store(chunks_dir: str) -> bool:
+    return (Path(chunks_dir) / INDEX_FILE).is_file()
+
+
+def _read_index(path: Path) -> dict:
+    return json.loads((path / INDEX_FILE).read_text(encoding="utf-8"))
+
+
+def _record(doc_id: str, page_content: str, metadata: dict) -> bytes:
+    payload = {"id": doc_id, "page_content": page_content, "metadata": metadata}
+    return (json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class ChunkStoreWriter:
+    """
+    Writes a packed chunk store next to the live one and swaps it in on
+    close(), so readers never see a half-written store. Duplicate ids are
+    written once.
+
+    Each write goes to a new chunks.<generation>.jsonl; the index names
+    that file and is replaced last, in one os.replace, so a reader sees
+    either the old index and its data or the new ones, never a mix. Data
+    files two generations old are deleted (the previous one stays for
+    readers that read the old index just before the swap). A data file a
+    reader still has open cannot be deleted on Windows; it is left for a
+    later write to delete, once the reader has closed it.
+    """
+
+    def __init__(self, chunks_dir: str):
+        self.path = Path(chunks_dir)
+        self.path.mkdir(parents=True, exist_ok=True)
+        try:
+            self._previous = _read_index(self.path)
+        except (FileNotFoundError, ValueError):
+            self._previous = {}
+        self.generation = self._previous.get("generation", 0) + 1
+        self._store     = f"chunks.{self.generation}.jsonl"
+        self._file      = open(self.path / self._store, "wb")
+        self._ids       = []
+        self._offsets   = [0]
+        self._seen      = set()
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._seen
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add_record(self, doc_id: str, record: bytes) -> bool:
+        """
+        Append an already encoded line (e.g. copied from another store).
+        """
+        if doc_id in self._seen:
+            return False
+        self._file.write(record)
+        self._seen.add(doc_id)
+        self._ids.append(doc_id)
+        self._offsets.append(self._offsets[-1] + len(record))
+        return True
+
+    def add(self, doc_id: str, page_content: str, metadata: dict) -> bool:
+        return self.add_record(doc_id, _record(doc_id, page_content, metadata))
+
+    def close(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        index_tmp = self.path / (INDEX_FILE + ".tmp")
+        index_tmp.write_text(json.dumps({
+            "ids":        self._ids,
+            "offsets":    self._offsets,
+            "generation": self.generation,
+            "store":      self._store,
+        }), encoding="utf-8")
+        # the commit point: readers switch to the new data file here
+        os.replace(index_tmp, self.path / INDEX_FILE)
+
+        keep = {self._store, self._previous.get("store", STORE_FILE)}
+        for old in [self.path / STORE_FILE, *self.path.glob(STORE_GLOB)]:
+            if old.name not in keep:
+                try:
+                    old.unlink(missing_ok=True)
+                except PermissionError:
+                    pass
+
+    def abort(self) -> None:
+        self._file.close()
+        (self.path / self._store).unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ChunkStore:
+    """
+    Read side of the packed store: the JSONL file is memory-mapped and a
+    chunk is parsed only when it is asked for by id, so opening the store
+    costs one small index read no matter how many chunks there are.
+    """
+
+    def __init__(self, chunks_dir: str):
+        path = Path(chunks_dir)
+        self.chunks_dir = str(chunks_dir)
+        index = _read_index(path)
+        self.generation = index.get("generation", 0)
+        self.ids      = index["ids"]
+        self._offsets = index["offsets"]
+        self._row     = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        if len(self._offsets) != len(self.ids) + 1:
+            raise ValueError(f"Chunk store index in '{chunks_dir}' is corrupt")
+
+        self._file = open(path / index.get("store", STORE_FILE), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size != self._offsets[-1]:
+            raise ValueError(f"Chunk store in '{chunks_dir}' does not match its index")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._row
+
+    def record(self, doc_id: str) -> bytes:
+        """
+        Raw encoded line of a chunk (for copying into a ChunkStoreWriter).
+        """
+        row = self._row[doc_id]
+        return self._data[self._offsets[row]:self._offsets[row + 1]]
+
+    def get(self, doc_id: str):
+        """
+        Document for a chunk id, or None.
+        """
+        if doc_id not in self._row:
+            return None
+        payload = json.loads(self.record(doc_id))
+        return Document(id=doc_id, page_content=payload["page_content"], metadata=payload["metadata"])
+
+    def text(self, doc_id: str):
+        doc = self.get(doc_id)
+        return doc.page_content if doc else None
+
+    def __iter__(self):
+        for doc_id in self.ids:
+            yield self.get(doc_id)
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+
+def iter_legacy_chunks(chunks_dir: str):
+    """
+    Documents from the old one-file-per-chunk layout, in file name order.
+    """
+    for chunk_file in sorted(Path(chunks_dir).glob(LEGACY_GLOB)):
+        payload = json.loads(chunk_file.read_text(encoding="utf-8"))
+        yield Document(id=chunk_file.stem, page_content=payload["page_content"], metadata=payload["metadata"])
+
+
+def import_legacy_chunks(chunks_dir: str) -> int:
+    """
+    Pack an old chunk_*.json directory into a chunk store (the per-file
+    chunks are left in place). Returns the number of chunks.
+    """
+    with ChunkStoreWriter(chunks_dir) as writer:
+        for doc in iter_legacy_chunks(chunks_dir):
+            writer.add(doc.id, doc.page_content, doc.metadata)
+    return len(writer)
+
+
+if __name__ == "__main__":
+    # Convert an existing per-file chunk directory, e.g. data/chunks
+    target = sys.argv[1] if len(sys.argv) > 1 else "data/chunks"
+    print(f"Packed {import_legacy_chunks(target)} chunks into {Path(target)}")
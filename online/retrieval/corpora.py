@@ -0,0 +1,231 @@
+# online/retrieval/corpora.py
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from online.config import get_setting, load_settings
+from online.retrieval.chunk_store import INDEX_FILE
+from online.retrieval.retriever import (
+    DEFAULT_BACKEND, DEFAULT_CHUNKS_DIR, DEFAULT_MODEL_NAME, DEFAULT_PERSIST_DIR,
+    Retriever, get_retriever, open_retriever,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+DEFAULT_COURSE     = "default"        # the single index under vector_db (data/, vector_db.persist_dir)
+DEFAULT_DATA_ROOT  = "data/courses"   # <course>/raw (sources) + <course>/chunks
+DEFAULT_INDEX_ROOT = "db/courses"     # <course>/ (vector index)
+
+
+class UnknownCourse(LookupError):
+    """
+    A request named a course that is not configured, or not indexed yet.
+    """
+
+
+def corpora_settings() -> dict:
+    return load_settings().get("corpora") or {}
+
+
+def course_names() -> list:
+    """
+    Courses configured under `corpora.courses` in settings.yaml.
+    """
+    return sorted(corpora_settings().get("courses") or {})
+
+
+def course_config(name: str) -> dict:
+    """
+    data_dir, chunks_dir, persist_dir and backend of course `name`.
+
+    DEFAULT_COURSE is the single-course layout under vector_db. A course
+    under corpora.courses lives in <data_root>/<name> (raw/ + chunks/) and
+    <index_root>/<name>; `data_dir`, `persist_dir` and `type` can be set
+    per course.
+    """
+    backend = get_setting("vector_db", "type", DEFAULT_BACKEND)
+    if name == DEFAULT_COURSE:
+        return {
+            "data_dir":    "data",
+            "chunks_dir":  get_setting("vector_db", "chunk_store", DEFAULT_CHUNKS_DIR),
+            "persist_dir": get_setting("vector_db", "persist_dir", DEFAULT_PERSIST_DIR),
+            "backend":     backend,
+        }
+    settings = corpora_settings()
+    courses  = settings.get("courses") or {}
+    if name not in courses:
+        raise UnknownCourse(f"Unknown course '{name}'")
+    cfg      = courses[name] or {}
+    data_dir = cfg.get("data_dir") or os.path.join(settings.get("data_root", DEFAULT_DATA_ROOT), name)
+    return {
+        "data_dir":    data_dir,
+        "chunks_dir":  os.path.join(data_dir, "chunks"),
+        "persist_dir": cfg.get("persist_dir") or os.path.join(settings.get("index_root", DEFAULT_INDEX_ROOT), name),
+        "backend":     cfg.get("type", backend),
+    }
+
+
+def index_size_mb(persist_dir: str, chunks_dir: str) -> float:
+    """
+    Rough resident size of an open index: every file under persist_dir
+    (Chroma's SQLite + HNSW files, or the flat matrix) plus the chunk
+    store's offset index. Chunk text itself is memory-mapped, not counted.
+    """
+    size = sum(p.stat().st_size for p in Path(persist_dir).rglob("*") if p.is_file())
+    idx  = Path(chunks_dir) / INDEX_FILE
+    if idx.is_file():
+        size += idx.stat().st_size
+    return size / 2**20
+
+
+class CorpusPool:
+    """
+    Open course indexes, one Retriever per course. A course is opened on
+    its first query (concurrent first queries wait for one open) and kept
+    in an LRU bounded by max_open indexes and by max_open_mb; the least
+    recently used course is closed first. In-flight searches on a closed
+    course finish on it; its chunk store is released retriever.RETIRE_SECONDS later.
+
+    All courses share one query embedding model and its cache (see
+    retriever.query_encoder). DEFAULT_COURSE is the process-wide
+    get_retriever() index, which is never evicted.
+    """
+
+    def __init__(self, max_open: int = 4, max_open_mb: float = 2048, model_name: str = DEFAULT_MODEL_NAME):
+        self.max_open    = max_open
+        self.max_open_mb = max_open_mb
+        self.model_name  = model_name
+        self._open       = OrderedDict()   # course -> (Retriever, size in MB), least recently used first
+        self._opening    = {}              # course -> lock held while it is being opened
+        self._closed_gen = {}              # course -> generation to reopen it with
+        self._lock       = threading.Lock()
+        self.hits      = 0
+        self.opens     = 0
+        self.evictions = 0
+
+    def _cached(self, name: str):
+        # caller holds self._lock
+        entry = self._open.get(name)
+        if entry is None:
+            return None
+        self._open.move_to_end(name)
+        self.hits += 1
+        return entry[0]
+
+    def get(self, name: str = None) -> Retriever:
+        """
+        The Retriever of course `name` (None = DEFAULT_COURSE), opening it
+        if needed. Raises UnknownCourse.
+        """
+        if not name or name == DEFAULT_COURSE:
+            return get_retriever(model_name=self.model_name)
+        with self._lock:
+            retriever = self._cached(name)
+            if retriever is not None:
+                return retriever
+        cfg = course_config(name)
+        with self._lock:
+            lock = self._opening.setdefault(name, threading.Lock())
+        with lock:
+            with self._lock:
+                retriever = self._cached(name)
+                if retriever is not None:
+                    return retriever
+            try:
+                retriever = self._open_course(name, cfg)
+                size_mb   = index_size_mb(cfg["persist_dir"], cfg["chunks_dir"])
+            finally:
+                with self._lock:
+                    self._opening.pop(name, None)
+            with self._lock:
+                self._open[name] = (retriever, size_mb)
+                self.opens += 1
+                self._evict()
+            logger.info(f"[corpora] Opened course '{name}' ({size_mb:.1f} MB) from '{cfg['persist_dir']}'")
+            return retriever
+
+    def _open_course(self, name: str, cfg: dict) -> Retriever:
+        if not os.path.isdir(cfg["persist_dir"]):
+            # Chroma would silently create an empty store here
+            raise UnknownCourse(f"Course '{name}' has no index at '{cfg['persist_dir']}'; run offline/build_corpora.py")
+        with self._lock:
+            generation = self._closed_gen.get(name, 0)
+        # the index may have been rebuilt while it was closed: never reuse its generation
+        return open_retriever(
+            cfg["persist_dir"],
+            chunks_dir=cfg["chunks_dir"],
+            backend=cfg["backend"],
+            model_name=self.model_name,
+            generation=generation,
+        )
+
+    def _evict(self) -> None:
+        # caller holds self._lock; the course just opened always stays
+        while len(self._open) > 1 and (
+            len(self._open) > self.max_open or self.open_mb() > self.max_open_mb
+        ):
+            name, (retriever, _) = self._open.popitem(last=False)
+            self._closed_gen[name] = retriever.generation + 1
+            retriever.close()
+            self.evictions += 1
+            logger.info(f"[corpora] Closed course '{name}' (least recently used)")
+
+    def open_mb(self) -> float:
+        return sum(size_mb for _, size_mb in self._open.values())
+
+    def check(self, name: str) -> str:
+        """
+        `name` if it is DEFAULT_COURSE or a configured course, else
+        UnknownCourse (without opening anything).
+        """
+        if name != DEFAULT_COURSE:
+            course_config(name)
+        return name
+
+    def reload(self, name: str = None) -> None:
+        """
+        Re-open course `name`'s index if it is open (DEFAULT_COURSE always).
+        """
+        if not name or name == DEFAULT_COURSE:
+            get_retriever(model_name=self.model_name).reload()
+            return
+        self.check(name)
+        with self._lock:
+            entry = self._open.get(name)
+        if entry is not None:
+            entry[0].reload()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "courses":     course_names(),
+                "open":        {name: {"size_mb": round(size_mb, 1), "generation": r.generation}
+                                for name, (r, size_mb) in self._open.items()},
+                "open_mb":     round(self.open_mb(), 1),
+                "max_open":    self.max_open,
+                "max_open_mb": self.max_open_mb,
+                "hits":        self.hits,
+                "opens":       self.opens,
+                "evictions":   self.evictions,
+            }
+
+
+_corpora      = None
+_corpora_lock = threading.Lock()
+
+def get_corpora() -> CorpusPool:
+    """
+    Process-wide pool of course indexes, configured by `corpora:` in settings.yaml.
+    """
+    global _corpora
+    with _corpora_lock:
+        if _corpora is None:
+            cfg = corpora_settings()
+            _corpora = CorpusPool(
+                max_open=cfg.get("max_open", 4),
+                max_open_mb=cfg.get("max_open_mb", 2048),
+            )
+        return _corpora
@@ -0,0 +1,264 @@
+# online/retrieval/flat_index.py
+
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+from langchain.schema import Document
+
+# Files written into persist_dir, each as <stem>.<generation>.<ext> (e.g. embeddings.3.npy)
+EMBEDDINGS_FILE = "embeddings.npy"   # float32 (N, dim), memory-mapped on load
+IDS_FILE        = "ids.npy"          # chunk ids, row-aligned with embeddings
+METADATA_FILE   = "metadata.jsonl"   # one {"page_content", "metadata"} per row
+QUANTIZED_FILE  = "embeddings.q.npy" # optional float16 / int8 copy of embeddings, scanned first
+SCALES_FILE     = "scales.npy"       # float32 (N,) per-vector scales of an int8 copy
+MANIFEST_FILE   = "flat_index.json"  # {"generation", "files": {role: file name}}: the live generation
+
+ROLES = {
+    "embeddings": EMBEDDINGS_FILE,
+    "ids":        IDS_FILE,
+    "metadata":   METADATA_FILE,
+    "quantized":  QUANTIZED_FILE,
+    "scales":     SCALES_FILE,
+}
+GENERATION_FILE = re.compile(r"^(embeddings|ids|metadata|embeddings\.q|scales)\.(\d+)\.(npy|jsonl)$")
+
+QUANTIZATIONS = ("none", "float16", "int8")
+SCAN_BLOCK    = 1024                 # quantized rows widened to float32 at a time
+
+
+def _read_manifest(path: Path) -> dict:
+    try:
+        return json.loads((path / MANIFEST_FILE).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def flat_index_files(persist_dir: str):
+    """
+    {role: Path} of the live flat index in persist_dir (roles as in ROLES;
+    "quantized" / "scales" only if written), or None if there is none.
+    Indexes written before generations existed use the fixed file names.
+    """
+    path     = Path(persist_dir)
+    manifest = _read_manifest(path)
+    if manifest:
+        return {role: path / name for role, name in manifest["files"].items()}
+    if not (path / EMBEDDINGS_FILE).exists():
+        return None
+    return {role: path / name for role, name in ROLES.items() if (path / name).exists()}
+
+
+def _generation_name(name: str, generation: int) -> str:
+    stem, ext = name.rsplit(".", 1)
+    return f"{stem}.{generation}.{ext}"
+
+
+def _remove_stale(path: Path, keep) -> None:
+    """
+    Delete flat-index files of older generations (and of the fixed-name
+    layout) except `keep`. Best effort: on Windows a file a reader still
+    has open or memory-mapped cannot be deleted, so it stays until a later
+    write, after the reader has closed it.
+    """
+    for entry in path.iterdir():
+        if entry.name in keep:
+            continue
+        if GENERATION_FILE.match(entry.name) or entry.name in ROLES.values():
+            try:
+                entry.unlink()
+            except PermissionError:
+                pass
+
+
+def quantize(matrix, quantization: str):
+    """
+    -> (codes, scales). float16: codes are the halved vectors, no scales.
+    int8: symmetric per-vector quantization, row ≈ codes[row] * scales[row].
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if quantization == "float16":
+        return matrix.astype(np.float16), None
+    if quantization == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.zeros(0, dtype=np.float32)
+        scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+        codes  = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales
+    raise ValueError(f"Unknown quantization: {quantization!r} (expected one of {QUANTIZATIONS})")
+
+
+def write_flat_index(persist_dir: str, ids, vectors, documents, quantization: str = "none") -> None:
+    """
+    Persist a flat index: embeddings matrix, chunk-id array and a
+    metadata sidecar, all row-aligned. With quantization "float16" or
+    "int8" a quantized copy of the matrix (and int8 scales) is written
+    too; the float32 matrix stays for rescoring.
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {quantization!r} (expected one of {QUANTIZATIONS})")
+    path = Path(persist_dir)
+    path.mkdir(parents=True, exist_ok=True)
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim != 2 or len(matrix) != len(ids) or len(ids) != len(documents):
+        raise ValueError("ids, vectors and documents must be row-aligned")
+
+    # every write is a new generation of files, and the small manifest naming
+    # them is swapped in last (the commit point): files a running server has
+    # memory-mapped are never replaced, which Windows would refuse
+    previous   = _read_manifest(path)
+    generation = previous.get("generation", 0) + 1
+    files      = {
+        "embeddings": _generation_name(EMBEDDINGS_FILE, generation),
+        "ids":        _generation_name(IDS_FILE, generation),
+        "metadata":   _generation_name(METADATA_FILE, generation),
+    }
+    with open(path / files["embeddings"], "wb") as f:
+        np.save(f, matrix)
+    with open(path / files["ids"], "wb") as f:
+        np.save(f, np.asarray(ids, dtype=str))
+    with open(path / files["metadata"], "w", encoding="utf-8") as f:
+        for doc in documents:
+            payload = {"page_content": doc.page_content, "metadata": doc.metadata}
+            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+    if quantization != "none":
+        codes, scales = quantize(matrix, quantization)
+        files["quantized"] = _generation_name(QUANTIZED_FILE, generation)
+        with open(path / files["quantized"], "wb") as f:
+            np.save(f, codes)
+        if scales is not None:
+            files["scales"] = _generation_name(SCALES_FILE, generation)
+            with open(path / files["scales"], "wb") as f:
+                np.save(f, scales)
+    manifest_tmp = path / (MANIFEST_FILE + ".tmp")
+    manifest_tmp.write_text(json.dumps({"generation": generation, "files": files}), encoding="utf-8")
+    os.replace(manifest_tmp, path / MANIFEST_FILE)
+
+    # the previous generation stays for readers that read the old manifest just before the swap
+    old = previous.get("files") or {role: name for role, name in ROLES.items() if (path / name).exists()}
+    _remove_stale(path, {*files.values(), *old.values()})
+
+class FlatIndex:
+    """
+    Exact dot-product search over a memory-mapped float32 matrix.
+    For a few thousand chunks a single matmul beats HNSW + SQLite.
+
+    If the index was written with a quantized copy (float16, or int8 with
+    per-vector scales), queries scan that copy instead, keep the best
+    k * rescore_factor rows, and rescore only those with the exact float32
+    vectors. Only the quantized matrix (2-4x smaller) is read on every
+    query; pages of the float32 matrix are touched for the candidates
+    only. Scores returned are always exact dot products.
+    """
+
+    def __init__(self, persist_dir: str, rescore_factor: int = 4):
+        files = flat_index_files(persist_dir)
+        if files is None:
+            raise FileNotFoundError(f"No flat index at '{persist_dir}'")
+        self.persist_dir    = persist_dir
+        self.rescore_factor = max(1, rescore_factor)
+        self.files          = files
+        self.embeddings     = np.load(files["embeddings"], mmap_mode="r")
+        self.ids            = np.load(files["ids"])
+        self.quantized      = np.load(files["quantized"], mmap_mode="r") if "quantized" in files else None
+        self.scales         = np.load(files["scales"]) if "scales" in files else None
+        with open(files["metadata"], encoding="utf-8") as f:
+            self.records = [json.loads(line) for line in f if line.strip()]
+
+        if not (len(self.embeddings) == len(self.ids) == len(self.records)):
+            raise ValueError(f"Flat index at '{persist_dir}' is not row-aligned")
+        if self.quantized is not None and (
+            self.quantized.shape != self.embeddings.shape
+            or (self.quantized.dtype == np.int8) != (self.scales is not None)
+        ):
+            raise ValueError(f"Quantized vectors at '{persist_dir}' do not match the index")
+
+    @property
+    def quantization(self) -> str:
+        if self.quantized is None:
+            return "none"
+        return "int8" if self.quantized.dtype == np.int8 else "float16"
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def close(self) -> None:
+        """
+        Drop the memory maps (numpy unmaps a file once nothing references
+        it), so a later write can delete this generation's files.
+        """
+        self.embeddings = self.quantized = None
+
+    def _document(self, row: int) -> Document:
+        record = self.records[row]
+        return Document(
+            id=str(self.ids[row]),
+            page_content=record["page_content"],
+            metadata=dict(record["metadata"]),
+        )
+
+    def search_by_vector(self, vectors, k: int = 3):
+        """
+        vectors: one query vector (dim,) or a batch (Q, dim).
+        Returns one list of (Document, score) per query, best first,
+        where score is the dot product (higher = more similar).
+        """
+        queries = np.asarray(vectors, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+
+        n = len(self)
+        k = min(k, n)
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        if self.quantized is not None and k * self.rescore_factor < n:
+            top, top_scores = self._search_quantized(queries, k)
+        else:
+            scores = queries @ self.embeddings.T   # (Q, N)
+            top, top_scores = _top_k(scores, k)
+        order      = np.argsort(-top_scores, axis=1)
+        top        = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [
+            [(self._document(int(row)), float(score)) for row, score in zip(rows, row_scores)]
+            for rows, row_scores in zip(top, top_scores)
+        ]
+
+    def _approximate_scores(self, queries) -> np.ndarray:
+        # (Q, N) scores against the quantized copy, widened block by block
+        scores = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), SCAN_BLOCK):
+            block = np.asarray(self.quantized[start:start + SCAN_BLOCK], dtype=np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def _search_quantized(self, queries, k: int):
+        """
+        Approximate scan, then exact rescoring of the candidates.
+        -> (rows, scores), each (Q, k), unordered.
+        """
+        candidates, _ = _top_k(self._approximate_scores(queries), k * self.rescore_factor)
+        # one gather of the exact rows all queries need (sorted: sequential reads)
+        rows   = np.unique(candidates)
+        exact  = queries @ np.asarray(self.embeddings[rows], dtype=np.float32).T   # (Q, len(rows))
+        scores = np.take_along_axis(exact, np.searchsorted(rows, candidates), axis=1)
+        best, best_scores = _top_k(scores, k)
+        return np.take_along_axis(candidates, best, axis=1), best_scores
+
+
+def _top_k(scores, k: int):
+    """
+    (columns, scores) of the k best scores in each row, unordered.
+    """
+    n = scores.shape[1]
+    if k < n:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(n), scores.shape)
+    return top, np.take_along_axis(scores, top, axis=1)
@@ -1,38 +1,426 @@
 # online/retrieval/retriever.py
 
+import os
+import sys
+import threading
+import time
+import logging
 import warnings
 # Silence all warnings (including LangChain deprecation warnings)
 warnings.filterwarnings("ignore")
 
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
+# make sure project root is importable
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
 
-def get_relevant_chunks(
-    query: str,
-    persist_dir: str = "db/chroma_index",
-    model_name: str = "multi-qa-mpnet-base-dot-v1",
-    top_k: int = 3,
-    min_score: float = 0.0  # only keep chunks with score ≥ this threshold
-):
+from online.cache import LRUCache
+from online.config import get_setting
+from online.models import get_model_registry
+from online.sidecar.client import SidecarEmbeddings, get_sidecar, use_sidecar
+from online.retrieval.flat_index import FlatIndex
+from online.retrieval.chunk_store import ChunkStore, has_chunk_store
+from online.tracing import model_load, span, traced
+
+logger = logging.getLogger("uvicorn.error")
+
+DEFAULT_PERSIST_DIR = "db/chroma_index"
+DEFAULT_MODEL_NAME  = "multi-qa-mpnet-base-dot-v1"
+DEFAULT_BACKEND     = "chroma"   # chroma | numpy
+DEFAULT_CHUNKS_DIR  = "data/chunks"
+RETIRE_SECONDS      = 30         # a swapped-out chunk store is closed this long after, once in-flight reads are done
+
+
+def _close_later(store) -> None:
+    # searches that took the old store just before a swap may still be reading it
+    if store is None:
+        return
+    timer = threading.Timer(RETIRE_SECONDS, store.close)
+    timer.daemon = True
+    timer.start()
+
+
+def normalize_query(query: str) -> str:
+    """
+    Cache key for a query: case-folded, whitespace-collapsed, without
+    trailing punctuation ("What is YOLO?" == "what is  yolo").
+    """
+    return " ".join(query.casefold().split()).rstrip(" ?!.")
+
+
+class Retriever:
     """
-    Given a text query, load your local Chroma index and return the top_k
-    most similar Document chunks whose similarity score ≥ min_score.
+    Long-lived retrieval engine: the embedding model and the vector store are
+    loaded once and reused for every query. `reload()` swaps in a rebuilt
+    index without restarting the process.
+
+    Query embeddings and top-k results are kept in bounded LRU/TTL caches.
+    The result cache is dropped (and the index reloaded) as soon as the
+    files under persist_dir change, i.e. when the offline indexer rebuilt it.
+
+    backend "chroma" scores are Chroma distances (what the tutor has always
+    filtered on); backend "numpy" scores are dot-product similarities. A
+    numpy index built with quantized vectors is scanned approximately and
+    its best top_k * rescore_factor candidates rescored exactly.
+
+    Hits without text (index built with `vector_db.lazy_text`) get their
+    page_content from the packed chunk store in chunks_dir, by chunk id.
+
+    `embeddings` replaces the local HuggingFaceEmbeddings (e.g. the
+    inference sidecar's SidecarEmbeddings), so no model is loaded here;
+    `embedding_cache` likewise lets several indexes share one query cache.
+    `generation` is the first generation number (a reopened index starts
+    past the one it replaces, so caches keyed on it are not reused).
     """
-    # 1) Initialize the same embedding model you used offline
-    embeddings = HuggingFaceEmbeddings(model_name=model_name)
 
-    # 2) Load your persisted Chroma store
-    vectordb = Chroma(
-        persist_directory=persist_dir,
-        embedding_function=embeddings
+    def __init__(
+        self,
+        persist_dir: str = DEFAULT_PERSIST_DIR,
+        model_name: str = DEFAULT_MODEL_NAME,
+        backend: str = DEFAULT_BACKEND,
+        cache_size: int = 1024,
+        cache_ttl: float = 3600,
+        check_interval: float = 2.0,
+        chunks_dir: str = DEFAULT_CHUNKS_DIR,
+        embeddings=None,
+        embedding_cache=None,
+        generation: int = 0,
+        rescore_factor: int = 4,
+    ):
+        if backend not in ("chroma", "numpy"):
+            raise ValueError(f"Unknown vector_db type: {backend!r}")
+        self.persist_dir    = persist_dir
+        self.model_name     = model_name
+        self.backend        = backend
+        self.chunks_dir     = chunks_dir
+        self.rescore_factor = rescore_factor
+
+        # ─ Caches (keys use normalize_query) ─
+        self.embedding_cache = embedding_cache or LRUCache(max_entries=cache_size, ttl_seconds=cache_ttl)
+        self.result_cache    = LRUCache(max_entries=cache_size, ttl_seconds=cache_ttl)
+        self.check_interval  = check_interval
+        self._generation     = generation   # bumped on every reload; part of result keys
+        self._next_check     = 0.0
+        self._reload_lock    = threading.Lock()
+
+        # 1) Initialize the same embedding model you used offline (once)
+        if embeddings is not None:
+            self.embeddings = embeddings
+        else:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            with model_load(f"embeddings:{model_name}"):
+                self.embeddings = HuggingFaceEmbeddings(model_name=model_name)
+
+        # 2) Load your persisted vector store (+ chunk text store, if any)
+        with model_load(f"index:{backend}"):
+            self.vectordb = self._open_index()
+        self.chunk_store  = self._open_chunk_store()
+        self._fingerprint = self._index_fingerprint()
+
+    def _open_index(self):
+        if self.backend == "numpy":
+            return FlatIndex(self.persist_dir, rescore_factor=self.rescore_factor)
+        from langchain_community.vectorstores import Chroma
+        try:
+            # chromadb caches one client per path; drop it so a rebuilt
+            # directory is really re-read
+            from chromadb.api.client import SharedSystemClient
+            SharedSystemClient.clear_system_cache()
+        except (ImportError, AttributeError):
+            pass
+        return Chroma(
+            persist_directory=self.persist_dir,
+            embedding_function=self.embeddings
+        )
+
+    def _open_chunk_store(self):
+        if self.chunks_dir and has_chunk_store(self.chunks_dir):
+            return ChunkStore(self.chunks_dir)
+        return None
+
+    def _fill_text(self, docs) -> None:
+        # lazily read text for hits the index stored without it
+        store = self.chunk_store
+        if store is None:
+            return
+        for doc in docs:
+            if not doc.page_content and doc.id:
+                doc.page_content = store.text(doc.id) or ""
+
+    def _index_fingerprint(self):
+        """
+        (name, mtime, size) of every file directly under persist_dir.
+        Both the Chroma sqlite file and the flat-index files live there.
+        """
+        try:
+            with os.scandir(self.persist_dir) as entries:
+                return tuple(sorted(
+                    (e.name, e.stat().st_mtime_ns, e.stat().st_size)
+                    for e in entries if e.is_file()
+                ))
+        except FileNotFoundError:
+            return None
+
+    def _check_index(self) -> None:
+        """
+        At most every check_interval seconds, reload if the index on disk
+        changed since it was opened.
+        """
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        fingerprint = self._index_fingerprint()
+        if fingerprint is None or fingerprint == self._fingerprint:
+            return
+        try:
+            self.reload()
+            logger.info(f"Index at '{self.persist_dir}' changed on disk; reloaded")
+        except Exception as e:
+            # probably mid-rebuild; keep serving the old index and retry later
+            logger.warning(f"Index at '{self.persist_dir}' changed but reload failed: {e}")
+
+    def reload(self) -> None:
+        """
+        Re-open the index at persist_dir (e.g. after offline/indexer.py rebuilt
+        it). The new store is opened first, then swapped in atomically so
+        in-flight searches keep using the old one. Cached results are dropped.
+        """
+        with self._reload_lock:
+            vectordb    = self._open_index()
+            chunk_store = self._open_chunk_store()
+            old_index   = self.vectordb
+            old_store   = self.chunk_store
+            self.vectordb     = vectordb
+            self.chunk_store  = chunk_store
+            self._fingerprint = self._index_fingerprint()
+            self._generation += 1
+            self.result_cache.clear()
+        # their mmaps and file handles would otherwise stay open until garbage
+        # collection (and, on Windows, keep the indexer from deleting the files)
+        _close_later(old_index if self.backend == "numpy" else None)
+        _close_later(old_store)
+
+    def close(self) -> None:
+        """
+        Release the flat index and the chunk store (after RETIRE_SECONDS,
+        so in-flight searches finish on them). For an index that is no
+        longer served.
+        """
+        _close_later(self.vectordb if self.backend == "numpy" else None)
+        _close_later(self.chunk_store)
+
+    @property
+    def generation(self) -> int:
+        """
+        Bumped whenever the index is reloaded; caches built on search
+        results (e.g. the answer cache) are stale once it changes.
+        """
+        return self._generation
+
+    def embed_queries(self, queries):
+        """
+        Embed queries, reusing cached vectors for normalized repeats.
+        """
+        keys    = [normalize_query(q) for q in queries]
+        vectors = [self.embedding_cache.get(key) for key in keys]
+        todo    = [i for i, vector in enumerate(vectors) if vector is None]
+        if todo:
+            with span("retrieval.embed"):
+                fresh = self.embeddings.embed_documents([queries[i] for i in todo])
+            for i, vector in zip(todo, fresh):
+                self.embedding_cache.put(keys[i], vector)
+                vectors[i] = vector
+        return vectors
+
+    @traced("retrieval.search")
+    def _search_vectors(self, vectors, top_k: int):
+        vectordb = self.vectordb
+        if self.backend == "numpy":
+            # one matmul for the whole batch
+            return vectordb.search_by_vector(vectors, k=top_k)
+        # the LangChain wrapper drops chunk ids (needed for lazy_text and the
+        # answer cache), so query the collection directly, all vectors at once
+        from langchain.schema import Document
+        result = vectordb._collection.query(
+            query_embeddings=[[float(x) for x in vector] for vector in vectors],
+            n_results=top_k,
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            [
+                (Document(id=doc_id, page_content=text or "", metadata=metadata or {}), distance)
+                for doc_id, text, metadata, distance in zip(ids, texts, metadatas, distances)
+            ]
+            for ids, texts, metadatas, distances in zip(
+                result["ids"], result["documents"], result["metadatas"], result["distances"],
+            )
+        ]
+
+    def search(self, query: str, top_k: int = 3, min_score: float = 0.0):
+        """
+        Return the top_k most similar Document chunks whose similarity
+        score ≥ min_score.
+        """
+        return self.search_batch([query], top_k=top_k, min_score=min_score)[0]
+
+    @traced("retrieval")
+    def search_batch(self, queries, top_k: int = 3, min_score: float = 0.0):
+        """
+        Same as `search` for several queries; uncached queries are embedded
+        in a single forward pass. Returns one list of Documents per query.
+        """
+        if not queries:
+            return []
+        queries = list(queries)
+        self._check_index()
+
+        generation = self._generation
+        keys    = [(generation, normalize_query(q), top_k, min_score) for q in queries]
+        results = [self.result_cache.get(key) for key in keys]
+        todo    = [i for i, docs in enumerate(results) if docs is None]
+        if todo:
+            vectors    = self.embed_queries([queries[i] for i in todo])
+            batch_hits = self._search_vectors(vectors, top_k)
+            for i, hits in zip(todo, batch_hits):
+                # Filter out chunks below the min_score threshold
+                docs = [doc for doc, score in hits if score >= min_score]
+                self._fill_text(docs)
+                self.result_cache.put(keys[i], docs)
+                results[i] = docs
+        return [list(docs) for docs in results]
+
+    def cache_stats(self) -> dict:
+        return {
+            "embeddings": self.embedding_cache.stats(),
+            "results":    self.result_cache.stats(),
+        }
+
+
+# ─ Query embedding model + cache, shared by every open index ─
+_encoders      = {}
+_encoders_lock = threading.Lock()
+
+def query_encoder(model_name: str = DEFAULT_MODEL_NAME):
+    """
+    (embeddings, query embedding cache) for `model_name`, created once per
+    process: however many course indexes are open, there is one copy of
+    the model, and a query embedded for one course is reused by the others.
+    """
+    with _encoders_lock:
+        if model_name not in _encoders:
+            if use_sidecar():
+                embeddings = SidecarEmbeddings(get_sidecar(), model_name)
+            else:
+                from langchain_community.embeddings import HuggingFaceEmbeddings
+                with model_load(f"embeddings:{model_name}"):
+                    embeddings = HuggingFaceEmbeddings(model_name=model_name)
+            cache = LRUCache(
+                max_entries=get_setting("retrieval_cache", "max_entries", 1024),
+                ttl_seconds=get_setting("retrieval_cache", "ttl_seconds", 3600),
+            )
+            _encoders[model_name] = (embeddings, cache)
+        return _encoders[model_name]
+
+
+def open_retriever(
+    persist_dir: str,
+    chunks_dir: str = DEFAULT_CHUNKS_DIR,
+    backend: str = DEFAULT_BACKEND,
+    model_name: str = DEFAULT_MODEL_NAME,
+    generation: int = 0,
+) -> Retriever:
+    """
+    A Retriever over one index, with cache sizes from `retrieval_cache` in
+    config/settings.yaml and the shared query encoder.
+    """
+    embeddings, embedding_cache = query_encoder(model_name)
+    return Retriever(
+        persist_dir=persist_dir,
+        model_name=model_name,
+        backend=backend,
+        cache_size=get_setting("retrieval_cache", "max_entries", 1024),
+        cache_ttl=get_setting("retrieval_cache", "ttl_seconds", 3600),
+        check_interval=get_setting("retrieval_cache", "index_check_interval", 2.0),
+        chunks_dir=chunks_dir,
+        embeddings=embeddings,
+        embedding_cache=embedding_cache,
+        generation=generation,
+        rescore_factor=get_setting("vector_db", "rescore_factor", 4),
+    )
+
+
+# ─ Process-wide retriever (the default course), loaded through the model registry ─
+_others      = {}   # (persist_dir, model_name, backend) -> Retriever, for non-default indexes
+_others_lock = threading.Lock()
+
+def _load_retriever() -> Retriever:
+    # the index under `vector_db` in config/settings.yaml
+    return open_retriever(
+        get_setting("vector_db", "persist_dir", DEFAULT_PERSIST_DIR),
+        chunks_dir=get_setting("vector_db", "chunk_store", DEFAULT_CHUNKS_DIR),
+        backend=get_setting("vector_db", "type", DEFAULT_BACKEND),
+        model_name=DEFAULT_MODEL_NAME,
     )
 
-    # 3) Perform similarity search with scores (cosine similarity by default)
-    results = vectordb.similarity_search_with_score(query, k=top_k)
 
-    # 4) Filter out chunks below the min_score threshold
-    filtered_docs = [doc for doc, score in results if score >= min_score]
-    return filtered_docs
+def get_retriever(
+    persist_dir: str = None,
+    model_name: str = DEFAULT_MODEL_NAME,
+    backend: str = None,
+) -> Retriever:
+    """
+    Return the process-wide Retriever, loading it through the model
+    registry on first use (so /readyz and /stats see it).
+    persist_dir / backend default to `vector_db` in config/settings.yaml;
+    any other index is opened once and kept outside the registry.
+    """
+    default = (
+        get_setting("vector_db", "persist_dir", DEFAULT_PERSIST_DIR),
+        DEFAULT_MODEL_NAME,
+        get_setting("vector_db", "type", DEFAULT_BACKEND),
+    )
+    key = (persist_dir or default[0], model_name, backend or default[2])
+    if key == default:
+        return get_model_registry().get("retriever")
+    with _others_lock:
+        if key not in _others:
+            _others[key] = open_retriever(
+                key[0],
+                chunks_dir=get_setting("vector_db", "chunk_store", DEFAULT_CHUNKS_DIR),
+                backend=key[2],
+                model_name=model_name,
+            )
+        return _others[key]
+
+
+def _warmup(retriever: Retriever) -> None:
+    # one query embedding + one index scan, bypassing the caches
+    retriever._search_vectors(retriever.embeddings.embed_documents(["warmup query"]), 1)
+
+
+# loaded on first search, or by the startup warmup
+get_model_registry().register("retriever", _load_retriever, warmup=_warmup)
+
+
+def get_relevant_chunks(
+    query: str,
+    persist_dir: str = None,
+    model_name: str = DEFAULT_MODEL_NAME,
+    top_k: int = 3,
+    min_score: float = 0.0,  # only keep chunks with score ≥ this threshold
+    course: str = None,      # a course under corpora.courses; None = the index under vector_db
+):
+    """
+    Given a text query, search the shared index (or the course's) and
+    return the top_k most similar Document chunks whose similarity score
+    ≥ min_score.
+    """
+    if course:
+        from online.retrieval.corpora import get_corpora
+        retriever = get_corpora().get(course)
+    else:
+        retriever = get_retriever(persist_dir, model_name)
+    return retriever.search(query, top_k=top_k, min_score=min_score)
 
 
 if __name__ == "__main__":
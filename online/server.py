@@ -1,15 +1,16 @@
 import os
 import sys
-import uuid
 import json
+import asyncio
 import subprocess
 import logging
 import shutil
 import difflib
 import re
 
-from fastapi import FastAPI, File, UploadFile, Request
-from fastapi.responses import FileResponse
+import numpy as np
+from fastapi import FastAPI, File, UploadFile, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 # ─ Make project root importable ─
@@ -17,10 +18,24 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, project_root)
 
 # ─ Pipeline imports ─
-from online.stt.whisper_stt     import transcribe
-from online.retrieval.retriever import get_relevant_chunks
-from online.llm.inference       import generate_answer, llm
-from online.tts.tts_service     import synthesize
+from online.stt.whisper_stt     import transcribe_partial
+from online.stt.scheduler       import get_stt_batcher, transcribe_batched
+from online.stt.streaming       import UtteranceSegmenter
+from online.stt.audio_ingest    import UploadTooLarge, decode_audio, read_upload
+from online.retrieval.retriever import get_relevant_chunks, get_retriever
+from online.retrieval.corpora   import UnknownCourse, course_names, get_corpora
+from online.llm.inference       import generate_answer_stream, build_citation, gateway, prompt_builder
+from online.llm.gateway         import LLMTimeout
+from online.llm.translation     import get_translator
+from online.llm.answer_cache    import chunk_ids, get_answer_cache
+from online.tts.tts_service     import tts_cache_dir, get_tts_service
+from online.tts.speech_pipeline import SpeechPipeline
+from online.executors           import StageSaturated, get_stage, run_stage, all_stage_stats, shutdown_stages
+from online.config              import get_setting, load_settings
+from online.models              import get_model_registry, warmup_on_startup
+from online.sidecar.client      import get_sidecar, use_sidecar
+from online.sessions            import get_session_store
+from online.tracing             import TracingMiddleware, current_request_id, render_metrics
 
 # ─ Logging ─
 logger = logging.getLogger("uvicorn.error")
@@ -31,14 +46,14 @@ app = FastAPI(
     version="1.0",
 )
 
-# ─ Ensure audio temp dir exists ─
-audio_dir = os.path.join(project_root, "online", "temp", "audio")
-os.makedirs(audio_dir, exist_ok=True)
+# ─ Upload limit for recorded questions ─
+max_upload_bytes = int(get_setting("stt", "max_upload_mb", 10) * 2**20)
+UPLOAD_PATHS     = ("/ask/", "/transcribe/")
 
 # ─ Locate FFmpeg ─
 ffmpeg_bin = shutil.which("ffmpeg") or r"C:\Users\eissa.abbas\Desktop\work\work projects\FFmpeg\ffmpeg-master-latest-win64-gpl\bin\ffmpeg.exe"
 
-# ─ Typing simulation helper ─
+# ─ Typing simulation helper (opt-in: every prefix of the answer, O(n²) bytes) ─
 def make_typing_simulation(answer_text: str):
     sim = []
     cur = ""
@@ -47,6 +62,10 @@ def make_typing_simulation(answer_text: str):
         sim.append(cur)
     return sim
 
+# ─ Server-sent event helper ─
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 # ─ Greetings / fuzzy match ─
 GREETINGS = [
     "hello","hi","hey","good morning","good evening","good afternoon","how are you",
@@ -87,6 +106,175 @@ def detect_language(text: str) -> str:
         return "ar"
     return "en"
 
+# ─ Conversation for a request: server-side session, or legacy client history ─
+def request_session(form):
+    """
+    -> (session, chat_history). Clients send `session_id` (or nothing, and
+    get a new session); old clients that still post `history` keep working.
+    """
+    session_id = form.get("session_id")
+    if session_id or "history" not in form:
+        return get_session_store().get_or_create(session_id), None
+    try:
+        return None, json.loads(form.get("history", "[]"))
+    except json.JSONDecodeError:
+        return None, []
+
+def remember(session, question: str, answer: str) -> None:
+    if session is not None and question:
+        session.add_exchange(question, answer, max_turns=get_session_store().max_turns)
+
+# ─ Course whose index answers the request ─
+def request_course(form, session):
+    """
+    The `course` form field, else the course the session asked about last;
+    None = the index under vector_db. Raises UnknownCourse.
+    """
+    course = form.get("course") or (session.course if session is not None else None)
+    if course:
+        get_corpora().check(course)
+    if session is not None:
+        session.set_course(course)
+    return course or None
+
+def course_retriever(course):
+    return get_corpora().get(course) if course else get_retriever()
+
+# ─ LLM priority class: spoken questions go ahead of typed ones ─
+def request_priority(form) -> str:
+    return "voice" if form.get("mode") == "voice" else "chat"
+
+# ─ Semantic answer cache: near-identical first-turn questions skip the LLM and TTS ─
+def answer_cache_key(question: str, lang: str, chunks, session, chat_history, course=None):
+    """
+    (query vector, language, chunks, index generation, course) when this turn may
+    use the answer cache, else None. Turns with history never do: their
+    answer depends on the conversation, not just the question, and neither
+    do chunks without an index id.
+    """
+    cache = get_answer_cache()
+    if not cache.enabled or not chunks:
+        return None
+    if chat_history or (session is not None and session.turns) or chunk_ids(chunks) is None:
+        cache.bypass()
+        return None
+    retriever = course_retriever(course)
+    # the query embedding is already in the retriever's embedding cache
+    return retriever.embed_queries([question])[0], lang, chunks, retriever.generation, course
+
+def cached_audio(reply: dict) -> bool:
+    # audio of a cached answer may have been evicted from the TTS cache since
+    tts_cache = get_tts_service().cache
+    urls      = [reply["audio_url"], *reply["audio_segments"]]
+    return all(tts_cache.get(os.path.basename(url)[:-len(".wav")]) for url in urls if url)
+
+def remember_answer(cache_key, answer: str, citation: str, segments, full_audio) -> None:
+    if cache_key and answer and full_audio:
+        get_answer_cache().store(*cache_key, {
+            "answer":         answer,
+            "citation":       citation,
+            "audio_url":      full_audio,
+            "audio_segments": list(segments),
+        })
+
+# ─ Decide the answer for a question: (token stream, chunks, cached reply, answer cache key) ─
+def answer_tokens(question: str, chat_history, lang: str, session=None, priority: str = "chat", course=None):
+    # ─ Greeting shortcut ─
+    if is_greeting(question):
+        import random
+        return [random.choice(GREETINGS_RESPONSES_AR if lang=="ar" else GREETINGS_RESPONSES_EN)], [], None, None
+    # ─ RAG pipeline ─
+    chunks = get_relevant_chunks(question, top_k=3, course=course)
+    if chunks:
+        cache_key = answer_cache_key(question, lang, chunks, session, chat_history, course)
+        cached    = get_answer_cache().lookup(*cache_key) if cache_key else None
+        if cached:
+            # stored answer; if its audio was evicted it is spoken again, without the LLM
+            return [cached["answer"]], chunks, cached, None
+        # pass target_lang so LLM can translate the answer if needed
+        return generate_answer_stream(
+            chunks, question, chat_history, target_lang=lang, session=session, priority=priority,
+        ), chunks, None, cache_key
+    return ["Sorry, I don’t know." if lang=="en" else "عذراً، لا أعرف."], [], None, None
+
+# ─ TTS output lives in the content-addressed cache, served under /tts ─
+def audio_url(path: str) -> str:
+    return f"/tts/{os.path.basename(path)}"
+
+# ─ Full-answer audio for replay (tts stage) ─
+def full_answer_audio(pipeline: SpeechPipeline, answer: str) -> str:
+    return audio_url(pipeline.full_audio(answer))
+
+# ─ Drain the LLM token stream into the speech pipeline (llm stage) ─
+def generate_spoken(tokens, pipeline: SpeechPipeline) -> str:
+    parts = []
+    try:
+        for token in tokens:
+            parts.append(token)
+            pipeline.feed(token)
+    finally:
+        pipeline.close()
+    return "".join(parts).strip()
+
+# ─ Generate + speak: sentences are synthesized while the LLM is still writing ─
+async def speak_answer(tokens):
+    """
+    Returns (answer, segment_urls, full_audio_url, complete); complete is
+    False when a sentence could not be spoken.
+    """
+    pipeline = SpeechPipeline(executor=get_stage("tts"))
+    answer   = await run_stage("llm", generate_spoken, tokens, pipeline)
+    segments = [audio_url(p) async for p in pipeline.asegments()]
+    full     = await run_stage("tts", full_answer_audio, pipeline, answer)
+    return answer, segments, full, pipeline.complete
+
+# ─ Decode an upload in memory to 16 kHz mono float32 (ffmpeg stage) ─
+def decode_upload(data: bytes):
+    ffmpeg = ffmpeg_bin if ffmpeg_bin and os.path.isfile(ffmpeg_bin) else None
+    return decode_audio(data, ffmpeg)
+
+# ─ Reject oversized uploads before the multipart body is even parsed ─
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.url.path in UPLOAD_PATHS:
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > max_upload_bytes:
+            return JSONResponse(
+                status_code=413,
+                content={"error": f"Audio upload larger than {max_upload_bytes} bytes"},
+            )
+    return await call_next(request)
+
+# ─ Request id + per-stage spans for every request (outermost, so streamed bodies are covered) ─
+app.add_middleware(TracingMiddleware)
+
+@app.exception_handler(UploadTooLarge)
+async def upload_too_large(request: Request, exc: UploadTooLarge):
+    return JSONResponse(status_code=413, content={"error": str(exc)})
+
+@app.exception_handler(UnknownCourse)
+async def unknown_course(request: Request, exc: UnknownCourse):
+    return JSONResponse(status_code=404, content={"error": exc.args[0] if exc.args else "Unknown course"})
+
+# ─ Saturated stage → 503 + Retry-After instead of an ever-growing queue ─
+@app.exception_handler(StageSaturated)
+async def stage_saturated(request: Request, exc: StageSaturated):
+    logger.warning(f"Rejected {request.url.path} [{current_request_id()}]: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"error": f"The tutor is busy ({exc.stage}), please retry shortly."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# ─ LLM deadline passed (queued or generating) → 504 ─
+@app.exception_handler(LLMTimeout)
+async def llm_timeout(request: Request, exc: LLMTimeout):
+    logger.warning(f"Timed out {request.url.path} [{current_request_id()}]: {exc}")
+    return JSONResponse(
+        status_code=504,
+        content={"error": "The tutor took too long to answer, please try again."},
+    )
+
 # ─ Verify FFmpeg on startup ─
 @app.on_event("startup")
 def verify_ffmpeg():
@@ -102,6 +290,35 @@ def verify_ffmpeg():
     except subprocess.CalledProcessError as e:
         logger.error(f"FFmpeg test failed:\n{e.stderr}")
 
+# ─ Load + warm up every model in parallel, in the background (/readyz says when) ─
+@app.on_event("startup")
+def warm_models():
+    if warmup_on_startup():
+        get_model_registry().warmup()
+
+# ─ Pre-synthesize the fixed replies so they are always cache hits ─
+FIXED_REPLIES = GREETINGS_RESPONSES_EN + GREETINGS_RESPONSES_AR + [
+    "Sorry, I don’t know.", "عذراً، لا أعرف.",
+    "Sorry, I couldn't understand the question.", "عذراً، لم أتمكن من الفهم.",
+]
+
+@app.on_event("startup")
+def warm_tts_cache():
+    tts = get_stage("tts")
+    for reply in FIXED_REPLIES:
+        try:
+            tts.submit(get_tts_service().synthesize_cached, reply)
+        except StageSaturated:
+            break
+
+@app.on_event("shutdown")
+def stop_stages():
+    shutdown_stages()
+    get_stt_batcher().shutdown()
+    tts = get_model_registry().peek("tts")   # never started: nothing to stop
+    if tts:
+        tts.shutdown()
+
 # ─ Serve index.html ─
 @app.get("/", response_class=FileResponse)
 async def serve_index():
@@ -113,115 +330,244 @@ async def serve_index():
 # ─── /chat/ endpoint ───
 @app.post("/chat/")
 async def chat(request: Request):
-    form        = await request.form()
-    question    = form.get("question", "").strip()
-    history_raw = form.get("history", "[]")
-    try:
-        chat_history = json.loads(history_raw)
-    except json.JSONDecodeError:
-        chat_history = []
+    form     = await request.form()
+    question = form.get("question", "").strip()
+    session, chat_history = request_session(form)
+    course = request_course(form, session)
 
     lang = detect_language(question)
 
-    # ─ Greeting shortcut ─
-    if is_greeting(question):
-        import random
-        answer   = random.choice(GREETINGS_RESPONSES_AR if lang=="ar" else GREETINGS_RESPONSES_EN)
-        citation = ""
-    else:
-        # ─ RAG pipeline ─
-        chunks = get_relevant_chunks(question, top_k=3)
-        if chunks:
-            # pass target_lang so LLM can translate the answer if needed
-            result = generate_answer(chunks, question, chat_history, target_lang=lang)
-            if isinstance(result, tuple):
-                answer, citation = result
-            else:
-                answer, citation = result, ""
-        else:
-            answer   = "Sorry, I don’t know." if lang=="en" else "عذراً، لا أعرف."
-            citation = ""
-
-    # ─ TTS ─
-    uid     = uuid.uuid4().hex
-    out_wav = os.path.join(audio_dir, f"{uid}_out.wav")
-    synthesize(answer, out_wav)
+    tokens, chunks, cached, cache_key = await run_stage(
+        "retrieval", answer_tokens, question, chat_history, lang, session, request_priority(form), course,
+    )
 
-    return {
+    if cached and cached_audio(cached):
+        answer, citation = cached["answer"], cached["citation"]
+        segments, full_audio = cached["audio_segments"], cached["audio_url"]
+    else:
+        # ─ LLM + sentence-pipelined TTS ─
+        answer, segments, full_audio, complete = await speak_answer(tokens)
+        citation = build_citation(chunks) if chunks else ""
+        if complete:
+            remember_answer(cache_key, answer, citation, segments, full_audio)
+    remember(session, question, answer)
+
+    reply = {
+        "session_id": session.id if session else None,
         "transcript": question,
         "answer":     answer,
         "citation":   citation,
-        "audio_url":  f"/audio/{uid}_out.wav",
+        "audio_url":  full_audio,
+        "audio_segments": segments,
         "avatar_waiting":  "/static/avatar waiting.mp4",
         "avatar_speaking": "/static/avatar talking.mp4",
-        "typing_simulation": make_typing_simulation(answer),
     }
+    if form.get("typing_simulation"):
+        reply["typing_simulation"] = make_typing_simulation(answer)
+    return reply
+
+# ─── /chat/stream endpoint (SSE) ───
+@app.post("/chat/stream")
+async def chat_stream(request: Request):
+    """
+    Same pipeline as /chat/, streamed as server-sent events: `token` (one per
+    LLM token), `audio_segment` (one per spoken sentence, in order, as soon as
+    it is synthesized), `citation`, `audio` (full answer for replay), `done`.
+    """
+    form     = await request.form()
+    question = form.get("question", "").strip()
+    session, chat_history = request_session(form)
+    course = request_course(form, session)
+
+    lang = detect_language(question)
+
+    tokens, chunks, cached, cache_key = await run_stage(
+        "retrieval", answer_tokens, question, chat_history, lang, session, request_priority(form), course,
+    )
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if session is not None:
+        headers["X-Session-Id"] = session.id
+
+    if cached and cached_audio(cached):
+        # ─ Answer cache hit: the whole answer and its audio at once ─
+        async def cached_events():
+            remember(session, question, cached["answer"])
+            yield sse_event("token", {"text": cached["answer"]})
+            for url in cached["audio_segments"]:
+                yield sse_event("audio_segment", {"audio_url": url})
+            yield sse_event("citation", {"citation": cached["citation"]})
+            yield sse_event("audio", {"audio_url": cached["audio_url"]})
+            yield sse_event("done", {"transcript": question, "answer": cached["answer"],
+                                     "session_id": session.id if session else None})
+
+        return StreamingResponse(cached_events(), media_type="text/event-stream", headers=headers)
+
+    # ─ LLM slot is taken here, so saturation is a 503 before streaming starts ─
+    pipeline     = SpeechPipeline(executor=get_stage("tts"))
+    token_stream = get_stage("llm").stream(iter, tokens)
+
+    async def events():
+        # ─ LLM tokens; finished audio segments are sent as soon as they exist ─
+        parts = []
+        try:
+            async for token in token_stream:
+                parts.append(token)
+                yield sse_event("token", {"text": token})
+                pipeline.feed(token)
+                for path in pipeline.ready_segments():
+                    yield sse_event("audio_segment", {"audio_url": audio_url(path)})
+        except Exception as e:
+            logger.error(f"LLM streaming failed: {e}")
+            yield sse_event("error", {"message": "generation failed"})
+            return
+        finally:
+            # client gone, generation failed or done: stop pulling tokens from the
+            # LLM and close the speech pipeline on every path
+            token_stream.cancel()
+            pipeline.close()
+
+        answer   = "".join(parts).strip()
+        citation = build_citation(chunks) if chunks else ""
+        remember(session, question, answer)
+        yield sse_event("citation", {"citation": citation})
+
+        # ─ Remaining TTS segments, then the full answer audio for replay ─
+        async for path in pipeline.asegments():
+            yield sse_event("audio_segment", {"audio_url": audio_url(path)})
+        try:
+            full_audio = await run_stage("tts", full_answer_audio, pipeline, answer)
+        except StageSaturated:
+            full_audio = None
+        yield sse_event("audio", {"audio_url": full_audio})
+        if pipeline.complete:
+            remember_answer(cache_key, answer, citation, [audio_url(p) for p in pipeline.paths], full_audio)
+
+        yield sse_event("done", {"transcript": question, "answer": answer,
+                                 "session_id": session.id if session else None})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
 
 # ─── /transcribe/ endpoint ───
 @app.post("/transcribe/")
 async def transcribe_audio(audio: UploadFile = File(...)):
-    uid     = uuid.uuid4().hex
-    in_webm = os.path.join(audio_dir, f"{uid}_in.webm")
-    in_wav  = os.path.join(audio_dir, f"{uid}_in.wav")
-
-    # save raw
-    with open(in_webm, "wb") as f:
-        f.write(await audio.read())
-
-    audio_path = in_webm
-    if ffmpeg_bin and os.path.isfile(ffmpeg_bin):
-        try:
-            subprocess.run(
-                [ffmpeg_bin, "-y", "-i", in_webm, "-ac", "1", "-ar", "16000", in_wav],
-                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True
-            )
-            # only switch if conversion succeeded
-            if os.path.isfile(in_wav) and os.path.getsize(in_wav) > 0:
-                audio_path = in_wav
-        except subprocess.CalledProcessError as e:
-            logger.error(f"FFmpeg STT conversion failed:\n{e.stderr}")
+    data = await read_upload(audio, max_upload_bytes)
 
     try:
-        transcript = transcribe(audio_path)
+        samples    = await run_stage("ffmpeg", decode_upload, data)
+        transcript = await run_stage("stt", transcribe_batched, samples)
+    except StageSaturated:
+        raise
     except Exception as e:
         logger.error(f"STT failed: {e}")
         transcript = ""
 
     return {"transcript": transcript}
 
+# ─── /ws/transcribe: live speech recognition ───
+@app.websocket("/ws/transcribe")
+async def ws_transcribe(ws: WebSocket):
+    """
+    The browser streams mono 16 kHz float32 PCM as binary messages while the
+    student speaks (and may send {"type": "stop"}). Silence is dropped by VAD;
+    the server pushes {"type": "partial", "text"} previews and, as soon as
+    end of speech is detected, {"type": "final", "text"}. A malformed frame
+    or a failed decode is reported as {"type": "error", "message"}; the
+    socket stays open.
+    """
+    await ws.accept()
+    cfg           = load_settings().get("stt") or {}
+    segmenter     = UtteranceSegmenter(
+        end_silence_ms=cfg.get("end_silence_ms", 700),
+        max_utterance_s=cfg.get("max_utterance_s", 30),
+    )
+    partial_every = cfg.get("partial_interval_ms", 800) / 1000
+    next_partial  = partial_every
+    utterance     = 0          # bumped on every final so stale partials are dropped
+    partial_task  = None
+    send_lock     = asyncio.Lock()
+
+    async def send(payload: dict):
+        async with send_lock:
+            await ws.send_json(payload)
+
+    async def send_partial(audio, utterance_id: int):
+        try:
+            text = await run_stage("stt", transcribe_partial, audio)
+        except StageSaturated:
+            return   # previews are optional; skip while STT is busy
+        except Exception as e:
+            logger.warning(f"[STT] Partial transcript failed: {e}")
+            return
+        if utterance_id == utterance and text.strip():
+            await send({"type": "partial", "text": text.strip()})
+
+    try:
+        while True:
+            msg = await ws.receive()
+            if msg["type"] == "websocket.disconnect":
+                break
+            stop = False
+            if msg.get("bytes"):
+                if len(msg["bytes"]) % 4:
+                    await send({"type": "error", "message": "audio frames must be float32 samples (a multiple of 4 bytes)"})
+                    continue
+                ended = segmenter.feed(np.frombuffer(msg["bytes"], dtype=np.float32))
+            else:
+                try:
+                    stop = json.loads(msg.get("text") or "{}").get("type") == "stop"
+                except json.JSONDecodeError:
+                    stop = False
+                ended = stop
+
+            if ended:
+                # ─ End of speech: final decode right away ─
+                utterance += 1
+                text = ""
+                if segmenter.started:
+                    try:
+                        text = (await run_stage("stt", transcribe_batched, segmenter.audio())).strip()
+                    except StageSaturated as e:
+                        await send({"type": "error", "message": str(e), "retry_after": e.retry_after})
+                    except Exception as e:
+                        logger.error(f"STT failed: {e}")
+                        await send({"type": "error", "message": "transcription failed"})
+                logger.info(f"[STT] Transcript: {text!r}")
+                await send({"type": "final", "text": text})
+                segmenter.reset()
+                next_partial = partial_every
+                if stop:
+                    break
+                continue
+
+            # ─ Partial transcript every partial_every seconds of new speech ─
+            if (
+                segmenter.started
+                and segmenter.speech_seconds >= next_partial
+                and (partial_task is None or partial_task.done())
+            ):
+                next_partial = segmenter.speech_seconds + partial_every
+                partial_task = asyncio.create_task(send_partial(segmenter.audio(), utterance))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if partial_task:
+            partial_task.cancel()
+
 # ─── /ask/ endpoint ───
 @app.post("/ask/")
 async def ask(audio: UploadFile = File(...), request: Request = None):
-    form        = await request.form()
-    history_raw = form.get("history", "[]")
-    try:
-        chat_history = json.loads(history_raw)
-    except json.JSONDecodeError:
-        chat_history = []
-
-    uid     = uuid.uuid4().hex
-    in_webm = os.path.join(audio_dir, f"{uid}_in.webm")
-    in_wav  = os.path.join(audio_dir, f"{uid}_in.wav")
-    out_wav = os.path.join(audio_dir, f"{uid}_out.wav")
-
-    # save raw
-    with open(in_webm, "wb") as f:
-        f.write(await audio.read())
+    form = await request.form()
+    session, chat_history = request_session(form)
+    course = request_course(form, session)
 
-    audio_path = in_webm
-    if ffmpeg_bin and os.path.isfile(ffmpeg_bin):
-        try:
-            subprocess.run(
-                [ffmpeg_bin, "-y", "-i", in_webm, "-ac", "1", "-ar", "16000", in_wav],
-                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True
-            )
-            if os.path.isfile(in_wav) and os.path.getsize(in_wav) > 0:
-                audio_path = in_wav
-        except subprocess.CalledProcessError as e:
-            logger.error(f"FFmpeg conversion failed:\n{e.stderr}")
+    data = await read_upload(audio, max_upload_bytes)
 
     try:
-        question = transcribe(audio_path)
+        samples  = await run_stage("ffmpeg", decode_upload, data)
+        question = await run_stage("stt", transcribe_batched, samples)
+    except StageSaturated:
+        raise
     except Exception as e:
         logger.error(f"STT failed: {e}")
         question = ""
@@ -231,70 +577,184 @@ async def ask(audio: UploadFile = File(...), request: Request = None):
 
     # decide response
     if not question.strip():
-        answer   = "Sorry, I couldn't understand the question." if lang=="en" else "عذراً، لم أتمكن من الفهم."
-        citation = ""
-    elif is_greeting(question):
-        import random
-        answer   = random.choice(GREETINGS_RESPONSES_AR if lang=="ar" else GREETINGS_RESPONSES_EN)
-        citation = ""
+        tokens = ["Sorry, I couldn't understand the question." if lang=="en" else "عذراً، لم أتمكن من الفهم."]
+        chunks, cached, cache_key = [], None, None
     else:
-        chunks = get_relevant_chunks(question, top_k=3)
-        if chunks:
-            result = generate_answer(chunks, question, chat_history, target_lang=lang)
-            if isinstance(result, tuple):
-                answer, citation = result
-            else:
-                answer, citation = result, ""
-        else:
-            answer   = "Sorry, I don’t know." if lang=="en" else "عذراً، لا أعرف."
-            citation = ""
-
-    synthesize(answer, out_wav)
+        tokens, chunks, cached, cache_key = await run_stage(
+            "retrieval", answer_tokens, question, chat_history, lang, session, "voice", course,
+        )
 
-    return {
+    if cached and cached_audio(cached):
+        answer, citation = cached["answer"], cached["citation"]
+        segments, full_audio = cached["audio_segments"], cached["audio_url"]
+    else:
+        answer, segments, full_audio, complete = await speak_answer(tokens)
+        citation = build_citation(chunks) if chunks else ""
+        if complete:
+            remember_answer(cache_key, answer, citation, segments, full_audio)
+    remember(session, question, answer)
+
+    reply = {
+        "session_id": session.id if session else None,
         "transcript": question,
         "answer":     answer,
         "citation":   citation,
-        "audio_url":  f"/audio/{uid}_out.wav",
+        "audio_url":  full_audio,
+        "audio_segments": segments,
         "avatar_waiting":  "/static/avatar waiting.mp4",
         "avatar_speaking": "/static/avatar talking.mp4",
-        "typing_simulation": make_typing_simulation(answer),
     }
+    if form.get("typing_simulation"):
+        reply["typing_simulation"] = make_typing_simulation(answer)
+    return reply
 
 # ─── /translate/ endpoint ───
 @app.post("/translate/")
 async def translate_text(request: Request):
-    body = await request.json()
-    text = body.get("text", "")
+    """
+    {"text": ...} -> {"translation"}, or {"texts": [...]} -> {"translations"}
+    (one LLM call for all messages not already in the translation memory).
+    Each text goes to the other language (ar <-> en) unless "target" is given.
+    """
+    body  = await request.json()
+    batch = "texts" in body
+    texts = (body.get("texts") or []) if batch else [body.get("text", "")]
 
     # detect source lang
-    orig   = detect_language(text)
-    target = "en" if orig=="ar" else "ar"
-
-    if target == "ar":
-        prompt = (
-            f"Translate the following English text into Arabic. "
-            f"Only return the translated text:\n\n{text}\n\nالترجمة:"
-        )
-    else:
-        prompt = (
-            f"Translate the following text into English. "
-            f"Only return the translated text:\n\n{text}\n\nTranslation:"
-        )
+    items = []
+    for text in texts:
+        orig   = detect_language(text)
+        target = body.get("target") or ("en" if orig=="ar" else "ar")
+        items.append((text, target))
 
     try:
-        resp = llm.generate([prompt])
-        translation = resp.generations[0][0].text.strip()
+        translations = await run_stage("llm", get_translator().translate_many, items)
+    except StageSaturated:
+        raise
     except Exception as e:
         logger.error(f"Translation failed: {e}")
-        translation = text
+        translations = texts
+
+    if batch:
+        return {"translations": translations, "citation": "- Translated by AI"}
+    return {"translation": translations[0], "citation": "- Translated by AI"}
+
+# ─── /reload_index/ endpoint ───
+@app.post("/reload_index/")
+async def reload_index(course: str = None):
+    # swap in an index rebuilt by offline/indexer.py (or build_corpora.py) without restarting
+    await run_stage("retrieval", get_corpora().reload, course)
+    return {"status": "reloaded", "course": course}
+
+# ─── /courses/ endpoint ───
+@app.get("/courses/")
+async def courses():
+    # configured courses; requests pick one with the `course` form field
+    return {"courses": course_names()}
+
+# ─── Probes: /healthz (liveness), /readyz (all models loaded and warm) ───
+@app.get("/healthz")
+async def healthz():
+    # answers as soon as the app is up, whatever the models are doing
+    return {"status": "ok", "models": get_model_registry().status()}
+
+@app.get("/readyz")
+async def readyz():
+    registry = get_model_registry()
+    ready    = registry.ready()
+    if not ready:
+        registry.retry_failed()   # e.g. the inference sidecar came up after this worker
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "loading", "models": registry.status()},
+    )
+
+def sidecar_status():
+    if not use_sidecar():
+        return None
+    try:
+        return get_sidecar().status()
+    except OSError as e:
+        return {"error": str(e)}
+
+# ─── /stats/ endpoint ───
+@app.get("/stats/")
+async def stats():
+    # cache hit/miss counters and per-stage queue depth, used to size settings.yaml
+    retriever = get_model_registry().peek("retriever")   # not loaded yet: no stats, and no load from here
+    tts       = get_model_registry().peek("tts")
+    return {
+        "retrieval_cache": retriever.cache_stats() if retriever else None,
+        "tts_cache":       tts.cache.stats() if tts else None,
+        "stt_batching":    get_stt_batcher().stats(),
+        "sessions":        get_session_store().stats(),
+        "prompts":         prompt_builder.stats(),
+        "llm_gateway":     gateway.stats(),
+        "translation":     get_translator().stats(),
+        "answer_cache":    get_answer_cache().stats(),
+        "corpora":         get_corpora().stats(),
+        "models":          get_model_registry().status(),
+        "sidecar":         sidecar_status(),
+        "stages":          all_stage_stats(),
+    }
 
-    return {"translation": translation, "citation": "- Translated by AI"}
+# ─── /metrics endpoint (Prometheus) ───
+def metric_gauges():
+    stages    = all_stage_stats()
+    gw        = gateway.stats()
+    retriever = get_model_registry().peek("retriever")
+    r_cache   = retriever.cache_stats() if retriever else {}
+    tts       = get_model_registry().peek("tts")
+    caches    = {"tts_audio": tts.cache.stats()} if tts else {}
+    for name, key in (("query_embeddings", "embeddings"), ("retrieval_results", "results")):
+        if key in r_cache:
+            caches[name] = r_cache[key]
+    memory = get_translator().stats().get("memory")
+    if memory:
+        caches["translation_memory"] = memory
+    caches["answers"] = get_answer_cache().stats()
+    stt    = get_stt_batcher().stats()
+    models = get_model_registry().status()
+
+    def per_stage(key):
+        return [({"stage": name}, s[key]) for name, s in stages.items()]
+
+    def per_cache(key):
+        return [({"cache": name}, c[key]) for name, c in caches.items()]
+
+    return [
+        ("tutor_stage_running", "Jobs running on a stage executor.", "gauge", per_stage("running")),
+        ("tutor_stage_queue_depth", "Jobs waiting for a stage worker.", "gauge", per_stage("queue_depth")),
+        ("tutor_stage_completed_total", "Jobs finished by a stage.", "counter", per_stage("completed")),
+        ("tutor_stage_rejected_total", "Jobs rejected with 503 because the stage was full.", "counter", per_stage("rejected")),
+        ("tutor_cache_hits_total", "Cache hits.", "counter", per_cache("hits")),
+        ("tutor_cache_misses_total", "Cache misses.", "counter", per_cache("misses")),
+        ("tutor_cache_hit_ratio", "Cache hits / lookups since start.", "gauge", per_cache("hit_rate")),
+        ("tutor_llm_in_flight", "Generations running on Ollama.", "gauge", [({}, gw["in_flight"])]),
+        ("tutor_llm_queued", "Requests waiting for an LLM slot.", "gauge", [({}, gw["queued"])]),
+        ("tutor_llm_requests_total", "LLM requests by priority and outcome.", "counter", [
+            ({"priority": p, "outcome": outcome}, m[outcome])
+            for p, m in gw["priorities"].items()
+            for outcome in ("completed", "timed_out", "cancelled", "failed", "rejected")
+        ]),
+        ("tutor_stt_queue_depth", "Clips waiting for the STT batcher.", "gauge", [({}, stt["queue_depth"])]),
+        ("tutor_stt_batch_size_mean", "Mean clips per Whisper batch.", "gauge", [({}, stt["mean_batch"])]),
+        ("tutor_sessions_active", "Server-side conversations in memory.", "gauge",
+         [({}, get_session_store().stats()["active"])]),
+        ("tutor_model_ready", "1 once a model is loaded and warmed up.", "gauge",
+         [({"model": name}, m["state"] == "ready") for name, m in models.items()]),
+    ]
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # stage latency histograms (tutor_stage_seconds), queue depths, cache hit rates, model load times
+    return PlainTextResponse(render_metrics(metric_gauges()), media_type="text/plain; version=0.0.4")
 
 # ─── Static mounts ───
 app.mount("/static",
           StaticFiles(directory=os.path.join(project_root, "Avatar")),
           name="static")
-app.mount("/audio",
-          StaticFiles(directory=audio_dir),
-          name="audio")
+os.makedirs(tts_cache_dir(), exist_ok=True)
+app.mount("/tts",
+          StaticFiles(directory=tts_cache_dir()),
+          name="tts")
@@ -0,0 +1,309 @@
+# online/sessions.py
+
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from online.config import load_settings
+
+
+class Session:
+    """
+    One student's conversation, kept on the server so the browser sends a
+    session id instead of its whole history. Turns are only ever appended;
+    `summary` covers turns[:summary_upto] once older turns are compacted,
+    so the prompt prefix (instructions + summary + turns) changes rarely.
+
+    With a SessionDB (sessions shared between workers) every change is
+    written through, and the store refreshes the session from it on access.
+    """
+
+    def __init__(self, session_id: str):
+        self.id           = session_id
+        self.turns        = []      # [{"role": "user" | "assistant", "text": ...}]
+        self.summary      = ""
+        self.summary_upto = 0
+        self.compacting   = False
+        self.course       = None    # last course asked about (online/retrieval/corpora.py)
+        self.created      = time.monotonic()
+        self.last_seen    = self.created
+        self.lock         = threading.Lock()
+        self._shared      = None    # SessionDB, when sessions are shared between workers
+
+    def _append(self, question: str, answer: str, max_turns: int) -> None:
+        # caller holds self.lock
+        self.turns.append({"role": "user", "text": question})
+        self.turns.append({"role": "assistant", "text": answer})
+        # hard cap for very long sessions: forget what the summary already covers
+        overflow = min(len(self.turns) - max_turns, self.summary_upto)
+        if overflow > 0:
+            del self.turns[:overflow]
+            self.summary_upto -= overflow
+
+    def _apply(self, row) -> None:
+        # caller holds self.lock; row as returned by SessionDB.load
+        turns, self.summary, self.summary_upto, self.course = row
+        self.turns = json.loads(turns)
+
+    def add_exchange(self, question: str, answer: str, max_turns: int = 200) -> None:
+        with self.lock:
+            if self._shared is not None:
+                self._shared.append(self, question, answer, max_turns)
+            else:
+                self._append(question, answer, max_turns)
+
+    def set_summary(self, summary: str, upto: int, start: int) -> None:
+        """
+        Summary of turns[:upto], unless the summary changed since the
+        compaction that produced it read summary_upto == start.
+        """
+        with self.lock:
+            if self.summary_upto != start:
+                return
+            self.summary, self.summary_upto = summary, upto
+            if self._shared is not None:
+                self._shared.save_summary(self.id, summary, upto, start)
+
+    def set_course(self, course) -> None:
+        with self.lock:
+            if course == self.course:
+                return
+            self.course = course
+            if self._shared is not None:
+                self._shared.save_course(self.id, course)
+
+    def history(self):
+        """
+        (summary, turns not covered by the summary), as a consistent snapshot.
+        """
+        with self.lock:
+            return self.summary, list(self.turns[self.summary_upto:])
+
+
+class SessionDB:
+    """
+    Sessions in one SQLite file, so every uvicorn worker (and a restarted
+    server) sees the same conversations. Appends re-read the row inside
+    their transaction, so two workers answering the same session do not
+    lose each other's turns; they are also what refreshes last_seen, so
+    the idle timeout counts from the last exchange.
+    """
+
+    def __init__(self, path: str):
+        self.path  = path
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # autocommit; writes take BEGIN IMMEDIATE and wait up to `timeout` for other workers
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")   # readers never wait for a writer
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, turns TEXT NOT NULL, summary TEXT NOT NULL,"
+            " summary_upto INTEGER NOT NULL, course TEXT, last_seen REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_lru ON sessions (last_seen)")
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def load(self, session_id: str):
+        """
+        (turns JSON, summary, summary_upto, course) of a session; None if
+        it does not exist (or was evicted). A plain read: last_seen only
+        moves when a turn is appended.
+        """
+        with self._lock:
+            return self._db.execute(
+                "SELECT turns, summary, summary_upto, course FROM sessions WHERE id = ?", (session_id,),
+            ).fetchone()
+
+    def insert(self, session: Session) -> None:
+        with self._transaction() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO sessions (id, turns, summary, summary_upto, course, last_seen)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (session.id, json.dumps(session.turns), session.summary, session.summary_upto,
+                 session.course, time.time()),
+            )
+
+    def append(self, session: Session, question: str, answer: str, max_turns: int) -> None:
+        # caller holds session.lock
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT turns, summary, summary_upto, course FROM sessions WHERE id = ?", (session.id,),
+            ).fetchone()
+            if row is not None:
+                session._apply(row)
+            session._append(question, answer, max_turns)
+            db.execute(
+                "INSERT OR REPLACE INTO sessions (id, turns, summary, summary_upto, course, last_seen)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (session.id, json.dumps(session.turns), session.summary, session.summary_upto,
+                 session.course, time.time()),
+            )
+
+    def save_summary(self, session_id: str, summary: str, upto: int, start: int) -> None:
+        # another worker may have compacted (or capped) the session meanwhile: then keep its summary
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE sessions SET summary = ?, summary_upto = ? WHERE id = ? AND summary_upto = ?",
+                (summary, upto, session_id, start),
+            )
+
+    def save_course(self, session_id: str, course) -> None:
+        with self._transaction() as db:
+            db.execute("UPDATE sessions SET course = ? WHERE id = ?", (course, session_id))
+
+    def delete(self, session_id: str) -> None:
+        with self._transaction() as db:
+            db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def evict(self, idle_seconds: float, max_sessions: int) -> int:
+        """
+        Delete sessions idle for longer than idle_seconds, then the least
+        recently used beyond max_sessions. Returns how many were deleted.
+        """
+        with self._transaction() as db:
+            evicted = db.execute("DELETE FROM sessions WHERE last_seen < ?", (time.time() - idle_seconds,)).rowcount
+            evicted += db.execute(
+                "DELETE FROM sessions WHERE id IN ("
+                " SELECT id FROM sessions ORDER BY last_seen DESC LIMIT -1 OFFSET ?)",
+                (max_sessions,),
+            ).rowcount
+            return evicted
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class SessionStore:
+    """
+    Bounded sessions: at most `max_sessions`, and sessions idle for longer
+    than `idle_seconds` are evicted (checked on every access).
+
+    In memory by default, which only works with one server process. With
+    `path` the sessions live in a SessionDB shared by all uvicorn workers;
+    the in-memory sessions are then a cache of it, refreshed on every get().
+    """
+
+    def __init__(self, max_sessions: int = 1000, idle_seconds: float = 1800, max_turns: int = 200, path: str = None):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.max_turns    = max_turns
+        self._sessions    = OrderedDict()   # id -> Session, least recently used first
+        self._lock        = threading.Lock()
+        self._shared      = SessionDB(path) if path else None
+        self.created      = 0
+        self.evicted      = 0
+
+    def _evict(self, now: float) -> None:
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if len(self._sessions) <= self.max_sessions and now - oldest.last_seen < self.idle_seconds:
+                break
+            self._sessions.popitem(last=False)
+            if self._shared is None:
+                self.evicted += 1   # shared sessions stay in the SessionDB; this was only its cache
+
+    def get(self, session_id: str):
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_seen = now
+                self._sessions.move_to_end(session_id)
+        if self._shared is None:
+            return session
+
+        # the shared copy is the truth: another worker may have answered since
+        row = self._shared.load(session_id)
+        if row is None:
+            if session is not None:
+                self.drop(session_id)
+            return None
+        if session is None:
+            fresh = Session(session_id)
+            fresh._shared = self._shared
+            with self._lock:
+                session = self._sessions.setdefault(session_id, fresh)
+                self._evict(now)
+        with session.lock:
+            session._apply(row)
+        return session
+
+    def get_or_create(self, session_id: str = None) -> Session:
+        """
+        The session for session_id, or a new one (with a fresh id) if it is
+        unknown or was evicted.
+        """
+        session = self.get(session_id) if session_id else None
+        if session is not None:
+            return session
+        session = Session(secrets.token_urlsafe(16))
+        if self._shared is not None:
+            session._shared = self._shared
+            self._shared.insert(session)
+            evicted = self._shared.evict(self.idle_seconds, self.max_sessions)
+        with self._lock:
+            self._sessions[session.id] = session
+            self.created += 1
+            if self._shared is not None:
+                self.evicted += evicted
+            self._evict(time.monotonic())
+        return session
+
+    def drop(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self._shared is not None:
+            self._shared.delete(session_id)
+
+    def stats(self) -> dict:
+        active = self._shared.count() if self._shared is not None else None
+        with self._lock:
+            return {
+                "active":       active if active is not None else len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "idle_seconds": self.idle_seconds,
+                "created":      self.created,
+                "evicted":      self.evicted,
+                "shared":       self._shared.path if self._shared is not None else None,
+            }
+
+
+_store      = None
+_store_lock = threading.Lock()
+
+def get_session_store() -> SessionStore:
+    """
+    Process-wide session store, configured by `sessions:` in settings.yaml.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            cfg = load_settings().get("sessions") or {}
+            _store = SessionStore(
+                max_sessions=cfg.get("max_sessions", 1000),
+                idle_seconds=cfg.get("idle_minutes", 30) * 60,
+                max_turns=cfg.get("max_turns", 200),
+                path=cfg.get("path"),
+            )
+        return _store
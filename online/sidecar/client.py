@@ -0,0 +1,152 @@
+# online/sidecar/client.py
+
+import json
+import socket
+import threading
+
+import numpy as np
+
+from online.config import load_settings
+from online.sidecar import protocol
+
+DEFAULT_SOCKET = "/tmp/voice-tutor-models.sock"
+
+_local_models = False   # set in the sidecar process itself, which runs the models
+
+
+class SidecarError(RuntimeError):
+    """
+    The sidecar answered with an error (the model call failed there).
+    """
+
+
+def sidecar_settings() -> dict:
+    return load_settings().get("sidecar") or {}
+
+
+def use_sidecar() -> bool:
+    """
+    True when STT, embeddings and TTS should be sent to the inference
+    sidecar (`sidecar.enabled`) instead of being loaded in this process.
+    """
+    return bool(sidecar_settings().get("enabled")) and not _local_models
+
+
+def run_models_locally() -> None:
+    # called by the sidecar before loading anything
+    global _local_models
+    _local_models = True
+
+
+class SidecarClient:
+    """
+    Blocking client of online/sidecar/server.py over its Unix socket. Every
+    thread keeps its own connection (stage workers call it concurrently);
+    a broken connection is re-opened once before giving up.
+    """
+
+    def __init__(self, path: str = DEFAULT_SOCKET, timeout: float = 300.0):
+        self.path    = path
+        self.timeout = timeout
+        self._local  = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self._local.sock = sock
+        return sock
+
+    def _drop(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def call(self, op: int, *buffers) -> bytearray:
+        for attempt in (1, 2):
+            sock = getattr(self._local, "sock", None)
+            try:
+                if sock is None:
+                    sock = self._connect()
+                protocol.send_frame(sock, op, *buffers)
+                status, payload = protocol.recv_frame(sock)
+                if status is None:
+                    raise protocol.ProtocolError("sidecar closed the connection")
+                break
+            except socket.timeout:
+                self._drop()
+                raise
+            except OSError:
+                self._drop()
+                if attempt == 2:
+                    raise
+        if status == protocol.ERROR:
+            raise SidecarError(bytes(payload).decode("utf-8", "replace"))
+        return payload
+
+    # ─ Model calls ─
+    def transcribe_batch(self, audios) -> list:
+        return protocol.decode_texts(self.call(protocol.OP_TRANSCRIBE, *protocol.encode_audio(audios)))
+
+    def transcribe(self, audio) -> str:
+        return self.transcribe_batch([audio])[0]
+
+    def transcribe_partial(self, audio) -> str:
+        return protocol.decode_texts(self.call(protocol.OP_PARTIAL, *protocol.encode_audio([audio])))[0]
+
+    def embed(self, model_name: str, texts) -> np.ndarray:
+        payload = self.call(protocol.OP_EMBED, *protocol.encode_texts([model_name, *texts]))
+        return protocol.decode_matrix(payload)
+
+    def synthesize(self, text: str, output_path: str) -> None:
+        self.call(protocol.OP_TTS, *protocol.encode_texts([text, output_path]))
+
+    # ─ Control ─
+    def ready(self, model: str) -> None:
+        """
+        Block until `model` is loaded and warm in the sidecar.
+        """
+        self.call(protocol.OP_READY, model.encode("utf-8"))
+
+    def status(self) -> dict:
+        return json.loads(bytes(self.call(protocol.OP_STATUS)))
+
+    def close(self) -> None:
+        self._drop()
+
+
+class SidecarEmbeddings:
+    """
+    LangChain-style embeddings (embed_documents / embed_query) computed by
+    the sidecar's copy of `model_name`; vectors cross the socket as raw float32.
+    """
+
+    def __init__(self, client: SidecarClient, model_name: str):
+        self.client     = client
+        self.model_name = model_name
+
+    def embed_documents(self, texts) -> list:
+        texts = list(texts)
+        if not texts:
+            return []
+        # plain lists, like HuggingFaceEmbeddings (Chroma expects them)
+        return self.client.embed(self.model_name, texts).tolist()
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_documents([text])[0]
+
+
+_client      = None
+_client_lock = threading.Lock()
+
+def get_sidecar() -> SidecarClient:
+    """
+    Process-wide client for `sidecar.socket` in settings.yaml.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            cfg     = sidecar_settings()
+            _client = SidecarClient(cfg.get("socket", DEFAULT_SOCKET), timeout=cfg.get("timeout_s", 300))
+        return _client
@@ -0,0 +1,120 @@
+# online/sidecar/protocol.py
+
+import struct
+
+import numpy as np
+
+# ─ Frames: 5-byte header (op or status, payload length) + payload ─
+HEADER = struct.Struct("!BI")
+COUNT  = struct.Struct("!I")
+SHAPE  = struct.Struct("!II")
+
+# requests
+OP_STATUS     = 0   # -> UTF-8 JSON of the sidecar's model states
+OP_READY      = 1   # model name -> empty, once that model is loaded and warm
+OP_TRANSCRIBE = 2   # audio batch -> text list (final transcripts, micro-batched)
+OP_PARTIAL    = 3   # audio batch of one clip -> text list (greedy live preview)
+OP_EMBED      = 4   # text list [model name, *texts] -> matrix (n, dim)
+OP_TTS        = 5   # text list [text, output path] -> empty, once the WAV is written
+
+# responses
+OK    = 0
+ERROR = 1           # payload: UTF-8 error message
+
+MAX_PAYLOAD = 512 * 2**20
+
+
+class ProtocolError(ConnectionError):
+    pass
+
+
+def send_frame(sock, code: int, *buffers) -> None:
+    """
+    One frame whose payload is `buffers` back to back. Each buffer (bytes,
+    or a contiguous numpy array) goes to the socket as is, without being
+    joined into one copy first.
+    """
+    views = [memoryview(b).cast("B") for b in buffers]
+    sock.sendall(HEADER.pack(code, sum(v.nbytes for v in views)))
+    for view in views:
+        if view.nbytes:
+            sock.sendall(view)
+
+
+def recv_exact(sock, size: int) -> bytearray:
+    buf  = bytearray(size)
+    view = memoryview(buf)
+    got  = 0
+    while got < size:
+        n = sock.recv_into(view[got:])
+        if n == 0:
+            raise ProtocolError("sidecar connection closed")
+        got += n
+    return buf
+
+
+def recv_frame(sock):
+    """
+    -> (code, payload bytearray), or (None, None) if the peer closed the
+    connection between frames.
+    """
+    head = sock.recv(HEADER.size)
+    if not head:
+        return None, None
+    if len(head) < HEADER.size:
+        head += recv_exact(sock, HEADER.size - len(head))
+    code, size = HEADER.unpack(head)
+    if size > MAX_PAYLOAD:
+        raise ProtocolError(f"frame of {size} bytes exceeds {MAX_PAYLOAD}")
+    return code, recv_exact(sock, size)
+
+
+# ─── Payload encodings ───
+def encode_texts(texts) -> list:
+    """
+    Text list: count, then each UTF-8 length, then the UTF-8 bytes.
+    """
+    data = [t.encode("utf-8") for t in texts]
+    return [COUNT.pack(len(data)) + struct.pack(f"!{len(data)}I", *map(len, data)), *data]
+
+
+def decode_texts(payload) -> list:
+    (count,) = COUNT.unpack_from(payload, 0)
+    lengths  = struct.unpack_from(f"!{count}I", payload, COUNT.size)
+    offset   = COUNT.size + 4 * count
+    texts    = []
+    for length in lengths:
+        texts.append(bytes(payload[offset:offset + length]).decode("utf-8"))
+        offset += length
+    return texts
+
+
+def encode_audio(clips) -> list:
+    """
+    Audio batch: count, each clip's sample count, then the clips as
+    little-endian float32 (16 kHz mono), sent straight from the arrays.
+    """
+    clips = [np.ascontiguousarray(c, dtype="<f4") for c in clips]
+    return [COUNT.pack(len(clips)) + struct.pack(f"!{len(clips)}I", *(c.size for c in clips)), *clips]
+
+
+def decode_audio(payload) -> list:
+    # the clips are views into `payload`, not copies
+    (count,) = COUNT.unpack_from(payload, 0)
+    sizes    = struct.unpack_from(f"!{count}I", payload, COUNT.size)
+    offset   = COUNT.size + 4 * count
+    clips    = []
+    for size in sizes:
+        clips.append(np.frombuffer(payload, dtype="<f4", count=size, offset=offset))
+        offset += 4 * size
+    return clips
+
+
+def encode_matrix(matrix) -> list:
+    matrix = np.ascontiguousarray(matrix, dtype="<f4")
+    return [SHAPE.pack(*matrix.shape), matrix]
+
+
+def decode_matrix(payload) -> np.ndarray:
+    rows, dim = SHAPE.unpack_from(payload, 0)
+    return np.frombuffer(payload, dtype="<f4", count=rows * dim, offset=SHAPE.size).reshape(rows, dim)
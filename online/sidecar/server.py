@@ -0,0 +1,173 @@
+# online/sidecar/server.py
+"""
+Inference sidecar: one process that holds the Whisper, sentence-transformers
+and TTS models for every uvicorn worker on the machine.
+
+    python online/sidecar/server.py            # socket from sidecar.socket in settings.yaml
+    uvicorn online.server:app --workers 4      # with sidecar.enabled: true
+
+Workers connect over a Unix socket and speak the binary protocol in
+protocol.py; audio and vectors travel as raw float32. Final transcripts
+from all workers go through one STT micro-batcher, so concurrent questions
+from different workers still share a Whisper batch.
+"""
+
+import json
+import logging
+import os
+import socketserver
+import sys
+import threading
+
+import numpy as np
+
+# ─ Make project root importable ─
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from online.models import get_model_registry
+from online.sidecar import protocol
+from online.sidecar.client import DEFAULT_SOCKET, run_models_locally, sidecar_settings
+
+logger = logging.getLogger("uvicorn.error")
+
+DEFAULT_EMBEDDING_MODEL = "multi-qa-mpnet-base-dot-v1"   # the retriever's query model
+
+
+# ─── Models (loaded through the registry, like in the HTTP workers) ───
+_embedding_lock = threading.Lock()
+
+def embedding_model(model_name: str):
+    # one SentenceTransformer per model name, registered on first request
+    name     = f"embeddings:{model_name}"
+    registry = get_model_registry()
+    with _embedding_lock:
+        if name not in registry.status():
+            register_embeddings(model_name)
+    return registry.get(name)
+
+
+def register_embeddings(model_name: str) -> None:
+    def load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+
+    get_model_registry().register(
+        f"embeddings:{model_name}", load, warmup=lambda model: model.encode(["warmup query"]),
+    )
+
+
+def embed(model_name: str, texts) -> np.ndarray:
+    # same preprocessing as langchain's HuggingFaceEmbeddings.embed_documents
+    texts = [text.replace("\n", " ") for text in texts]
+    return np.asarray(embedding_model(model_name).encode(texts, show_progress_bar=False), dtype=np.float32)
+
+
+# ─── Request handling ───
+def handle(op: int, payload) -> list:
+    """
+    Run one request; returns the response payload buffers.
+    """
+    from online.stt import whisper_stt
+    from online.stt.scheduler import get_stt_batcher
+    from online.tts.tts_service import get_tts_service
+
+    if op == protocol.OP_TRANSCRIBE:
+        futures = [get_stt_batcher().submit(clip) for clip in protocol.decode_audio(payload)]
+        return protocol.encode_texts([future.result() for future in futures])
+    if op == protocol.OP_PARTIAL:
+        return protocol.encode_texts([whisper_stt.transcribe_partial(protocol.decode_audio(payload)[0])])
+    if op == protocol.OP_EMBED:
+        model_name, *texts = protocol.decode_texts(payload)
+        return protocol.encode_matrix(embed(model_name, texts))
+    if op == protocol.OP_TTS:
+        text, output_path = protocol.decode_texts(payload)
+        get_tts_service().render(text, output_path)
+        return []
+    if op == protocol.OP_READY:
+        name = bytes(payload).decode("utf-8")
+        if name.startswith("embeddings:") and name not in get_model_registry().status():
+            register_embeddings(name.split(":", 1)[1])
+        get_model_registry().warm(name)
+        return []
+    if op == protocol.OP_STATUS:
+        return [json.dumps(get_model_registry().status()).encode("utf-8")]
+    raise ValueError(f"Unknown sidecar op {op}")
+
+
+class SidecarHandler(socketserver.BaseRequestHandler):
+    """
+    One worker connection: frames are answered in order until it closes.
+    """
+
+    def handle(self):
+        sock = self.request
+        while True:
+            try:
+                op, payload = protocol.recv_frame(sock)
+            except OSError:
+                return
+            if op is None:
+                return
+            try:
+                response = handle(op, payload)
+                code     = protocol.OK
+            except Exception as e:
+                logger.error(f"[sidecar] Request {op} failed: {e}")
+                response = [f"{type(e).__name__}: {e}".encode("utf-8")]
+                code     = protocol.ERROR
+            try:
+                protocol.send_frame(sock, code, *response)
+            except OSError:
+                return
+
+
+class SidecarServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path: str = DEFAULT_SOCKET, warmup: bool = True) -> SidecarServer:
+    """
+    Load (in the background) and serve the models on the Unix socket `path`.
+    """
+    run_models_locally()
+    # importing these registers whisper and tts; they never route back to a sidecar
+    import online.stt.whisper_stt  # noqa: F401
+    import online.tts.tts_service  # noqa: F401
+    register_embeddings(sidecar_settings().get("embedding_model", DEFAULT_EMBEDDING_MODEL))
+
+    if os.path.exists(path):
+        os.remove(path)   # stale socket from an earlier run
+    server = SidecarServer(path, SidecarHandler)
+    os.chmod(path, 0o660)
+    if warmup:
+        get_model_registry().warmup()
+    return server
+
+
+def main():
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Inference sidecar for the tutor's uvicorn workers")
+    parser.add_argument("--socket", default=sidecar_settings().get("socket", DEFAULT_SOCKET))
+    parser.add_argument("--no-warmup", action="store_true", help="load each model on its first request")
+    args = parser.parse_args()
+
+    server = serve(args.socket, warmup=not args.no_warmup)
+    logger.info(f"[sidecar] Serving STT, embeddings and TTS on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(args.socket)
+        from online.stt.scheduler import get_stt_batcher
+        from online.tts.tts_service import get_tts_service
+        get_stt_batcher().shutdown()
+        get_tts_service().shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# online/stt/audio_ingest.py
+
+import io
+import logging
+import subprocess
+
+import numpy as np
+
+from online.tracing import traced
+
+logger = logging.getLogger("uvicorn.error")
+
+SAMPLE_RATE = 16000          # what Whisper expects
+READ_CHUNK  = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """
+    Raised when an uploaded clip exceeds the configured size limit.
+    """
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"audio upload exceeds {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+async def read_upload(upload, max_bytes: int) -> bytes:
+    """
+    Read an UploadFile into memory, giving up as soon as it exceeds max_bytes.
+    """
+    buf = bytearray()
+    while True:
+        chunk = await upload.read(READ_CHUNK)
+        if not chunk:
+            return bytes(buf)
+        buf += chunk
+        if len(buf) > max_bytes:
+            raise UploadTooLarge(max_bytes)
+
+
+@traced("ffmpeg")
+def decode_audio(data: bytes, ffmpeg_bin: str = None) -> np.ndarray:
+    """
+    Decode any container/codec ffmpeg understands (webm/opus from the browser,
+    wav, mp3…) straight into a mono 16 kHz float32 array: the bytes go in
+    through ffmpeg's stdin and raw PCM comes back on stdout, no temp files.
+    Without ffmpeg (or if it fails) faster-whisper's in-process PyAV decoder
+    is used instead. A clip neither can decode (corrupt, truncated, too
+    short) gives an empty array, i.e. an empty transcript.
+    """
+    if not data:
+        return np.zeros(0, dtype=np.float32)
+
+    if ffmpeg_bin:
+        try:
+            proc = subprocess.run(
+                [
+                    ffmpeg_bin, "-nostdin", "-loglevel", "error",
+                    "-i", "pipe:0",
+                    "-f", "f32le", "-acodec", "pcm_f32le",
+                    "-ac", "1", "-ar", str(SAMPLE_RATE),
+                    "pipe:1",
+                ],
+                input=data, capture_output=True, check=True,
+            )
+            return np.frombuffer(proc.stdout, dtype=np.float32)
+        except (OSError, subprocess.CalledProcessError):
+            pass
+
+    try:
+        from faster_whisper import decode_audio as pyav_decode
+        return pyav_decode(io.BytesIO(data), sampling_rate=SAMPLE_RATE)
+    except Exception as e:
+        logger.warning(f"Could not decode {len(data)}-byte audio upload: {e}")
+        return np.zeros(0, dtype=np.float32)
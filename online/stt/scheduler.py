@@ -0,0 +1,135 @@
+# online/stt/scheduler.py
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from online.config import load_settings
+from online.tracing import span, traced
+
+_STOP = object()
+
+
+class STTBatcher:
+    """
+    Micro-batching front end for the shared Whisper model. Clips submitted
+    within `window_ms` of the first waiting clip (up to `max_batch`) are
+    decoded together by one `transcribe_batch` call, and each caller gets
+    its own transcript back through a Future.
+    """
+
+    def __init__(self, transcribe_batch, window_ms: float = 50, max_batch: int = 8):
+        self.transcribe_batch = transcribe_batch
+        self.window           = window_ms / 1000
+        self.max_batch        = max(1, max_batch)
+        self._queue           = queue.Queue()
+        self._lock            = threading.Lock()
+        self._thread          = None
+        self.requests         = 0
+        self.batches          = 0
+        self.largest_batch    = 0
+
+    def submit(self, audio) -> Future:
+        """
+        Queue one mono 16 kHz float32 clip; the Future resolves to its text.
+        """
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stt-batcher", daemon=True)
+                self._thread.start()
+        self._queue.put((audio, future))
+        return future
+
+    def transcribe(self, audio) -> str:
+        """
+        Blocking submit() for callers already running on a worker thread.
+        """
+        return self.submit(audio).result()
+
+    # ─ Batching loop ─
+    def _collect(self) -> list:
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch    = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            # drop callers that gave up while waiting
+            batch = [(audio, future) for audio, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            with self._lock:
+                self.requests      += len(batch)
+                self.batches       += 1
+                self.largest_batch  = max(self.largest_batch, len(batch))
+            try:
+                with span("stt.batch"):
+                    texts = self.transcribe_batch([audio for audio, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), text in zip(batch, texts):
+                future.set_result(text)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "window_ms":      self.window * 1000,
+                "max_batch":      self.max_batch,
+                "requests":       self.requests,
+                "batches":        self.batches,
+                "mean_batch":     self.requests / self.batches if self.batches else 0.0,
+                "largest_batch":  self.largest_batch,
+                "queue_depth":    self._queue.qsize(),
+            }
+
+    def shutdown(self) -> None:
+        self._queue.put(_STOP)
+
+
+_batcher      = None
+_batcher_lock = threading.Lock()
+
+def get_stt_batcher() -> STTBatcher:
+    """
+    Process-wide batcher around whisper_stt.transcribe_batch, configured by
+    `stt.batch_window_ms` / `stt.max_batch` in settings.yaml.
+    """
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            from online.stt.whisper_stt import transcribe_batch
+            cfg = load_settings().get("stt") or {}
+            _batcher = STTBatcher(
+                transcribe_batch,
+                window_ms=cfg.get("batch_window_ms", 50),
+                max_batch=cfg.get("max_batch", 8),
+            )
+        return _batcher
+
+
+@traced("stt")
+def transcribe_batched(audio) -> str:
+    """
+    Transcribe one clip through the shared batcher (blocks until done).
+    """
+    return get_stt_batcher().transcribe(audio)
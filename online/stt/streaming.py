@@ -0,0 +1,120 @@
+# online/stt/streaming.py
+
+from collections import deque
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+class EnergyVAD:
+    """
+    Cheap frame-level voice activity detector: a frame is speech when its RMS
+    is well above a running estimate of the background noise floor.
+    """
+
+    def __init__(self, ratio: float = 3.0, min_rms: float = 0.01, adapt: float = 0.05):
+        self.ratio       = ratio      # speech must be this many times louder than the noise floor
+        self.min_rms     = min_rms    # …and never quieter than this (float32 full scale = 1.0)
+        self.adapt       = adapt      # how fast the noise floor follows silent frames
+        self.noise_floor = None
+
+    def is_speech(self, frame: np.ndarray) -> bool:
+        rms = float(np.sqrt(np.mean(np.square(frame)))) if frame.size else 0.0
+        if self.noise_floor is None:
+            self.noise_floor = rms
+        speech = rms > max(self.min_rms, self.noise_floor * self.ratio)
+        if not speech:
+            self.noise_floor += self.adapt * (rms - self.noise_floor)
+        return speech
+
+
+class UtteranceSegmenter:
+    """
+    Collects one spoken utterance from a live stream of 16 kHz float32
+    samples. Silence before speech is dropped (except a short pre-roll), and
+    the utterance ends after `end_silence_ms` of silence or `max_utterance_s`.
+    """
+
+    def __init__(
+        self,
+        frame_ms: int = 30,
+        end_silence_ms: int = 700,
+        pre_roll_ms: int = 300,
+        min_speech_ms: int = 250,
+        max_utterance_s: float = 30.0,
+        vad: EnergyVAD = None,
+    ):
+        self.frame_len       = SAMPLE_RATE * frame_ms // 1000
+        self.end_silence     = end_silence_ms // frame_ms
+        self.min_speech      = min_speech_ms // frame_ms
+        self.max_frames      = int(max_utterance_s * 1000) // frame_ms
+        self.vad             = vad or EnergyVAD()
+        self._pre_roll       = deque(maxlen=max(1, pre_roll_ms // frame_ms))
+        self._pending        = np.zeros(0, dtype=np.float32)   # < 1 frame left over
+        self.reset()
+
+    def reset(self) -> None:
+        self._frames       = []      # utterance frames (speech + short pauses)
+        self._voiced       = 0       # speech frames in the utterance
+        self._silence_run  = 0       # trailing silent frames
+        self.ended         = False
+        self._pre_roll.clear()       # audio before the last utterance must not lead the next one
+
+    @property
+    def started(self) -> bool:
+        return bool(self._frames)
+
+    @property
+    def speech_seconds(self) -> float:
+        return self._voiced * self.frame_len / SAMPLE_RATE
+
+    def feed(self, samples: np.ndarray) -> bool:
+        """
+        Add samples; returns True once the utterance has ended. Samples
+        after the end are kept for the next utterance (after reset()).
+        """
+        data = np.concatenate([self._pending, np.asarray(samples, dtype=np.float32)])
+        if self.ended:
+            self._pending = data
+            return True
+        n_frames = len(data) // self.frame_len
+        self._pending = data[n_frames * self.frame_len:]
+
+        for i in range(n_frames):
+            frame  = data[i * self.frame_len:(i + 1) * self.frame_len]
+            speech = self.vad.is_speech(frame)
+            if not self.started:
+                if speech:
+                    self._frames.extend(self._pre_roll)
+                    self._frames.append(frame)
+                    self._voiced = 1
+                else:
+                    self._pre_roll.append(frame)
+                continue
+
+            self._frames.append(frame)
+            if speech:
+                self._voiced     += 1
+                self._silence_run = 0
+            else:
+                self._silence_run += 1
+
+            if self._silence_run >= self.end_silence and self._voiced < self.min_speech:
+                # just a click or a cough: drop it and keep listening
+                self.reset()
+            elif self._silence_run >= self.end_silence or len(self._frames) >= self.max_frames:
+                self.ended = True
+                # the rest of this chunk belongs to the next utterance
+                self._pending = data[(i + 1) * self.frame_len:]
+                break
+        return self.ended
+
+    def audio(self) -> np.ndarray:
+        """
+        The utterance so far, without its trailing silence.
+        """
+        frames = self._frames[:len(self._frames) - self._silence_run] if self._silence_run else self._frames
+        if not frames:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(frames)
@@ -1,27 +1,184 @@
 # online/stt/whisper_stt.py
 
-from faster_whisper import WhisperModel
+from typing import Union
+
+import numpy as np
+import logging
 import sys
+import threading
+import zlib
+
+from online.models import get_model_registry
+from online.sidecar.client import get_sidecar, use_sidecar
+from online.tracing import traced
+
+logger = logging.getLogger("uvicorn.error")
+
+SAMPLE_RATE     = 16000
+MAX_BATCH_CLIP  = 30 * SAMPLE_RATE   # Whisper's window; longer clips are decoded one by one
+
+# ─ Same quality gates as WhisperModel.transcribe's defaults ─
+NO_SPEECH_THRESHOLD         = 0.6    # with a low log-prob: silence, no text
+LOG_PROB_THRESHOLD          = -1.0   # below it: redo the clip with temperature fallback
+COMPRESSION_RATIO_THRESHOLD = 2.4    # above it (repetition loop): same
+
+
+# Faster Whisper model, loaded once on first use (or by the startup warmup)
+def _load_model():
+    from faster_whisper import WhisperModel
+    return WhisperModel(
+        model_size_or_path="medium",  # tiny/small/medium/large-v2...
+        device="cpu",                 # or "cuda"
+        compute_type="int8"           # reduces memory
+    )
+
 
+def _warmup(model) -> None:
+    # one second of silence through the full decode path (segments are lazy)
+    segments, _ = model.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), language="en")
+    list(segments)
 
-# Initialize the Faster Whisper model once
-model = WhisperModel(
-    model_size_or_path="medium",  # tiny/small/medium/large-v2...
-    device="cpu",                 # or "cuda"
-    compute_type="int8"           # reduces memory
-)
 
-def transcribe(audio_path: str) -> str:
+if use_sidecar():
+    # the model lives in the inference sidecar; "loaded" = the sidecar has it warm
+    get_model_registry().register("whisper", get_sidecar, warmup=lambda sidecar: sidecar.ready("whisper"))
+else:
+    get_model_registry().register("whisper", _load_model, warmup=_warmup)
+
+def get_model():
+    return get_model_registry().get("whisper")
+
+
+def transcribe(audio: Union[str, np.ndarray]) -> str:
     """
-    Transcribe the given audio file, forcing English only.
+    Transcribe an audio file path or a mono 16 kHz float32 array,
+    forcing English only.
     """
-    segments, _ = model.transcribe(
-        audio_path,
+    if isinstance(audio, np.ndarray) and audio.size == 0:
+        return ""
+    if isinstance(audio, np.ndarray) and use_sidecar():
+        return get_model().transcribe(audio)
+    segments, _ = get_model().transcribe(
+        audio,
         language="en"   # <<< force English
     )
     return "".join(segment.text for segment in segments)
 
 
+@traced("stt.partial")
+def transcribe_partial(audio: np.ndarray) -> str:
+    """
+    Fast, greedy decode of an utterance that is still being spoken
+    (live preview only; the final transcript uses `transcribe`).
+    """
+    if audio.size == 0:
+        return ""
+    if use_sidecar():
+        return get_model().transcribe_partial(audio)
+    segments, _ = get_model().transcribe(
+        audio,
+        language="en",
+        beam_size=1,
+        condition_on_previous_text=False,
+        without_timestamps=True,
+    )
+    return "".join(segment.text for segment in segments)
+
+
+# ─── Batched decoding (several clips, one encoder/decoder call) ───
+_tokenizer      = None
+_tokenizer_lock = threading.Lock()
+
+def _get_tokenizer(model):
+    from faster_whisper.tokenizer import Tokenizer
+    global _tokenizer
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            _tokenizer = Tokenizer(
+                model.hf_tokenizer,
+                model.model.is_multilingual,
+                task="transcribe",
+                language="en",
+            )
+        return _tokenizer
+
+
+def _compression_ratio(text: str) -> float:
+    data = text.encode("utf-8")
+    return len(data) / len(zlib.compress(data))
+
+
+def _decode_batch(clips: list) -> list:
+    """
+    Beam search at temperature 0 over all clips in one pass. Entries are
+    text, or None for a clip that failed transcribe()'s quality checks and
+    needs its temperature fallback.
+    """
+    from faster_whisper.audio import pad_or_trim
+    # one padded 30 s mel window per clip, stacked into a single batch
+    model     = get_model()
+    features  = np.stack([pad_or_trim(model.feature_extractor(clip)) for clip in clips])
+    tokenizer = _get_tokenizer(model)
+    prompt    = model.get_prompt(tokenizer, [], without_timestamps=True)
+    encoded   = model.encode(features)
+    results   = model.model.generate(
+        encoded,
+        [prompt] * len(clips),
+        beam_size=5,
+        max_length=448,              # Whisper decoder context
+        suppress_blank=True,
+        suppress_tokens=[-1],
+        return_scores=True,
+        return_no_speech_prob=True,
+    )
+
+    texts = []
+    for result in results:
+        tokens      = result.sequences_ids[0]
+        avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)   # length_penalty 1, as transcribe
+        text        = tokenizer.decode(tokens)
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and avg_logprob < LOG_PROB_THRESHOLD:
+            texts.append("")
+        elif avg_logprob < LOG_PROB_THRESHOLD or _compression_ratio(text) > COMPRESSION_RATIO_THRESHOLD:
+            texts.append(None)
+        else:
+            texts.append(text)
+    return texts
+
+
+def transcribe_batch(audios: list) -> list:
+    """
+    Transcribe several mono 16 kHz float32 arrays at once. Clips up to 30 s
+    share one batched encoder + decoder pass with transcribe()'s silence and
+    quality checks; longer clips (which need Whisper's sliding window) and
+    clips that fail those checks go through `transcribe` individually.
+    """
+    if use_sidecar():
+        # the sidecar batches again, across all workers
+        return get_model().transcribe_batch(audios)
+    texts = [""] * len(audios)
+    short = []
+    for i, audio in enumerate(audios):
+        if audio.size == 0:
+            continue
+        if audio.size > MAX_BATCH_CLIP:
+            texts[i] = transcribe(audio)
+        else:
+            short.append(i)
+
+    if len(short) == 1:
+        texts[short[0]] = transcribe(audios[short[0]])
+    elif short:
+        try:
+            decoded = _decode_batch([audios[i] for i in short])
+        except Exception as e:
+            logger.warning(f"[STT] Batched decode failed, falling back to single clips: {e}")
+            decoded = [transcribe(audios[i]) for i in short]
+        for i, text in zip(short, decoded):
+            texts[i] = text if text is not None else transcribe(audios[i])
+    return texts
+
+
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
@@ -0,0 +1,358 @@
+# online/tracing.py
+
+import contextvars
+import functools
+import logging
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from online.config import load_settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# ─ Latency buckets (seconds) shared by every histogram ─
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """
+    Cumulative-bucket latency histogram per label value, rendered in the
+    Prometheus text format.
+    """
+
+    def __init__(self, name: str, help_text: str, label: str, buckets=BUCKETS):
+        self.name      = name
+        self.help_text = help_text
+        self.label     = label
+        self.buckets   = buckets
+        self._lock     = threading.Lock()
+        self._series   = {}    # label value -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value_label: str, seconds: float) -> None:
+        with self._lock:
+            series = self._series.get(value_label)
+            if series is None:
+                series = self._series[value_label] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += seconds
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for value, series in sorted(self._series.items()):
+                label = f'{self.label}="{_escape(value)}"'
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series[len(self.buckets)]}')
+                lines.append(f"{self.name}_sum{{{label}}} {series[-1]:.6f}")
+                lines.append(f"{self.name}_count{{{label}}} {series[len(self.buckets)]}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+STAGE_SECONDS   = Histogram("tutor_stage_seconds", "Time spent in one pipeline stage.", "stage")
+REQUEST_SECONDS = Histogram("tutor_request_seconds", "End-to-end HTTP request time.", "path")
+
+_model_loads      = {}    # model name -> seconds
+_model_loads_lock = threading.Lock()
+
+
+# ─── Request traces ───
+class Trace:
+    """
+    Spans recorded while serving one request. Spans opened on executor
+    threads land here too, since stages copy the caller's contextvars.
+    """
+
+    def __init__(self, request_id: str, label: str, profile: bool = False):
+        self.request_id = request_id
+        self.label      = label
+        self.start      = time.perf_counter()
+        self.profile    = profile
+        self.spans      = []            # (name, offset s, duration s)
+        self.samples    = Counter()     # collapsed stack -> count (profiled requests)
+        self._threads   = Counter()     # thread id -> open spans
+        self._lock      = threading.Lock()
+
+    def _enter(self, thread_id: int) -> None:
+        with self._lock:
+            self._threads[thread_id] += 1
+
+    def _leave(self, thread_id: int, name: str, start: float, seconds: float) -> None:
+        with self._lock:
+            self._threads[thread_id] -= 1
+            if self._threads[thread_id] <= 0:
+                del self._threads[thread_id]
+            self.spans.append((name, start - self.start, seconds))
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.spans.append((name, time.perf_counter() - seconds - self.start, seconds))
+
+    def active_threads(self) -> list:
+        with self._lock:
+            return list(self._threads)
+
+    def totals(self) -> dict:
+        """
+        {span name: total seconds}, in order of first appearance.
+        """
+        totals = {}
+        with self._lock:
+            for name, offset, seconds in sorted(self.spans, key=lambda s: s[1]):
+                totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def current_request_id():
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+@contextmanager
+def span(name: str):
+    """
+    Time a block as stage `name`: always feeds the stage histogram, and
+    the current request's trace when there is one.
+    """
+    trace     = _current_trace.get()
+    thread_id = threading.get_ident()
+    if trace is not None:
+        trace._enter(thread_id)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(name, seconds)
+        if trace is not None:
+            trace._leave(thread_id, name, start, seconds)
+
+
+def traced(name: str):
+    """
+    Decorator form of span().
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record(name: str, seconds: float) -> None:
+    """
+    Add a duration measured elsewhere (e.g. time to first LLM token).
+    """
+    STAGE_SECONDS.observe(name, seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+@contextmanager
+def model_load(name: str):
+    """
+    Time loading a model; reported as tutor_model_load_seconds{model=name}.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        with _model_loads_lock:
+            _model_loads[name] = seconds
+        logger.info(f"[trace] Loaded {name} in {seconds:.2f}s")
+
+
+# ─── Sampling profiler for slow requests ───
+class SlowRequestProfiler:
+    """
+    While a sampled request is in flight, a background thread snapshots the
+    stacks of the threads that currently hold one of its spans every
+    `interval` seconds. If the request turns out slow, the samples are
+    written as collapsed stacks (`<request id>.folded`, one "frame;frame
+    count" line per stack), ready for flamegraph.pl or speedscope.
+    """
+
+    def __init__(self, out_dir: str, interval: float = 0.01):
+        self.out_dir  = out_dir
+        self.interval = interval
+        self._active  = set()
+        self._lock    = threading.Lock()
+        self._thread  = None
+
+    def start(self, trace: Trace) -> None:
+        with self._lock:
+            self._active.add(trace)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self, trace: Trace) -> None:
+        with self._lock:
+            self._active.discard(trace)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                traces = list(self._active)
+                if not traces:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for trace in traces:
+                for thread_id in trace.active_threads():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        trace.samples[_collapse(frame)] += 1
+            time.sleep(self.interval)
+
+    def dump(self, trace: Trace):
+        if not trace.samples:
+            return None
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f"{trace.request_id}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in trace.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+def _collapse(frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+# ─── ASGI middleware ───
+class TracingMiddleware:
+    """
+    Gives every HTTP request a request id (the client's X-Request-Id, or a
+    new one, echoed in the response), collects its spans until the response
+    body is fully sent (streams included), feeds tutor_request_seconds
+    (labelled by route template, "other" when no route matched) and
+    logs one line per request with time per stage. Requests slower than
+    `tracing.slow_request_ms` are logged as warnings; a sampled share of
+    requests (`tracing.profile_sample_rate`) is profiled and the profile
+    kept when it is slow.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        cfg = load_settings().get("tracing") or {}
+        self.slow_seconds = cfg.get("slow_request_ms", 5000) / 1000
+        self.sample_rate  = cfg.get("profile_sample_rate", 0.0)
+        self.profiler     = SlowRequestProfiler(
+            cfg.get("profile_dir", "online/temp/profiles"),
+            interval=cfg.get("profile_interval_ms", 10) / 1000,
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers    = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or secrets.token_hex(8)
+        trace      = Trace(request_id, f"{scope['method']} {scope['path']}",
+                           profile=self.sample_rate > 0 and random.random() < self.sample_rate)
+        token      = _current_trace.set(trace)
+        status     = [None]
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message["headers"] = list(message.get("headers") or []) + [
+                    (b"x-request-id", request_id.encode("latin-1")),
+                ]
+            await send(message)
+
+        if trace.profile:
+            self.profiler.start(trace)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _current_trace.reset(token)
+            if trace.profile:
+                self.profiler.stop(trace)
+            # routing has run by now: scope["route"] is the matched route, if any
+            self._finish(trace, _path_label(scope), status[0])
+
+    def _finish(self, trace: Trace, path: str, status) -> None:
+        seconds = time.perf_counter() - trace.start
+        REQUEST_SECONDS.observe(path, seconds)
+        if path in ("/tts/", "/static/", "/metrics", "/healthz", "/readyz"):
+            return
+        stages = " · ".join(
+            f"{name} {total * 1000:.0f}ms" for name, total in trace.totals().items()
+            if total >= 0.001 or not name.startswith("queue.")   # skip empty queue waits
+        )
+        line   = f"[trace] {trace.request_id} {trace.label} {status} {seconds * 1000:.0f}ms" + (f" | {stages}" if stages else "")
+        if seconds < self.slow_seconds:
+            logger.info(line)
+            return
+        logger.warning(f"{line} (slow)")
+        if trace.profile:
+            path = self.profiler.dump(trace)
+            if path:
+                logger.warning(f"[trace] Profile of {trace.request_id} written to {path}")
+
+
+def _path_label(scope) -> str:
+    # static files would give one series per file
+    for prefix in ("/tts/", "/static/"):
+        if scope["path"].startswith(prefix):
+            return prefix
+    # the matched route's template, not the raw path, so the label set
+    # stays bounded; 404s and scanners share one series
+    return getattr(scope.get("route"), "path", None) or "other"
+
+
+# ─── Prometheus exposition ───
+def render_metrics(gauges) -> str:
+    """
+    Text exposition of the stage/request histograms, model load times and
+    `gauges`: [(name, help, type, [(labels dict, value)])].
+    """
+    lines = STAGE_SECONDS.render() + REQUEST_SECONDS.render()
+
+    with _model_loads_lock:
+        loads = sorted(_model_loads.items())
+    gauges = list(gauges) + [(
+        "tutor_model_load_seconds", "Time it took to load each model.", "gauge",
+        [({"model": name}, seconds) for name, seconds in loads],
+    )]
+    for name, help_text, kind, samples in gauges:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if value is None:
+                continue
+            label = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label}}} {float(value):g}" if label else f"{name} {float(value):g}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,166 @@
+# online/tts/speech_pipeline.py
+
+import asyncio
+import os
+import logging
+import re
+import wave
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from online.executors import StageSaturated
+from online.tracing import traced
+from online.tts.tts_service import get_tts_service, synthesize_cached
+
+logger = logging.getLogger("uvicorn.error")
+
+# sentence end: . ! ? ؟ (plus closing quotes/brackets) followed by whitespace, or a line break
+SENTENCE_END = re.compile(r'[.!?؟]+["\')\]]*\s+|\n+')
+
+# used when no TTS stage executor is passed in (e.g. scripts)
+_default_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-")
+
+
+class SentenceSplitter:
+    """
+    Incrementally cuts a token stream into sentences. Sentences shorter than
+    min_chars are merged with the next one so TTS is not called per word.
+    """
+
+    def __init__(self, min_chars: int = 40):
+        self.min_chars = min_chars
+        self._buffer   = ""
+
+    def feed(self, text: str) -> list:
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            if len(candidate) >= self.min_chars:
+                sentences.append(candidate)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> list:
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+class SpeechPipeline:
+    """
+    Synthesizes an answer sentence by sentence while it is still being
+    generated. Feed LLM tokens with `feed()`; every complete sentence is
+    submitted to the TTS executor (and served from the TTS cache when the
+    same sentence was spoken before). Finished segments
+    come back in order from `ready_segments()` (non-blocking), `segments()`
+    (blocking) or `asegments()` (async), the latter two running until the
+    answer is fully spoken.
+    """
+
+    def __init__(self, executor=None, min_chars: int = 40):
+        self.executor = executor or _default_executor
+        self.splitter = SentenceSplitter(min_chars=min_chars)
+        self.paths    = []               # finished segment paths, in order
+        self.complete = True             # False if a sentence could not be spoken
+        self._pending = deque()          # futures -> segment path, in sentence order
+
+    def _submit(self, sentences):
+        for sentence in sentences:
+            try:
+                future = self.executor.submit(synthesize_cached, sentence)
+            except StageSaturated as e:
+                logger.warning(f"TTS segment skipped: {e}")
+                self.complete = False
+                continue
+            self._pending.append(future)
+
+    def feed(self, text: str) -> None:
+        self._submit(self.splitter.feed(text))
+
+    def close(self) -> None:
+        """
+        No more text is coming: speak whatever is left in the buffer.
+        """
+        self._submit(self.splitter.flush())
+
+    def _finish(self, future):
+        try:
+            path = future.result()
+        except Exception as e:
+            logger.error(f"TTS failed for a segment: {e}")
+            self.complete = False
+            return None
+        self.paths.append(path)
+        return path
+
+    def ready_segments(self) -> list:
+        """
+        Segment paths finished since the last call, in order, without blocking.
+        """
+        ready = []
+        while self._pending and self._pending[0].done():
+            path = self._finish(self._pending.popleft())
+            if path:
+                ready.append(path)
+        return ready
+
+    def segments(self):
+        """
+        Yield remaining segment paths in order until all are synthesized.
+        Call close() first.
+        """
+        while self._pending:
+            future = self._pending.popleft()
+            wait([future])
+            path = self._finish(future)
+            if path:
+                yield path
+
+    async def asegments(self):
+        """
+        Async version of segments() for use on the event loop.
+        """
+        while self._pending:
+            future = self._pending.popleft()
+            await asyncio.wait([asyncio.wrap_future(future)])
+            path = self._finish(future)
+            if path:
+                yield path
+
+    def join_segments(self, out_path: str) -> bool:
+        """
+        Concatenate all finished WAV segments into one file (for replay).
+        Returns False if a segment is missing or the segments are not
+        compatible PCM WAV files.
+        """
+        paths = self.paths
+        if not paths or not self.complete:
+            return False
+        try:
+            with wave.open(paths[0], "rb") as first:
+                params = first.getparams()
+            with wave.open(out_path, "wb") as out:
+                out.setparams(params)
+                for path in paths:
+                    with wave.open(path, "rb") as seg:
+                        if seg.getparams()[:3] != params[:3]:
+                            raise wave.Error("segment format mismatch")
+                        out.writeframes(seg.readframes(seg.getnframes()))
+            return True
+        except (wave.Error, EOFError, OSError):
+            if os.path.exists(out_path):
+                os.remove(out_path)
+            return False
+
+    @traced("tts.full")
+    def full_audio(self, answer: str) -> str:
+        """
+        Path of one WAV with the whole answer (for replay): the single
+        segment, the joined segments, or a fresh synthesis. Cached like
+        any other TTS output.
+        """
+        if self.complete and len(self.paths) == 1:
+            return self.paths[0]
+        return get_tts_service().cache_joined(answer, self.join_segments)
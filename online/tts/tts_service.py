@@ -1,12 +1,312 @@
 # online/tts/tts.py
 
-import pyttsx3
+import hashlib
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
-# Initialize the TTS engine
-engine = pyttsx3.init()
-# You can adjust properties like rate or volume if desired:
-engine.setProperty('rate', 150)  # speech rate (words per minute)
-engine.setProperty('volume', 1.0)  # volume: min=0.0, max=1.0
+# ─ Voice settings (overridable under `tts:` in config/settings.yaml) ─
+RATE   = 150     # speech rate (words per minute)
+VOLUME = 1.0     # volume: min=0.0, max=1.0
+VOICE  = None    # engine voice id; None = system default
+
+# make sure project root is importable
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, project_root)
+
+from online.config import load_settings
+from online.models import get_model_registry
+from online.sidecar.client import get_sidecar, use_sidecar
+from online.tracing import span
+
+DEFAULT_CACHE_DIR = os.path.join(project_root, "online", "temp", "audio", "tts_cache")
+STALE_TMP_SECONDS = 600    # older *.tmp.wav files are left over from an interrupted synthesis
+
+
+def tts_cache_dir() -> str:
+    """
+    Directory of the audio cache (`tts.cache_dir` in settings.yaml).
+    """
+    return (load_settings().get("tts") or {}).get("cache_dir") or DEFAULT_CACHE_DIR
+
+
+# ─── Worker side: one pyttsx3 engine per worker process ───
+_engine = None
+
+def _init_worker(rate: int, volume: float, voice) -> None:
+    global _engine
+    import pyttsx3
+    _engine = pyttsx3.init()
+    _engine.setProperty('rate', rate)
+    _engine.setProperty('volume', volume)
+    if voice:
+        _engine.setProperty('voice', voice)
+
+
+def _synthesize_in_worker(text: str, output_path: str) -> str:
+    # Queue the text to be spoken to file
+    _engine.save_to_file(text, output_path)
+    # Run the speech engine
+    _engine.runAndWait()
+    return output_path
+
+
+def _worker_ready() -> int:
+    # runs after _init_worker, i.e. once the engine exists
+    return os.getpid()
+
+
+# ─── On-disk, content-addressed audio cache ───
+class AudioCache:
+    """
+    WAV files named by sha256(voice, rate, text), capped at max_bytes with
+    least-recently-used eviction. Hits are served straight from the cache
+    directory, so repeated answers skip synthesis entirely.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = 256 * 2**20):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock     = threading.Lock()
+        self._entries  = OrderedDict()   # key -> size, oldest first
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # rebuild LRU order from file mtimes (touched on every hit)
+        files = []
+        for entry in os.scandir(cache_dir):
+            if not entry.is_file() or not entry.name.endswith(".wav"):
+                continue
+            st = entry.stat()
+            if entry.name.endswith(".tmp.wav"):
+                # other workers sharing the directory may be writing theirs right now
+                if time.time() - st.st_mtime > STALE_TMP_SECONDS:
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+                continue
+            files.append((st.st_mtime, entry.name[:-4], st.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+        self._total = sum(self._entries.values())
+
+    @staticmethod
+    def key(text: str, voice=None, rate: int = RATE) -> str:
+        return hashlib.sha256(f"{voice}\0{rate}\0{text}".encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def tmp_path(self, key: str) -> str:
+        # unique per process and thread: workers share the cache directory
+        return os.path.join(self.cache_dir, f"{key}.{os.getpid()}.{threading.get_ident()}.tmp.wav")
+
+    def get(self, key: str):
+        """
+        Path of the cached audio for key, or None.
+        """
+        with self._lock:
+            path = self.path(key)
+            if key not in self._entries:
+                # maybe written by another worker sharing this directory
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    self.misses += 1
+                    return None
+                self._entries[key] = size
+                self._total       += size
+            elif not os.path.isfile(path):
+                self._total -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put(self, key: str, src_path: str) -> str:
+        """
+        Move a freshly synthesized file into the cache; returns its cache path.
+        """
+        path = self.path(key)
+        os.replace(src_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._total += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total -= old_size
+                self.evictions += 1
+                try:
+                    os.remove(self.path(old_key))
+                except OSError:
+                    pass
+        return path
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries":   len(self._entries),
+            "bytes":     self._total,
+            "max_bytes": self.max_bytes,
+            "hits":      self.hits,
+            "misses":    self.misses,
+            "evictions": self.evictions,
+            "hit_rate":  self.hits / lookups if lookups else 0.0,
+        }
+
+
+# ─── Pool of isolated synthesis workers + cache ───
+class TTSService:
+    """
+    pyttsx3 engines are not safe to share between threads, so every worker
+    process owns its own engine and synthesis runs in parallel across them.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        rate: int = RATE,
+        volume: float = VOLUME,
+        voice=None,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        cache_max_bytes: int = 256 * 2**20,
+    ):
+        self.rate    = rate
+        self.voice   = voice
+        self.workers = workers
+        self.cache   = AudioCache(cache_dir, max_bytes=cache_max_bytes)
+        self._pool   = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(rate, volume, voice),
+        )
+
+    def synthesize_cached(self, text: str) -> str:
+        """
+        Return the path of a WAV speaking `text`, synthesizing it only on a
+        cache miss. Blocks until the audio exists.
+        """
+        key    = AudioCache.key(text, self.voice, self.rate)
+        cached = self.cache.get(key)
+        if cached:
+            return cached
+        tmp_path = self.cache.tmp_path(key)
+        with span("tts.synthesize"):
+            self.render(text, tmp_path)
+        return self.cache.put(key, tmp_path)
+
+    def render(self, text: str, output_path: str) -> None:
+        """
+        Synthesize `text` into output_path on a worker process (no cache).
+        """
+        self._pool.submit(_synthesize_in_worker, text, output_path).result()
+
+    def cache_joined(self, text: str, join) -> str:
+        """
+        Cache audio for `text` produced by join(tmp_path) -> bool (e.g. by
+        concatenating already-spoken segments); falls back to synthesizing.
+        """
+        key    = AudioCache.key(text, self.voice, self.rate)
+        cached = self.cache.get(key)
+        if cached:
+            return cached
+        tmp_path = self.cache.tmp_path(key)
+        if join(tmp_path):
+            return self.cache.put(key, tmp_path)
+        return self.synthesize_cached(text)
+
+    def synthesize(self, text: str, output_path: str) -> None:
+        shutil.copyfile(self.synthesize_cached(text), output_path)
+
+    def warmup(self) -> None:
+        """
+        Start every worker process (each initializes its pyttsx3 engine)
+        instead of paying for it on the first answers.
+        """
+        futures = [self._pool.submit(_worker_ready) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class SidecarTTSService(TTSService):
+    """
+    Same audio cache, but synthesis runs in the inference sidecar
+    (`sidecar.enabled`), which writes the WAV straight into this cache
+    directory; no engine is started in this process.
+    """
+
+    def __init__(self, sidecar, rate: int = RATE, voice=None, cache_dir: str = DEFAULT_CACHE_DIR,
+                 cache_max_bytes: int = 256 * 2**20):
+        self.rate    = rate
+        self.voice   = voice
+        self.workers = 0
+        self.cache   = AudioCache(cache_dir, max_bytes=cache_max_bytes)
+        self.sidecar = sidecar
+
+    def render(self, text: str, output_path: str) -> None:
+        self.sidecar.synthesize(text, os.path.abspath(output_path))
+
+    def warmup(self) -> None:
+        self.sidecar.ready("tts")
+
+    def shutdown(self) -> None:
+        self.sidecar.close()
+
+
+def _load_tts_service() -> TTSService:
+    # configured from `tts:` in settings.yaml
+    cfg = load_settings().get("tts") or {}
+    if use_sidecar():
+        return SidecarTTSService(
+            get_sidecar(),
+            rate=cfg.get("rate", RATE),
+            voice=cfg.get("voice", VOICE),
+            cache_dir=tts_cache_dir(),
+            cache_max_bytes=int(cfg.get("cache_max_mb", 256) * 2**20),
+        )
+    return TTSService(
+        workers=cfg.get("workers", 2),
+        rate=cfg.get("rate", RATE),
+        volume=cfg.get("volume", VOLUME),
+        voice=cfg.get("voice", VOICE),
+        cache_dir=tts_cache_dir(),
+        cache_max_bytes=int(cfg.get("cache_max_mb", 256) * 2**20),
+    )
+
+
+# worker processes start on first synthesis, or by the startup warmup
+get_model_registry().register("tts", _load_tts_service, warmup=lambda service: service.warmup())
+
+
+def get_tts_service() -> TTSService:
+    """
+    Process-wide TTS service, configured from `tts:` in settings.yaml and
+    loaded through the model registry.
+    """
+    return get_model_registry().get("tts")
+
+
+def synthesize_cached(text: str) -> str:
+    """
+    Path to a cached WAV of `text` (synthesized on first request).
+    """
+    return get_tts_service().synthesize_cached(text)
 
 
 def synthesize(text: str, output_path: str) -> None:
@@ -16,10 +316,7 @@ def synthesize(text: str, output_path: str) -> None:
     :param text: The text string to speak.
     :param output_path: Path to write the audio file (e.g., "response.wav").
     """
-    # Queue the text to be spoken to file
-    engine.save_to_file(text, output_path)
-    # Run the speech engine
-    engine.runAndWait()
+    get_tts_service().synthesize(text, output_path)
 
 
 if __name__ == "__main__":
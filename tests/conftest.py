@@ -0,0 +1,71 @@
+# tests/conftest.py
+
+import os
+import sys
+import zlib
+
+import numpy as np
+import pytest
+
+# make sure project root (online/) and offline/ (indexer, embedder) are importable
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, "offline"))
+sys.path.insert(0, os.path.join(project_root, "benchmarks"))   # offline model stand-ins
+
+
+def fake_vector(text: str, dim: int = 16) -> np.ndarray:
+    """
+    Deterministic unit vector for `text`: equal texts embed equally,
+    different texts are nearly orthogonal.
+    """
+    rng    = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+    vector = rng.normal(size=dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeEmbeddings:
+    """
+    Stands in for HuggingFaceEmbeddings (queries) and EmbeddingStage (indexing).
+    """
+
+    def embed_documents(self, texts):
+        return [fake_vector(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return fake_vector(text).tolist()
+
+    def embed(self, texts):
+        return np.stack([fake_vector(text) for text in texts]) if texts else np.zeros((0, 16), np.float32)
+
+
+@pytest.fixture
+def fake_embeddings():
+    return FakeEmbeddings()
+
+
+@pytest.fixture(scope="session")
+def tutor_server(tmp_path_factory):
+    """
+    online.server with the benchmarks' stand-ins for every model (fake
+    Whisper, retrieval and TTS, the stub Ollama), writing its files under
+    a temporary directory. Imported once per test session.
+    """
+    from bench_e2e import use_scratch_dir
+    from fake_backends import (
+        FakeRetriever, FakeWhisper, fake_tts_service,
+        install_fake_retrieval, install_fake_stt, install_fake_tts, use_llm,
+    )
+    from stub_ollama import serve
+
+    use_scratch_dir(str(tmp_path_factory.mktemp("tutor")))
+    install_fake_stt(FakeWhisper(0, 0, 0))
+    from online import server
+    from online.tts.tts_service import tts_cache_dir
+
+    stub, _ = serve(port=0, answer_tokens=8, tokens_per_sec=1000, prefill_ms_per_1k=0)
+    use_llm(f"http://127.0.0.1:{stub.server_address[1]}")
+    install_fake_retrieval(server, FakeRetriever(0))
+    install_fake_tts(fake_tts_service(0, 0, cache_dir=tts_cache_dir()))
+    yield server
+    stub.shutdown()
@@ -0,0 +1,58 @@
+# tests/test_answer_cache.py
+
+import numpy as np
+from langchain.schema import Document
+
+from online.llm.answer_cache import AnswerCache, chunk_ids
+
+CHUNKS = [Document(id="c1", page_content="a"), Document(id="c2", page_content="b")]
+REPLY  = {"answer": "NMS keeps the best box per object."}
+
+
+def rotated(angle: float):
+    # unit vector at `angle` radians from [1, 0]: cosine similarity cos(angle)
+    return [float(np.cos(angle)), float(np.sin(angle))]
+
+
+def test_similar_question_with_same_chunks_hits():
+    cache = AnswerCache(threshold=0.9)
+    cache.store([1.0, 0.0], "en", CHUNKS, 0, None, REPLY)
+
+    assert cache.lookup(rotated(0.3), "en", CHUNKS, 0) == REPLY      # cos 0.955 >= 0.9
+    assert cache.lookup(rotated(0.6), "en", CHUNKS, 0) is None       # cos 0.825 < 0.9
+    assert cache.lookup([1.0, 0.0], "ar", CHUNKS, 0) is None         # other language
+    assert cache.lookup([1.0, 0.0], "en", CHUNKS[:1], 0) is None     # other chunks
+    assert cache.lookup([1.0, 0.0], "en", CHUNKS, 0, corpus="cs231n") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 4)
+
+
+def test_new_index_generation_drops_its_answers():
+    cache = AnswerCache()
+    cache.store([1.0, 0.0], "en", CHUNKS, 0, None, REPLY)
+    cache.store([1.0, 0.0], "en", CHUNKS, 0, "cs231n", REPLY)
+
+    assert cache.lookup([1.0, 0.0], "en", CHUNKS, 1) is None
+    assert cache.lookup([1.0, 0.0], "en", CHUNKS, 0, corpus="cs231n") == REPLY
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_least_recently_used_answer_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    for angle in (0.0, 1.0, 2.0):
+        cache.store(rotated(angle), "en", CHUNKS, 0, None, {"answer": str(angle)})
+    assert cache.lookup(rotated(0.0), "en", CHUNKS, 0) is None
+    assert cache.lookup(rotated(2.0), "en", CHUNKS, 0) == {"answer": "2.0"}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_chunks_without_ids_are_never_cached():
+    anonymous = [Document(page_content=""), Document(page_content="")]
+    cache     = AnswerCache()
+    assert chunk_ids(anonymous) is None
+    assert chunk_ids(CHUNKS) == ("c1", "c2")
+
+    cache.store([1.0, 0.0], "en", anonymous, 0, None, REPLY)
+    assert cache.lookup([1.0, 0.0], "en", anonymous, 0) is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["bypassed"] == 1
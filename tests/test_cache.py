@@ -0,0 +1,34 @@
+# tests/test_cache.py
+
+import time
+
+from online.cache import LRUCache
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1      # "b" is now the least recently used
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_expired_entries_are_misses():
+    cache = LRUCache(max_entries=4, ttl_seconds=0.05)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.1)
+    assert cache.get("a", "gone") == "gone"
+    assert len(cache) == 0
+
+
+def test_zero_entries_disables_the_cache():
+    cache = LRUCache(max_entries=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
@@ -0,0 +1,70 @@
+# tests/test_chunk_store.py
+
+from pathlib import Path
+
+import pytest
+
+from online.retrieval.chunk_store import ChunkStore, ChunkStoreWriter
+
+
+def write_store(chunks_dir, texts: dict) -> None:
+    with ChunkStoreWriter(str(chunks_dir)) as writer:
+        for doc_id, text in texts.items():
+            writer.add(doc_id, text, {"source": "lecture_01.pdf"})
+
+
+def read_text(chunks_dir, doc_id: str):
+    store = ChunkStore(str(chunks_dir))
+    try:
+        return store.text(doc_id)
+    finally:
+        store.close()
+
+
+def test_reader_keeps_its_generation_and_a_reopen_sees_the_rewrite(tmp_path):
+    write_store(tmp_path, {"a": "anchor boxes", "b": "non-max suppression"})
+    old = ChunkStore(str(tmp_path))
+
+    write_store(tmp_path, {"a": "anchor boxes, revised", "c": "grid cells"})
+    assert old.text("a") == "anchor boxes"             # still its own data file
+    new = ChunkStore(str(tmp_path))
+    assert new.generation == old.generation + 1
+    assert (new.text("a"), new.text("b"), new.get("c").metadata) == (
+        "anchor boxes, revised", None, {"source": "lecture_01.pdf"},
+    )
+    old.close()
+    new.close()
+
+    write_store(tmp_path, {"a": "third"})
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["chunks.2.jsonl", "chunks.3.jsonl", "chunks.idx.json"]
+    assert read_text(tmp_path, "a") == "third"
+
+
+def test_data_file_a_reader_holds_is_deleted_by_a_later_write(tmp_path, monkeypatch):
+    write_store(tmp_path, {"a": "one"})
+    write_store(tmp_path, {"a": "two"})
+
+    # Windows: a file another process has open cannot be deleted
+    unlink = Path.unlink
+    def held_open(path, missing_ok=False):
+        if path.name == "chunks.1.jsonl":
+            raise PermissionError(f"{path} is in use")
+        unlink(path, missing_ok=missing_ok)
+    monkeypatch.setattr(Path, "unlink", held_open)
+    write_store(tmp_path, {"a": "three"})
+    assert (tmp_path / "chunks.1.jsonl").exists()
+    assert read_text(tmp_path, "a") == "three"
+
+    monkeypatch.undo()   # the reader closed it
+    write_store(tmp_path, {"a": "four"})
+    assert not (tmp_path / "chunks.1.jsonl").exists()
+
+
+def test_failed_write_leaves_the_live_store(tmp_path):
+    write_store(tmp_path, {"a": "kept"})
+    with pytest.raises(RuntimeError):
+        with ChunkStoreWriter(str(tmp_path)) as writer:
+            writer.add("a", "half written", {})
+            raise RuntimeError("splitter crashed")
+    assert read_text(tmp_path, "a") == "kept"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["chunks.1.jsonl", "chunks.idx.json"]
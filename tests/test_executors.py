@@ -0,0 +1,74 @@
+# tests/test_executors.py
+
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from online import executors
+from online.executors import Stage, StageSaturated
+
+
+def test_stage_admits_workers_plus_queue_then_rejects():
+    stage   = Stage("test", workers=1, max_queue=1, retry_after=3)
+    release = threading.Event()
+    running = [stage.submit(release.wait, 5), stage.submit(release.wait, 5)]
+
+    with pytest.raises(StageSaturated) as rejected:
+        stage.submit(release.wait, 5)
+    assert (rejected.value.stage, rejected.value.retry_after) == ("test", 3)
+    assert stage.stats()["rejected"] == 1
+
+    release.set()
+    for future in running:
+        future.result(5)
+    assert stage.submit(lambda: "admitted again").result(5) == "admitted again"
+    stage.shutdown()
+
+
+def test_stream_holds_its_slot_until_cancelled():
+    stage = Stage("test", workers=1, max_queue=0)
+    gate  = threading.Event()
+
+    def endless():
+        while True:
+            gate.wait(0.01)
+            yield "token"
+
+    async def consume():
+        stream = stage.stream(endless)
+        first  = await stream.__anext__()
+        with pytest.raises(StageSaturated):
+            stage.stream(endless)
+        stream.cancel()
+        return first, [token async for token in stream]   # ends: the producer stopped
+
+    first, _ = asyncio.run(consume())
+    assert first == "token"
+    deadline = time.monotonic() + 5
+    while stage.in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert stage.submit(lambda: "free").result(5) == "free"
+    stage.shutdown()
+
+
+def test_saturated_stage_answers_503_with_retry_after(tutor_server, monkeypatch):
+    busy    = Stage("retrieval", workers=1, max_queue=0, retry_after=9)
+    release = threading.Event()
+    monkeypatch.setitem(executors._stages, "retrieval", busy)
+    blocker = busy.submit(release.wait, 10)
+
+    with TestClient(tutor_server.app) as client:
+        resp = client.post("/chat/", data={"question": "what are anchor boxes?"})
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == "9"
+        assert "retrieval" in resp.json()["error"]
+
+        release.set()
+        blocker.result(5)
+        resp = client.post("/chat/", data={"question": "what are anchor boxes?"})
+        assert resp.status_code == 200
+        assert resp.json()["answer"]
+    busy.shutdown()
@@ -0,0 +1,78 @@
+# tests/test_flat_index.py
+
+import os
+
+import numpy as np
+import pytest
+from langchain.schema import Document
+
+from indexer import _update_flat
+from online.retrieval.flat_index import FlatIndex, write_flat_index
+
+
+def unit_rows(rng, rows: int, dim: int) -> np.ndarray:
+    matrix = rng.normal(size=(rows, dim)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def corpus():
+    rng     = np.random.default_rng(7)
+    vectors = unit_rows(rng, 300, 32)
+    queries = vectors[rng.choice(300, 12, replace=False)] + 0.3 * unit_rows(rng, 12, 32)
+    ids     = [f"lecture_01-{i}" for i in range(300)]
+    return ids, vectors, [Document(page_content=f"chunk {i}", metadata={"row": i}) for i in range(300)], queries
+
+
+def top_ids(index: FlatIndex, queries, k: int):
+    return [[doc.id for doc, _ in hits] for hits in index.search_by_vector(queries, k=k)]
+
+
+@pytest.mark.parametrize("quantization", ["float16", "int8"])
+def test_quantized_search_returns_the_float32_top_k(tmp_path, corpus, quantization):
+    ids, vectors, docs, queries = corpus
+    write_flat_index(str(tmp_path / "exact"), ids, vectors, docs)
+    write_flat_index(str(tmp_path / quantization), ids, vectors, docs, quantization=quantization)
+    exact = FlatIndex(str(tmp_path / "exact"))
+    index = FlatIndex(str(tmp_path / quantization), rescore_factor=4)
+    assert index.quantization == quantization
+
+    assert top_ids(index, queries, 5) == top_ids(exact, queries, 5)
+    # rescored scores are the exact dot products
+    doc, score = index.search_by_vector(queries[0], k=1)[0][0]
+    row = ids.index(doc.id)
+    assert score == pytest.approx(float(queries[0] @ vectors[row]), abs=1e-5)
+
+
+def test_index_of_no_chunks_finds_nothing(tmp_path, fake_embeddings):
+    persist_dir = str(tmp_path / "index")
+    _update_flat(persist_dir, [], fake_embeddings, quantization="int8")
+    assert FlatIndex(persist_dir).search_by_vector(fake_embeddings.embed_query("yolo"), k=3) == [[]]
+
+    _update_flat(persist_dir, [Document(id="a", page_content="yolo", metadata={})], fake_embeddings)
+    _update_flat(persist_dir, [], fake_embeddings)
+    index = FlatIndex(persist_dir)
+    assert (len(index), index.embeddings.shape) == (0, (0, 16))
+
+
+def test_rewrite_never_replaces_files_a_reader_has_mapped(tmp_path, corpus, monkeypatch):
+    ids, vectors, docs, queries = corpus
+    persist_dir = str(tmp_path)
+    write_flat_index(persist_dir, ids, vectors, docs)
+    old      = FlatIndex(persist_dir)
+    expected = top_ids(old, queries, 3)
+
+    # Windows refuses to replace (or delete) a memory-mapped file
+    mapped  = set(old.files.values())
+    replace = os.replace
+    def guarded_replace(src, dst):
+        assert dst not in mapped, f"replaced {dst}, which a reader has mapped"
+        replace(src, dst)
+    monkeypatch.setattr(os, "replace", guarded_replace)
+    write_flat_index(persist_dir, ids[:10], vectors[:10], docs[:10], quantization="int8")
+    write_flat_index(persist_dir, ids[:20], vectors[:20], docs[:20])
+
+    assert top_ids(old, queries, 3) == expected        # the reader still sees its generation
+    new = FlatIndex(persist_dir)
+    assert len(new) == 20 and new.quantization == "none"
+    assert not any(path.exists() for path in mapped)   # two generations old: deleted
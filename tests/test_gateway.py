@@ -0,0 +1,108 @@
+# tests/test_gateway.py
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from online.executors import Stage, StageSaturated
+from online.llm.gateway import POLL_SECONDS, LLMGateway, LLMTimeout
+
+
+class FakeLLM:
+    """
+    Streams the words of the prompt; the prompt "hold" blocks until released,
+    keeping its generation slot busy.
+    """
+
+    def __init__(self):
+        self.prompts = []
+        self.release = threading.Event()
+
+    def stream(self, prompt):
+        self.prompts.append(prompt)
+        if prompt == "hold":
+            self.release.wait(5)
+        yield from prompt.split()
+
+
+def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def in_thread(fn, *args):
+    thread = threading.Thread(target=fn, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_queued_requests_run_by_priority_then_fifo():
+    llm     = FakeLLM()
+    gateway = LLMGateway(llm, max_in_flight=1)
+    threads = [in_thread(gateway.generate, "hold", "chat")]
+    wait_until(lambda: llm.prompts == ["hold"])
+
+    for prompt, priority in [
+        ("summary", "background"), ("chat one", "chat"), ("voice", "voice"), ("chat two", "chat"),
+    ]:
+        queued = gateway.stats()["queued"]
+        threads.append(in_thread(gateway.generate, prompt, priority))
+        wait_until(lambda: gateway.stats()["queued"] == queued + 1)
+
+    llm.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert llm.prompts == ["hold", "voice", "chat one", "chat two", "summary"]
+    assert gateway.stats()["in_flight"] == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    llm     = FakeLLM()
+    gateway = LLMGateway(llm, max_in_flight=1)
+    holder  = in_thread(gateway.generate, "hold", "chat")
+    wait_until(lambda: llm.prompts == ["hold"])
+
+    async def cancel_while_queued():
+        # the gateway reads the cancel event of the StageStream it runs on
+        stream = Stage("llm", workers=2, max_queue=2).stream(gateway.stream, "never generated", "chat")
+        await asyncio.to_thread(wait_until, lambda: gateway.stats()["queued"] == 1)
+        stream.cancel()
+        start  = time.monotonic()
+        tokens = [token async for token in stream]
+        return tokens, time.monotonic() - start
+
+    tokens, seconds = asyncio.run(cancel_while_queued())
+    assert tokens == []
+    assert seconds < 4 * POLL_SECONDS
+    assert gateway.stats()["queued"] == 0
+    assert gateway.stats()["priorities"]["chat"]["cancelled"] == 1
+
+    llm.release.set()
+    holder.join(5)
+    gateway.generate("next")
+    assert llm.prompts == ["hold", "next"]
+
+
+def test_full_queue_is_rejected_and_queued_requests_time_out():
+    llm     = FakeLLM()
+    gateway = LLMGateway(llm, max_in_flight=1, max_queue=1, retry_after=7)
+    holder  = in_thread(gateway.generate, "hold", "chat")
+    wait_until(lambda: llm.prompts == ["hold"])
+
+    errors = []
+    waiter = in_thread(lambda: errors.append(pytest.raises(LLMTimeout, gateway.generate, "late", "chat", 0.3)))
+    wait_until(lambda: gateway.stats()["queued"] == 1)
+    with pytest.raises(StageSaturated) as rejected:
+        gateway.generate("one too many", "voice")
+    assert rejected.value.retry_after == 7
+
+    waiter.join(5)
+    assert errors and errors[0].value.queued
+    llm.release.set()
+    holder.join(5)
+    stats = gateway.stats()["priorities"]
+    assert (stats["chat"]["timed_out"], stats["voice"]["rejected"]) == (1, 1)
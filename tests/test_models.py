@@ -0,0 +1,22 @@
+# tests/test_models.py
+
+from online.models import LOADED, PENDING, ModelRegistry
+from online.retrieval import retriever
+from online.tts import tts_service
+
+
+def test_request_path_loads_go_through_the_registry(monkeypatch):
+    # what /readyz reports after traffic when models.warmup_on_startup is off
+    registry = ModelRegistry()
+    for module in (retriever, tts_service):
+        monkeypatch.setattr(module, "get_model_registry", lambda: registry)
+    default_index, service = object(), object()
+    registry.register("retriever", lambda: default_index)
+    registry.register("tts", lambda: service)
+    assert {name: s["state"] for name, s in registry.status().items()} == {"retriever": PENDING, "tts": PENDING}
+
+    assert retriever.get_retriever() is default_index
+    assert tts_service.get_tts_service() is service
+    assert {name: s["state"] for name, s in registry.status().items()} == {"retriever": LOADED, "tts": LOADED}
+    assert registry.peek("retriever") is default_index
+    assert registry.ready()
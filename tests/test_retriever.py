@@ -0,0 +1,52 @@
+# tests/test_retriever.py
+
+from langchain.schema import Document
+
+from online.retrieval.chunk_store import ChunkStoreWriter
+from online.retrieval.retriever import Retriever
+
+CHUNKS = {
+    "c1": "YOLO predicts bounding boxes and class scores in a single pass.",
+    "c2": "Backpropagation applies the chain rule layer by layer.",
+    "c3": "A convolution slides a small kernel over the image.",
+}
+
+
+def _write_chunks(chunks_dir):
+    with ChunkStoreWriter(chunks_dir) as writer:
+        for chunk_id, text in CHUNKS.items():
+            writer.add(chunk_id, text, {"sources": f"{chunk_id}.pdf (page 1)"})
+
+
+def _docs():
+    return [Document(id=chunk_id, page_content=text, metadata={"sources": f"{chunk_id}.pdf (page 1)"})
+            for chunk_id, text in CHUNKS.items()]
+
+
+def test_lazy_chroma_index_returns_chunk_text(tmp_path, fake_embeddings):
+    from indexer import _update_chroma
+
+    chunks_dir  = tmp_path / "chunks"
+    persist_dir = str(tmp_path / "index")
+    _write_chunks(chunks_dir)
+    _update_chroma(persist_dir, _docs(), fake_embeddings, lazy_text=True)
+
+    retriever = Retriever(persist_dir=persist_dir, backend="chroma", chunks_dir=str(chunks_dir),
+                          embeddings=fake_embeddings)
+    for chunk_id, text in CHUNKS.items():
+        hits = retriever.search(text, top_k=2)
+        assert hits[0].id == chunk_id
+        assert hits[0].page_content == text
+        assert all(doc.page_content for doc in hits)
+
+
+def test_chroma_hits_carry_chunk_ids(tmp_path, fake_embeddings):
+    from indexer import _update_chroma
+
+    persist_dir = str(tmp_path / "index")
+    _update_chroma(persist_dir, _docs(), fake_embeddings)
+
+    retriever = Retriever(persist_dir=persist_dir, backend="chroma", chunks_dir=None, embeddings=fake_embeddings)
+    hits = retriever.search_batch(list(CHUNKS.values()), top_k=3)
+    assert [docs[0].id for docs in hits] == list(CHUNKS)
+    assert [docs[0].page_content for docs in hits] == list(CHUNKS.values())
@@ -0,0 +1,47 @@
+# tests/test_sessions.py
+
+import time
+
+from online.config import get_setting
+from online.sessions import SessionStore
+
+
+def test_two_stores_on_one_file_keep_each_others_turns(tmp_path):
+    # two uvicorn workers, each with its own store on the shared SQLite file
+    path   = str(tmp_path / "sessions.sqlite")
+    first  = SessionStore(path=path)
+    second = SessionStore(path=path)
+
+    session = first.get_or_create()
+    session.add_exchange("what is yolo?", "a one-stage detector")
+    second.get(session.id).add_exchange("and anchors?", "prior box shapes")
+    # `session` is first's stale copy: the append re-reads the row before writing
+    session.add_exchange("thanks", "you're welcome")
+
+    for store in (first, second):
+        _, turns = store.get(session.id).history()
+        assert [turn["text"] for turn in turns if turn["role"] == "user"] == ["what is yolo?", "and anchors?", "thanks"]
+    assert second.stats()["active"] == 1
+
+
+def test_reads_do_not_refresh_a_shared_session(tmp_path):
+    store   = SessionStore(path=str(tmp_path / "sessions.sqlite"))
+    session = store.get_or_create()
+    session.add_exchange("q", "a")
+    db      = store._shared
+    before  = db._db.execute("SELECT last_seen FROM sessions").fetchone()[0]
+
+    store.get(session.id)
+    assert db._db.execute("SELECT last_seen FROM sessions").fetchone()[0] == before
+    time.sleep(0.02)
+    session.add_exchange("q2", "a2")
+    assert db._db.execute("SELECT last_seen FROM sessions").fetchone()[0] > before
+
+
+def test_sessions_default_to_memory():
+    assert get_setting("sessions", "path") is None   # settings.yaml: SQLite is opt-in
+    store   = SessionStore()
+    session = store.get_or_create()
+    session.add_exchange("q", "a")
+    assert store.get(session.id) is session
+    assert store.stats()["shared"] is None
@@ -0,0 +1,28 @@
+# tests/test_streaming.py
+
+import numpy as np
+
+from online.stt.streaming import SAMPLE_RATE, UtteranceSegmenter
+
+
+def tone(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (0.5 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def hum(seconds: float, level: float) -> np.ndarray:
+    # constant background, well below the VAD's speech level
+    return np.full(int(seconds * SAMPLE_RATE), level, dtype=np.float32)
+
+
+def test_next_utterance_does_not_start_with_stale_pre_roll():
+    segmenter = UtteranceSegmenter(frame_ms=30, end_silence_ms=690, pre_roll_ms=300)
+    # 690 ms of trailing silence end the utterance on the last frame, nothing left over
+    assert segmenter.feed(np.concatenate([hum(0.6, 0.005), tone(0.6), hum(0.69, 0.0)]))
+    segmenter.reset()
+
+    # only 90 ms of background before the next question: that is its whole pre-roll
+    segmenter.feed(np.concatenate([hum(0.09, 0.0), tone(0.3)]))
+    leading = [frame for frame in segmenter._frames if np.abs(frame).max() < 0.01]
+    assert len(leading) == 3
+    assert not any(frame.any() for frame in leading)   # none of the 0.005 hum before the first question
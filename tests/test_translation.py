@@ -0,0 +1,21 @@
+# tests/test_translation.py
+
+from online.llm.translation import TranslationMemory, memory_key
+
+
+def test_memory_evicts_least_recently_used_beyond_max_bytes(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "memory.sqlite"), max_bytes=10)
+    first, second, third = (memory_key(text, "ar") for text in ("one", "two", "three"))
+    memory.put_many([(first, "ar", "aaaa"), (second, "ar", "bbbb")])
+    assert memory.get_many([first]) == {first: "aaaa"}   # second is now the least recently used
+
+    memory.put_many([(third, "ar", "cccc")])
+    assert memory.get_many([first, second, third]) == {first: "aaaa", third: "cccc"}
+    stats = memory.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, 8, 1)
+    memory.close()
+
+    reopened = TranslationMemory(str(tmp_path / "memory.sqlite"), max_bytes=10)
+    assert reopened.get_many([third]) == {third: "cccc"}
+    assert reopened.stats()["bytes"] == 8
+    reopened.close()